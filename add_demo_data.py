@@ -13,6 +13,7 @@ import random
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app, db
+from app.ledger import reconcile
 from app.models import Category, Transaction
 
 def add_demo_transactions():
@@ -123,6 +124,9 @@ def add_demo_transactions():
             
             db.session.commit()
             
+            # Rows were inserted and deleted directly: rebuild balances, rollups and budget progress
+            reconcile()
+            
             print(f"✓ Successfully added {len(demo_transactions)} demo transactions!")
             print("\nDemo transactions include:")
             print("- Food & dining expenses")
@@ -12,6 +12,7 @@ from datetime import datetime, timedelta
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app, db
+from app.ledger import reconcile
 from app.models import Category, Transaction
 
 def add_simple_demo_data():
@@ -98,6 +99,9 @@ def add_simple_demo_data():
             
             db.session.commit()
             
+            # Rows were inserted directly: rebuild balances, rollups and budget progress
+            reconcile()
+            
             print(f"✓ Successfully added {added_count} demo transactions!")
             print("\nDemo data includes:")
             print("- Monthly salary and freelance income")
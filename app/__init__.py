@@ -30,11 +30,35 @@ def create_app(config_name=None):
     from app.routes import main, auth
     app.register_blueprint(main)
     app.register_blueprint(auth)
-    
-    # Create tables in app context
+
+    # Fingerprinted static assets (asset_url() in templates)
+    from app.assets import init_assets
+    init_assets(app)
+
+    # Template bytecode cache, warm-up and render timing
+    from app.templating import init_templating
+    init_templating(app)
+
+    # gzip/brotli for text responses
+    from app.compression import init_compression
+    init_compression(app)
+
+    # Live update streams
+    from app.events import init_events
+    init_events(app)
+
+    # Register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
+
+    # Create tables and apply pending migrations in app context
+    from app.dbutil import enable_sqlite_wal
+    from app.migrations import run_migrations
     with app.app_context():
+        enable_sqlite_wal(db.engine)
         db.create_all()
-    
+        run_migrations()
+
     return app
 
 # User loader for Flask-Login
@@ -0,0 +1,164 @@
+"""
+Fingerprinted static assets
+
+`flask assets build` or `python -m app.assets` (at deploy time; the latter
+needs no database) copies every file in app/static
+to app/static/dist under a content-hashed name (style.css ->
+style.3f2a9c1b7d4e.css), writes precompressed .gz and .br variants of the
+text files next to them, and records the mapping in
+app/static/dist/manifest.json.
+
+Templates link assets through asset_url('style.css'), which returns the
+fingerprinted URL from the manifest. The file is served from
+/static/dist/ with `Cache-Control: immutable` and a one-year max-age:
+a changed file gets a new name, so browsers never have to revalidate. The
+matching .br or .gz variant is sent when the client accepts it, so nothing
+is compressed per request.
+
+Without a manifest (development before a build), asset_url() falls back to
+the plain /static/ URL. The service worker (/sw.js) takes its cache name
+and precache list from the manifest, so each deploy with changed assets
+replaces the old cache.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from flask import current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: .gz variants only
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+PRECOMPRESS_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.xml'}
+PRECACHE_EXTENSIONS = {'.css', '.js'}  # assets the service worker stores on install
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+
+def dist_dir():
+    return os.path.join(current_app.static_folder, DIST_DIR)
+
+
+def build_assets(source=STATIC_FOLDER):
+    """Write fingerprinted copies, .gz/.br variants and the manifest of `source`; returns the manifest"""
+    output = os.path.join(source, DIST_DIR)
+    if os.path.isdir(output):
+        shutil.rmtree(output)
+    os.makedirs(output)
+
+    files = {}
+    digest = hashlib.sha256()
+    for directory, subdirectories, names in os.walk(source):
+        if os.path.abspath(directory) == os.path.abspath(source):
+            subdirectories[:] = [name for name in subdirectories if name != DIST_DIR]
+        for name in sorted(names):
+            path = os.path.join(directory, name)
+            logical = os.path.relpath(path, source).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                content = f.read()
+            content_hash = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+            digest.update(f"{logical}:{content_hash}".encode())
+
+            stem, extension = os.path.splitext(logical)
+            fingerprinted = f"{stem}.{content_hash}{extension}"
+            target = os.path.join(output, fingerprinted)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(content)
+            if extension.lower() in PRECOMPRESS_EXTENSIONS:
+                _write_variants(target, content)
+            files[logical] = f"{DIST_DIR}/{fingerprinted}"
+
+    manifest = {'version': digest.hexdigest()[:HASH_LENGTH], 'files': dict(sorted(files.items()))}
+    with open(os.path.join(output, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _write_variants(path, content):
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(content, quality=11))
+
+
+def get_manifest():
+    """The built manifest ({'version', 'files'}), or None before `flask assets build`
+
+    Loaded once per process; in debug mode it is reloaded when rebuilt.
+    """
+    cached = current_app.extensions.get('asset_manifest')
+    if cached is not None and not current_app.debug:
+        return cached[1]
+
+    path = os.path.join(dist_dir(), MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        current_app.extensions['asset_manifest'] = (None, None)
+        return None
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = (mtime, json.load(f))
+        current_app.extensions['asset_manifest'] = cached
+    return cached[1]
+
+
+def asset_url(filename):
+    """URL of a static file, fingerprinted if the asset manifest lists it"""
+    manifest = get_manifest()
+    if manifest and filename in manifest['files']:
+        return url_for('static', filename=manifest['files'][filename])
+    return url_for('static', filename=filename)
+
+
+def precache_urls():
+    """Fingerprinted stylesheet and script URLs for the service worker to cache"""
+    manifest = get_manifest()
+    if not manifest:
+        return []
+    return [url_for('static', filename=path) for name, path in manifest['files'].items()
+            if os.path.splitext(name)[1].lower() in PRECACHE_EXTENSIONS]
+
+
+def serve_asset(filename):
+    """Serve a fingerprinted file, preferring a precompressed variant the client accepts"""
+    directory = dist_dir()
+    encoding = None
+    offered = [name for name, extension in (('br', '.br'), ('gzip', '.gz'))
+               if os.path.isfile(os.path.join(directory, filename + extension))]
+    if offered:
+        encoding = request.accept_encodings.best_match(offered)
+
+    if encoding:
+        response = send_from_directory(directory, filename + ('.br' if encoding == 'br' else '.gz'),
+                                       mimetype=mimetypes.guess_type(filename)[0])
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(directory, filename)
+    if offered:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+def init_assets(app):
+    """Serve /static/dist/ with immutable caching and expose asset_url() to templates"""
+    app.add_url_rule(f"{app.static_url_path}/{DIST_DIR}/<path:filename>", endpoint='static_dist',
+                     view_func=serve_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
+
+
+if __name__ == '__main__':
+    built = build_assets()
+    print(f"✓ Built {len(built['files'])} asset(s), version {built['version']}")
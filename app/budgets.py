@@ -0,0 +1,195 @@
+"""
+Budget goal progress
+
+BudgetGoal.current_spent is the sum of the user's expenses in the goal's
+category between its start and end dates. app.ledger.apply_transaction()
+adds or removes each expense from the active goals whose window contains it
+(found through the (user_id, category_id, is_active) index), so the budget
+pages only read the column. Bulk imports use apply_rows_to_budget_goals(),
+which updates each affected goal once per batch.
+
+The same step raises budget alerts: when an expense takes a goal across one
+of ALERT_THRESHOLDS, a 'budget_alert' UserNotification is inserted in the
+same database transaction. Only the goals touched by the write are looked
+at, and the spent amount they are judged on comes from the UPDATE itself
+(RETURNING, or a read-back while the UPDATE still holds the row locks), so
+two concurrent expenses cannot both see the total from before the other.
+
+rebuild_goal_spending() recomputes current_spent for many goals in one UPDATE with a
+correlated SUM; it is used when a goal is created, by
+`flask ledger reconcile` and by the backfill migration.
+
+All three paths decide which expenses count towards a goal with the same
+window, goal_window() (in_goal_window() for rows already in memory):
+start_date <= date <= end_date, where a goal without an end_date counts
+every later expense, future-dated ones included. Anything else would make
+the incremental totals drift from a rebuild.
+"""
+from datetime import datetime
+from sqlalchemy import select, func, or_, insert
+from app import db
+from app.models import Transaction, BudgetGoal, Category, UserNotification
+
+# Percent of the target at which an alert is raised, with its priority
+ALERT_THRESHOLDS = ((100, 'urgent'), (80, 'high'))
+
+
+def goal_window(goals, date):
+    """Conditions for `date` (a value or a column) falling inside a goal's window"""
+    return (
+        goals.c.start_date <= date,
+        or_(goals.c.end_date.is_(None), goals.c.end_date >= date)
+    )
+
+
+def in_goal_window(start_date, end_date, date):
+    """goal_window() for a goal and a date already loaded in Python"""
+    return start_date is not None and start_date <= date and (end_date is None or date <= end_date)
+
+
+def apply_to_budget_goals(transaction, sign=1):
+    """Add (sign=1) or remove (sign=-1) an expense from the goals covering it
+
+    Raises budget alerts for goals the change pushes over a threshold.
+    """
+    if transaction.transaction_type != 'expense':
+        return
+
+    table = BudgetGoal.__table__
+    covering = (
+        table.c.user_id == transaction.user_id,
+        table.c.category_id == transaction.category_id,
+        table.c.is_active.is_(True),
+        *goal_window(table, transaction.date)
+    )
+    delta = transaction.amount * sign
+
+    if delta > 0:
+        evaluate_budget_alerts(transaction.user_id, _add_to_goals(covering, delta), delta)
+    else:
+        db.session.execute(_goal_update(covering, delta))
+
+
+def apply_rows_to_budget_goals(user_id, rows):
+    """Add the expenses among bulk-inserted transaction rows (column dicts) to the goals covering them
+
+    Each goal is updated once with the sum of its expenses in `rows`, and
+    alerts are raised as in apply_to_budget_goals().
+    """
+    expenses = {}
+    for row in rows:
+        if row['transaction_type'] == 'expense':
+            expenses.setdefault(row['category_id'], []).append((row['date'], row['amount']))
+    if not expenses:
+        return
+
+    table = BudgetGoal.__table__
+    goals = db.session.execute(
+        select(table.c.id, table.c.category_id, table.c.start_date, table.c.end_date)
+        .where(table.c.user_id == user_id,
+               table.c.category_id.in_(list(expenses)),
+               table.c.is_active.is_(True))
+    ).all()
+
+    for goal_id, category_id, start_date, end_date in goals:
+        delta = sum(amount for date, amount in expenses[category_id]
+                    if in_goal_window(start_date, end_date, date))
+        if delta:
+            evaluate_budget_alerts(user_id, _add_to_goals((table.c.id == goal_id,), delta), delta)
+
+
+def _goal_update(where, delta):
+    table = BudgetGoal.__table__
+    return table.update().where(*where).values(current_spent=func.coalesce(table.c.current_spent, 0.0) + delta)
+
+
+def _add_to_goals(where, delta):
+    """Add `delta` to current_spent of the goals matching `where`
+
+    Returns their (id, target_amount, current_spent after the change,
+    category_id) rows as written by this UPDATE.
+    """
+    table = BudgetGoal.__table__
+    columns = (table.c.id, table.c.target_amount, table.c.current_spent, table.c.category_id)
+    if db.session.get_bind().dialect.update_returning:
+        return db.session.execute(_goal_update(where, delta).returning(*columns)).all()
+
+    db.session.execute(_goal_update(where, delta))
+    # The UPDATE keeps these rows locked until commit, so this reads its result
+    return db.session.execute(select(*columns).where(*where)).all()
+
+
+def evaluate_budget_alerts(user_id, goals, delta):
+    """Insert a budget_alert for each goal that `delta` takes across a threshold
+
+    `goals` are (id, target_amount, current_spent after the change,
+    category_id) rows from _add_to_goals(); the amount before the change is
+    `after - delta`. Only the highest threshold crossed is reported per goal.
+    """
+    crossed = []
+    for goal_id, target, spent, category_id in goals:
+        if not target:
+            continue
+        after = spent or 0.0
+        before = after - delta
+        for threshold, priority in ALERT_THRESHOLDS:
+            if before / target * 100 < threshold <= after / target * 100:
+                crossed.append((category_id, threshold, priority, target, after))
+                break
+    if not crossed:
+        return
+
+    names = dict(db.session.execute(
+        select(Category.id, Category.name).where(Category.id.in_({row[0] for row in crossed}))
+    ).all())
+    now = datetime.utcnow()
+    db.session.execute(insert(UserNotification), [
+        _budget_alert(user_id, names.get(category_id), threshold, priority, target, spent, now)
+        for category_id, threshold, priority, target, spent in crossed
+    ])
+
+
+def _budget_alert(user_id, category, threshold, priority, target, spent, now):
+    if threshold >= 100:
+        title = f'Budget exceeded: {category}'
+        message = f'You have spent ${spent:.2f} of your ${target:.2f} {category} budget.'
+    else:
+        title = f'{threshold}% of {category} budget used'
+        message = f'You have spent ${spent:.2f} of your ${target:.2f} {category} budget ({spent / target * 100:.0f}%).'
+    return {
+        'user_id': user_id,
+        'notification_type': 'budget_alert',
+        'title': title,
+        'message': message,
+        'priority': priority,
+        'is_read': False,
+        'is_push_sent': False,
+        'action_url': '/budget-goals',
+        'action_text': 'View budget',
+        'created_at': now
+    }
+
+
+def rebuild_goal_spending(connection, user_id=None, goal_id=None):
+    """Recompute current_spent for one goal, one user's goals or every goal
+
+    `connection` is anything with an execute() method: db.session inside a
+    request, or a Connection inside a migration.
+    """
+    goals = BudgetGoal.__table__
+    t = Transaction.__table__
+    spent = (
+        select(func.coalesce(func.sum(t.c.amount), 0.0))
+        .where(t.c.user_id == goals.c.user_id,
+               t.c.category_id == goals.c.category_id,
+               t.c.transaction_type == 'expense',
+               *goal_window(goals, t.c.date))
+        .scalar_subquery()
+    )
+
+    update = goals.update().values(current_spent=spent)
+    if user_id is not None:
+        update = update.where(goals.c.user_id == user_id)
+    if goal_id is not None:
+        update = update.where(goals.c.id == goal_id)
+    connection.execute(update)
@@ -0,0 +1,159 @@
+"""
+Flask CLI commands
+
+    flask schema upgrade    apply pending schema migrations
+    flask schema version    show the current schema version
+    flask ledger reconcile  rebuild balances, monthly rollups and goal progress
+    flask exports worker    render queued exports and run queued imports (run alongside the web process)
+    flask exports purge     delete expired export files and jobs
+    flask notifications archive  move old read notifications out of the live table
+    flask patterns rebuild  precompute spending patterns and recommendations (nightly)
+    flask assets build      fingerprint and precompress static files (at deploy time)
+    flask imports run FILE  import a CSV, OFX/QFX or QIF file of transactions
+"""
+import click
+from flask.cli import AppGroup
+from app.migrations import MIGRATIONS, current_version, run_migrations
+
+schema_cli = AppGroup('schema', help='Database schema migrations.')
+ledger_cli = AppGroup('ledger', help='Per-user balance ledger.')
+exports_cli = AppGroup('exports', help='Background export jobs.')
+notifications_cli = AppGroup('notifications', help='User notification retention.')
+patterns_cli = AppGroup('patterns', help='Precomputed spending patterns and recommendations.')
+assets_cli = AppGroup('assets', help='Fingerprinted static assets.')
+imports_cli = AppGroup('imports', help='Bulk transaction imports.')
+
+
+@schema_cli.command('upgrade')
+def schema_upgrade():
+    """Apply pending schema migrations"""
+    applied = run_migrations()
+    if applied:
+        for version in applied:
+            click.echo(f"✓ Applied migration {version}")
+    else:
+        click.echo("Schema is up to date")
+
+
+@schema_cli.command('version')
+def schema_version():
+    """Show the current schema version"""
+    latest = MIGRATIONS[-1][0] if MIGRATIONS else 0
+    click.echo(f"Current version: {current_version()} (latest: {latest})")
+
+
+@ledger_cli.command('reconcile')
+@click.option('--user-id', type=int, help='Only rebuild this user')
+def ledger_reconcile(user_id):
+    """Rebuild UserBalance, MonthlyRollup and BudgetGoal progress from the transaction table"""
+    from app.ledger import reconcile
+    reconcile(user_id)
+    click.echo(f"✓ Ledger rebuilt for {'user ' + str(user_id) if user_id else 'all users'}")
+
+
+@exports_cli.command('worker')
+@click.option('--poll-interval', type=float, default=2.0, show_default=True, help='Seconds between queue polls')
+@click.option('--once', is_flag=True, help='Exit when the queue is empty')
+def exports_worker(poll_interval, once):
+    """Render queued CSV, Excel and PDF exports and run queued imports"""
+    from app.export_jobs import run_worker
+    click.echo("Export worker started")
+    run_worker(poll_interval=poll_interval, once=once)
+
+
+@exports_cli.command('purge')
+def exports_purge():
+    """Delete export files and jobs past their download expiry"""
+    from app.export_jobs import purge_expired_exports, requeue_stale_jobs
+    requeued = requeue_stale_jobs()
+    purged = purge_expired_exports()
+    click.echo(f"✓ Purged {purged} expired export(s), requeued {requeued} stale job(s)")
+
+
+@notifications_cli.command('archive')
+@click.option('--days', type=int, default=90, show_default=True, help='Archive notifications read more than this many days ago')
+def notifications_archive(days):
+    """Move old read notifications to archived_notification"""
+    from app.notifications import archive_read_notifications
+    archived = archive_read_notifications(days)
+    click.echo(f"✓ Archived {archived} notification(s) read more than {days} days ago")
+
+
+@patterns_cli.command('rebuild')
+@click.option('--workers', type=int, help='Worker processes (default: one per CPU)')
+@click.option('--all', 'rebuild_all', is_flag=True, help='Rebuild every user, not only stale ones')
+@click.option('--user-id', type=int, help='Only rebuild this user')
+def patterns_rebuild(workers, rebuild_all, user_id):
+    """Recompute SpendingPattern and SmartRecommendation rows for stale users"""
+    import time
+    from app.insights import rebuild_insights, stale_user_ids
+    from app.models import User
+    if user_id:
+        user_ids = [user_id]
+    elif rebuild_all:
+        user_ids = [row.id for row in User.query.with_entities(User.id).order_by(User.id)]
+    else:
+        user_ids = stale_user_ids()
+
+    started = time.monotonic()
+    rebuilt = rebuild_insights(user_ids, workers=workers)
+    click.echo(f"✓ Rebuilt insights for {rebuilt} user(s) in {time.monotonic() - started:.1f}s")
+
+
+@assets_cli.command('build')
+def assets_build():
+    """Write fingerprinted, precompressed copies of app/static and the asset manifest"""
+    from flask import current_app
+    from app.assets import build_assets
+    manifest = build_assets(current_app.static_folder)
+    current_app.extensions.pop('asset_manifest', None)
+    click.echo(f"✓ Built {len(manifest['files'])} asset(s), version {manifest['version']}")
+
+
+@imports_cli.command('run')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'username', required=True, help='Username to import the transactions for')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ofx', 'qif']), help='File format (default: from the extension)')
+@click.option('--category', help='Category for rows without a known one (default: Other)')
+@click.option('--chunk-size', type=int, default=5000, show_default=True, help='Rows validated and inserted per transaction')
+def imports_run(path, username, file_format, category, chunk_size):
+    """Import a CSV, OFX/QFX or QIF file of transactions"""
+    import os
+    import time
+    from app.imports import import_transactions
+    from app.models import Category, User
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f"No user named {username}")
+    default_category_id = None
+    if category:
+        default = Category.query.filter(Category.name.ilike(category)).order_by(Category.id).first()
+        if default is None:
+            raise click.ClickException(f"No category named {category}")
+        default_category_id = default.id
+
+    started = time.monotonic()
+    with click.progressbar(length=os.path.getsize(path), label='Importing') as bar:
+        def report(summary):
+            bar.update(summary['bytes_done'] - bar.pos)
+        try:
+            summary = import_transactions(user.id, path, file_format, default_category_id, chunk_size, progress=report)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    for error in summary['errors']:
+        click.echo(f"  row {error['row']}: {error['error']}")
+    elapsed = time.monotonic() - started
+    click.echo(f"✓ Imported {summary['imported']} transaction(s), skipped {summary['skipped']}"
+               f" in {elapsed:.1f}s ({summary['imported'] / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
+def register_commands(app):
+    """Attach CLI command groups to the app"""
+    app.cli.add_command(schema_cli)
+    app.cli.add_command(ledger_cli)
+    app.cli.add_command(exports_cli)
+    app.cli.add_command(notifications_cli)
+    app.cli.add_command(patterns_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(imports_cli)
@@ -0,0 +1,142 @@
+"""
+Response compression
+
+An after_request hook compresses text responses (HTML, JSON, CSV, ...)
+with brotli or gzip, whichever the client prefers in Accept-Encoding
+(brotli only if the brotli package is installed). Bodies under
+COMPRESS_MIN_SIZE bytes are left alone, since compressing them saves
+less than it costs.
+
+Streamed responses, including files from send_file() such as CSV export
+downloads, are compressed chunk by chunk as they are sent, so they are
+never buffered in memory. Generated chunks are flushed as they are
+produced, so a streamed page still reaches the client progressively.
+Range requests get the file uncompressed, and a strong ETag is weakened
+once the body is re-encoded.
+
+Views opt out with @no_compression. Server-Sent Events are never
+compressed: their content type is not in COMPRESS_MIMETYPES.
+"""
+import zlib
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESS_MIMETYPES = {
+    'text/html', 'text/css', 'text/csv', 'text/plain', 'text/xml', 'text/javascript',
+    'application/json', 'application/javascript', 'application/xml', 'application/manifest+json',
+    'image/svg+xml',
+}
+
+
+def no_compression(view):
+    """Mark a view's responses as never compressed"""
+    view.compress = False
+    return view
+
+
+def init_compression(app):
+    """Register the compression hook (COMPRESS_ENABLED)"""
+    if app.config['COMPRESS_ENABLED']:
+        app.after_request(compress_response)
+
+
+def _choose_encoding():
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def _compressor(encoding):
+    """Object with compress(chunk, flush=False) and finish() returning bytes, for `encoding`"""
+    config = current_app.config
+    if encoding == 'br':
+        return _BrotliCompressor(config['COMPRESS_BR_QUALITY'])
+    return _GzipCompressor(config['COMPRESS_LEVEL'])
+
+
+class _GzipCompressor:
+    def __init__(self, level):
+        self._zlib = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, chunk, flush=False):
+        data = self._zlib.compress(chunk)
+        return data + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else data
+
+    def finish(self):
+        return self._zlib.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self, quality):
+        self._brotli = brotli.Compressor(quality=quality)
+
+    def compress(self, chunk, flush=False):
+        data = self._brotli.process(chunk)
+        return data + self._brotli.flush() if flush else data
+
+    def finish(self):
+        return self._brotli.finish()
+
+
+def _compress_stream(chunks, compressor, flush):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compressor.compress(chunk, flush=flush)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response):
+    """Compress `response` in place if the client, content type and size allow"""
+    view = current_app.view_functions.get(request.endpoint)
+    if (response.status_code != 200
+            or request.method == 'HEAD'
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or not getattr(view, 'compress', True)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if 'Range' in request.headers:
+        return response
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    streamed = response.direct_passthrough or response.is_streamed
+    if not streamed:
+        data = response.get_data()
+        if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+        compressor = _compressor(encoding)
+        compressed = compressor.compress(data) + compressor.finish()
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+    else:
+        length = response.content_length
+        if length is not None and length < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+        # Flush generated chunks as they come so pages render progressively;
+        # files are sent as fast as they compress
+        flush = not response.direct_passthrough
+        response.response = _compress_stream(response.response, _compressor(encoding), flush)
+        response.direct_passthrough = False
+        response.headers.pop('Content-Length', None)
+        response.headers['Accept-Ranges'] = 'none'
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The strong validator described the uncompressed bytes
+        response.set_etag(etag, weak=True)
+    return response
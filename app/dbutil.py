@@ -0,0 +1,84 @@
+"""
+Database helpers shared by the write paths
+
+Small dialect-aware building blocks used where the ORM would need a
+read-modify-write round trip: atomic "insert or add to" upserts, plus the
+SQLite connection settings that let the web app and the export worker share
+one database file.
+"""
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+
+
+def dialect_name():
+    """Name of the active database dialect ('sqlite', 'postgresql', ...)"""
+    return db.engine.dialect.name
+
+
+def enable_sqlite_wal(engine):
+    """Put a file-backed SQLite database in WAL mode
+
+    With the default rollback journal a long read (an export streaming a
+    million rows) blocks every writer until it finishes; in WAL mode readers
+    and a writer proceed concurrently. No-op for other databases.
+    """
+    if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_journal_mode(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.close()
+
+
+def upsert_increment(table, key, increments, values=None):
+    """Insert a row or add `increments` to the existing one, atomically
+
+    `key` maps the primary/unique key columns to their values, `increments`
+    maps numeric columns to the amount to add (also used as the initial value
+    on insert) and `values` holds other columns to set either way. Uses
+    INSERT ... ON CONFLICT on SQLite and PostgreSQL, UPDATE-then-INSERT
+    elsewhere.
+    """
+    values = values or {}
+    row = {**key, **increments, **values}
+
+    dialect = dialect_name()
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(table).values(**row)
+        updates = {name: table.c[name] + insert.excluded[name] for name in increments}
+        updates.update({name: insert.excluded[name] for name in values})
+        db.session.execute(insert.on_conflict_do_update(index_elements=list(key), set_=updates))
+        return
+
+    result = db.session.execute(
+        table.update()
+        .where(*[table.c[name] == value for name, value in key.items()])
+        .values(**{name: table.c[name] + amount for name, amount in increments.items()}, **values)
+    )
+    if result.rowcount == 0:
+        db.session.execute(table.insert().values(**row))
+
+
+def upsert_increments(table, key_columns, increment_columns, rows):
+    """upsert_increment() for many rows, as one executemany statement where possible
+
+    `rows` are dicts holding the `key_columns` and `increment_columns`
+    values; keys must not repeat within `rows`.
+    """
+    if not rows:
+        return
+
+    dialect = dialect_name()
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(table)
+        updates = {name: table.c[name] + insert.excluded[name] for name in increment_columns}
+        db.session.execute(insert.on_conflict_do_update(index_elements=list(key_columns), set_=updates), rows)
+        return
+
+    for row in rows:
+        upsert_increment(table,
+                         key={name: row[name] for name in key_columns},
+                         increments={name: row[name] for name in increment_columns})
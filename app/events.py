@@ -0,0 +1,258 @@
+"""
+Live update events
+
+/api/stream is a Server-Sent Events stream. On connect it sends the user's
+balance, budget progress and unread notification count, then only the
+fields that changed, each time the user's data changes. The stream stays
+silent while nothing changes; only keepalive comments are sent.
+
+Change signals travel through a broker. bump_data_version() and
+bump_notification_version() note the user on the session (app/versions.py),
+and when that transaction commits the broker wakes the user's open streams. Each stream then reads the figures
+(mostly from the data-version keyed caches) and sends the difference.
+Signals carry no data and are coalesced, so a burst of writes costs one
+wake-up.
+
+EVENT_BACKEND selects the broker:
+
+- local: in-process pub/sub. It only reaches streams served by the same
+  process, which is enough for `flask run` or a single worker.
+- database: local delivery, plus one thread per process that polls the
+  DataVersion and NotificationVersion rows of users with open streams every
+  EVENT_POLL_INTERVAL seconds. This picks up writes from other gunicorn workers and from CLI
+  commands without another service; it is a stand-in for a message bus.
+
+Idle streams hold no database connection. They do hold a worker thread
+(or greenlet), which is why gunicorn.conf.py uses gthread or gevent
+workers instead of sync ones.
+"""
+import json
+import queue
+import threading
+import time
+from flask import Response, current_app, has_app_context, stream_with_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app import db
+from app.analytics import AnalyticsSnapshot
+from app.models import BudgetGoal, Category, DataVersion, NotificationVersion
+from app.notifications import unread_count
+from app.versions import ALL_USERS, get_data_version, get_notification_version
+
+RETRY_MS = 3000          # client reconnect delay after a dropped stream
+POLL_BATCH_SIZE = 500    # user ids per version query in DatabaseBroker
+
+
+class Subscription:
+    """One open stream's wake-up signal; notifications coalesce into one"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._signal = queue.Queue(maxsize=1)
+
+    def notify(self):
+        try:
+            self._signal.put_nowait(True)
+        except queue.Full:
+            pass
+
+    def wait(self, timeout):
+        """True if notified within `timeout` seconds"""
+        try:
+            return self._signal.get(timeout=timeout)
+        except queue.Empty:
+            return False
+
+
+class LocalBroker:
+    """In-process pub/sub of 'user data changed' signals"""
+
+    def __init__(self, app):
+        self.app = app
+        self._subscribers = {}  # user_id -> set of Subscription
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscribers.pop(subscription.user_id, None)
+
+    def subscribed_users(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    def publish(self, user_ids):
+        """Wake the streams of `user_ids` (an iterable, or containing ALL_USERS)"""
+        with self._lock:
+            if ALL_USERS in user_ids:
+                targets = [s for subscriptions in self._subscribers.values() for s in subscriptions]
+            else:
+                targets = [s for user_id in user_ids for s in self._subscribers.get(user_id, ())]
+        for subscription in targets:
+            subscription.notify()
+
+
+class DatabaseBroker(LocalBroker):
+    """LocalBroker that also notices other processes' writes by polling the version counters"""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.interval = app.config['EVENT_POLL_INTERVAL']
+        self._versions = {}
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        self._start()
+        return super().subscribe(user_id)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='event-broker-poll', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with self.app.app_context():
+                    self.poll()
+            except Exception:
+                self.app.logger.exception('Event broker poll failed')
+
+    def poll(self):
+        """Publish users with open streams whose data or notification version moved since the last poll"""
+        user_ids = self.subscribed_users()
+        versions = {}
+        try:
+            for start in range(0, len(user_ids), POLL_BATCH_SIZE):
+                batch = user_ids[start:start + POLL_BATCH_SIZE]
+                for model in (DataVersion, NotificationVersion):
+                    for user_id, version in db.session.execute(
+                        select(model.user_id, model.version).where(model.user_id.in_(batch))
+                    ):
+                        versions[(user_id, model.__tablename__)] = version
+        finally:
+            db.session.remove()
+
+        # Users seen for the first time are woken too, in case they changed
+        # between the stream opening and this poll
+        changed = {user_id for (user_id, counter), version in versions.items()
+                   if self._versions.get((user_id, counter)) != version}
+        self._versions = versions
+        if changed:
+            self.publish(changed)
+
+
+BROKERS = {
+    'local': LocalBroker,
+    'database': DatabaseBroker,
+}
+
+
+def init_events(app):
+    """Create the app's broker (EVENT_BACKEND) and publish committed data changes to it"""
+    backend = app.config['EVENT_BACKEND']
+    if backend not in BROKERS:
+        raise ValueError(f'Unknown EVENT_BACKEND: {backend}')
+    app.extensions['event_broker'] = BROKERS[backend](app)
+
+    if not event.contains(Session, 'after_commit', _publish_changes):
+        event.listen(Session, 'after_commit', _publish_changes)
+        event.listen(Session, 'after_rollback', _discard_changes)
+
+
+def _publish_changes(session):
+    changed = session.info.pop('changed_users', None)
+    if changed and has_app_context():
+        broker = current_app.extensions.get('event_broker')
+        if broker is not None:
+            broker.publish(changed)
+
+
+def _discard_changes(session):
+    session.info.pop('changed_users', None)
+
+
+def budget_progress(user_id):
+    """Active budget goals with their progress, for the stream"""
+    rows = db.session.execute(
+        select(BudgetGoal.id, Category.name, BudgetGoal.current_spent, BudgetGoal.target_amount)
+        .join(Category, Category.id == BudgetGoal.category_id)
+        .where(BudgetGoal.user_id == user_id, BudgetGoal.is_active.is_(True))
+        .order_by(BudgetGoal.id)
+    ).all()
+    return [{
+        'id': goal_id,
+        'category': category,
+        'spent': spent or 0.0,
+        'target': target,
+        'progress': round((spent or 0.0) / target * 100, 1) if target else 0
+    } for goal_id, category, spent, target in rows]
+
+
+def live_state(user_id):
+    """(event id, figures pushed by the stream) for a user
+
+    The event id is "<data version>.<notification version>", so a client
+    reconnecting with Last-Event-ID is sent the figures again after either
+    changed.
+    """
+    # Versions first: the figures are then at least as new as the event id claims
+    version = f"{get_data_version(user_id)}.{get_notification_version(user_id)}"
+    state = {
+        'balance': AnalyticsSnapshot.get(user_id).balance,
+        'budgets': budget_progress(user_id),
+        'unread_notifications': unread_count(user_id)
+    }
+    return version, state
+
+
+def _event(version, data):
+    return f"event: update\nid: {version}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_response(user_id, last_event_id=None):
+    """text/event-stream response pushing a user's live figures until SSE_MAX_DURATION"""
+    broker = current_app.extensions['event_broker']
+    heartbeat = current_app.config['SSE_HEARTBEAT']
+    max_duration = current_app.config['SSE_MAX_DURATION']
+
+    def generate():
+        subscription = broker.subscribe(user_id)
+        deadline = time.monotonic() + max_duration
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            version, previous = live_state(user_id)
+            db.session.close()  # hold no connection while idle
+            # A reconnecting client that already saw this version needs nothing
+            if last_event_id != version:
+                yield _event(version, previous)
+
+            while time.monotonic() < deadline:
+                if not subscription.wait(heartbeat):
+                    yield ": keepalive\n\n"
+                    continue
+                version, state = live_state(user_id)
+                db.session.close()
+                changes = {name: value for name, value in state.items() if previous.get(name) != value}
+                previous = state
+                if changes:
+                    yield _event(version, changes)
+        finally:
+            broker.unsubscribe(subscription)
+
+    # Streams end after SSE_MAX_DURATION; EventSource reconnects with Last-Event-ID
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # stop nginx-style proxies buffering the stream
+    })
@@ -0,0 +1,275 @@
+"""
+Background export jobs
+
+Export routes validate the filters and insert an ExportJob row. With
+EXPORT_JOBS_INLINE (the default, which needs no extra service) the route
+renders it right away; otherwise the file is rendered by `flask exports
+worker`, a plain process polling the job table, so no gunicorn worker is
+held while a large export is written. The database is the queue: a worker
+claims a job with a conditional UPDATE (pending -> running), so several
+workers never render the same job.
+
+Progress is written on a separate short transaction after each chunk while
+the export query is still streaming. While a job runs, a background thread
+(Heartbeat) renews its lease (heartbeat_at) every JOB_HEARTBEAT_INTERVAL; a
+running job whose lease is older than EXPORT_JOB_LEASE belongs to a worker
+that died and is put back in the queue, however long a live export takes.
+
+Finished files live in EXPORT_DIR (mode 0700, files 0600, see
+app/storage.py) and
+are served through signed download links that expire after
+EXPORT_LINK_MAX_AGE; `flask exports purge` (also run by the worker) deletes
+expired files and jobs.
+
+The same worker runs transaction imports (ImportJob, app/imports.py),
+taken from their own queue once no export is pending.
+
+PDF reports are cached per data version (app/pdf_reports.py): a PDF export
+of unchanged data is marked done as soon as it is queued and shares the
+cached file.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from sqlalchemy import select, update, func
+from app import db
+from app.exports import write_csv, write_excel, export_filename
+from app.models import ExportJob, ImportJob, User
+from app.pdf_reports import build_pdf_report, cached_pdf_report, report_cache_dir
+from app.storage import private_directory, open_private
+from app.transaction_queries import parse_filters, filtered_totals
+
+EXPORT_FORMATS = {
+    'csv': {'writer': write_csv, 'mimetype': 'text/csv'},
+    'xlsx': {'writer': write_excel, 'mimetype': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'},
+    'pdf': {'writer': None, 'mimetype': 'application/pdf'},  # cached report, see run_job()
+}
+FILTER_ARGS = ('type', 'category', 'start_date', 'end_date', 'min_amount', 'max_amount')
+PURGE_INTERVAL = 600  # seconds between purges in the worker loop
+
+
+def enqueue_export(user_id, export_format, args):
+    """Validate the filters in `args` and queue an export job
+
+    Raises ValueError with a user-facing message on bad filters.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format: {export_format}')
+    filter_args = {name: args[name] for name in FILTER_ARGS if args.get(name)}
+    filters = parse_filters(filter_args)
+
+    job = ExportJob(user_id=user_id, export_format=export_format, filters=json.dumps(filter_args))
+    if export_format == 'pdf':
+        cached = cached_pdf_report(user_id, filters)
+        if cached:
+            _finish(job, cached)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def _finish(job, path):
+    job.status = 'done'
+    job.file_path = path
+    job.download_name = export_filename(db.session.get(User, job.user_id).username, job.export_format)
+    job.finished_at = datetime.utcnow()
+
+
+def claim_next_job(worker_name, model=ExportJob):
+    """Atomically take the oldest pending job (an ExportJob or ImportJob), or return None if there is none"""
+    while True:
+        job_id = db.session.execute(
+            select(model.id).where(model.status == 'pending').order_by(model.id).limit(1)
+        ).scalar()
+        if job_id is None:
+            return None
+
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            update(model)
+            .where(model.id == job_id, model.status == 'pending')
+            .values(status='running', worker=worker_name, started_at=now, heartbeat_at=now)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(model, job_id)
+        # Another worker got there first; try the next one
+
+
+def run_job(job):
+    """Render a claimed job to a file in EXPORT_DIR and mark it done or failed"""
+    writer = EXPORT_FORMATS[job.export_format]['writer']
+    path = os.path.join(current_app.config['EXPORT_DIR'], f"{job.id}-{uuid.uuid4().hex}.{job.export_format}")
+
+    def report(rows_done):
+        with db.engine.begin() as connection:
+            connection.execute(update(ExportJob).where(ExportJob.id == job.id).values(rows_done=rows_done))
+
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+    try:
+        filters = parse_filters(job.get_filters())
+        job.rows_total = filtered_totals(job.user_id, filters)['count']
+        db.session.commit()
+
+        if writer is None:
+            path = build_pdf_report(job.user_id, filters, progress=report)
+        else:
+            private_directory(current_app.config['EXPORT_DIR'])
+            with open_private(path) as output:
+                writer(job.user_id, filters, output, progress=report)
+
+        heartbeat.stop()
+        _finish(job, path)
+        db.session.commit()
+    except Exception as e:
+        heartbeat.stop()
+        db.session.rollback()
+        if writer is not None and os.path.exists(path):
+            os.remove(path)
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        current_app.logger.exception('Export job %s failed', job.id)
+
+
+class Heartbeat:
+    """Renews a running job's lease (an ExportJob or ImportJob) from a background thread until stopped"""
+
+    def __init__(self, job):
+        self.model = type(job)
+        self.job_id = job.id
+        self.worker = job.worker
+        self.interval = current_app.config['JOB_HEARTBEAT_INTERVAL']
+        self.engine = db.engine
+        self.logger = current_app.logger
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f'heartbeat-{self.model.__tablename__}-{job.id}',
+                                       daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(
+                        update(self.model)
+                        .where(self.model.id == self.job_id, self.model.status == 'running',
+                               self.model.worker == self.worker)
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+            except Exception:
+                self.logger.exception('Could not renew the lease of %s %s', self.model.__tablename__, self.job_id)
+
+
+def requeue_stale_jobs():
+    """Put running jobs whose lease has not been renewed within EXPORT_JOB_LEASE back in the queue"""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['EXPORT_JOB_LEASE'])
+    requeued = db.session.execute(
+        update(ExportJob)
+        .where(ExportJob.status == 'running',
+               func.coalesce(ExportJob.heartbeat_at, ExportJob.started_at) < cutoff)
+        .values(status='pending', worker=None, rows_done=0, heartbeat_at=None)
+    ).rowcount
+    db.session.commit()
+    return requeued
+
+
+def purge_expired_exports():
+    """Delete finished jobs (and their files) older than EXPORT_LINK_MAX_AGE
+
+    Cached PDF reports are shared between jobs and are removed separately,
+    once they have not been used for EXPORT_LINK_MAX_AGE.
+    """
+    max_age = current_app.config['EXPORT_LINK_MAX_AGE']
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    cache_dir = report_cache_dir()
+    jobs = ExportJob.query.filter(ExportJob.status.in_(('done', 'failed')), ExportJob.finished_at < cutoff).all()
+    for job in jobs:
+        if job.file_path and os.path.dirname(job.file_path) != cache_dir and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        db.session.delete(job)
+    db.session.commit()
+
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if time.time() - os.path.getmtime(path) > max_age:
+                os.remove(path)
+    return len(jobs)
+
+
+def run_worker(poll_interval=2.0, once=False):
+    """Process export and import jobs until interrupted (or until the queues are empty with once=True)"""
+    from app.imports import fail_stale_imports, run_import_job
+
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+    last_purge = 0
+    while True:
+        if time.monotonic() - last_purge > PURGE_INTERVAL:
+            requeue_stale_jobs()
+            fail_stale_imports()
+            purge_expired_exports()
+            last_purge = time.monotonic()
+
+        job = claim_next_job(worker_name)
+        if job is not None:
+            current_app.logger.info('Export job %s (%s) claimed by %s', job.id, job.export_format, worker_name)
+            run_job(job)
+            continue
+
+        job = claim_next_job(worker_name, ImportJob)
+        if job is not None:
+            current_app.logger.info('Import job %s (%s) claimed by %s', job.id, job.file_format, worker_name)
+            run_import_job(job)
+            continue
+
+        db.session.remove()
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='export-download')
+
+
+def download_token(job):
+    """Signed token for a finished job's download link"""
+    return _serializer().dumps(job.id)
+
+
+def job_from_token(token):
+    """Job id from a download token, or None if it is invalid or expired"""
+    try:
+        return _serializer().loads(token, max_age=current_app.config['EXPORT_LINK_MAX_AGE'])
+    except (BadSignature, SignatureExpired):
+        return None
+
+
+def job_status(job):
+    """JSON-friendly status of a job for polling clients"""
+    return {
+        'id': job.id,
+        'format': job.export_format,
+        'status': job.status,
+        'progress': job.progress,
+        'rows_done': job.rows_done,
+        'rows_total': job.rows_total,
+        'error': job.error if job.status == 'failed' else None,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
@@ -0,0 +1,144 @@
+"""
+Transaction exports
+
+Export rows are read in chunks straight from one SELECT with the category
+pre-joined and "Balance After" computed by the database as a running sum
+(window function), so an export walks the table once, never holds more than
+one chunk in memory and can start sending bytes before the last row is read.
+Excel files are written with openpyxl's write-only mode.
+
+Every writer takes an optional `progress` callback, called with the number
+of rows written after each chunk; the export worker (app/export_jobs.py)
+uses it to report progress while rendering to a file.
+"""
+import csv
+import io
+import tempfile
+from datetime import datetime
+from sqlalchemy import select, func, case
+from app import db
+from app.models import Transaction, Category
+from app.transaction_queries import apply_filters
+
+EXPORT_COLUMNS = ['Date', 'Type', 'Category', 'Description', 'Amount', 'Balance After']
+CHUNK_SIZE = 1000
+EXCEL_COLUMNS = ['ID', 'Date', 'Category', 'Amount', 'Description']
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+def export_query(user_id, filters):
+    """SELECT of export rows, newest first, with the running balance
+
+    The balance after each transaction is the running total of the matching
+    rows in (date, id) order up to and including it.
+    """
+    signed = case(
+        (Transaction.transaction_type == 'income', Transaction.amount),
+        else_=-Transaction.amount
+    )
+    balance_after = func.sum(signed).over(order_by=(Transaction.date, Transaction.id))
+
+    query = select(
+        Transaction.id,
+        Transaction.date,
+        Transaction.transaction_type,
+        Category.name,
+        Transaction.description,
+        Transaction.amount,
+        balance_after
+    ).outerjoin(Category, Category.id == Transaction.category_id)
+
+    return apply_filters(query, user_id, filters)\
+        .order_by(Transaction.date.desc(), Transaction.id.desc())
+
+
+def iter_export_rows(user_id, filters, chunk_size=CHUNK_SIZE, progress=None, limit=None):
+    """Export rows as tuples, fetched `chunk_size` at a time
+
+    Uses a server-side cursor where the driver supports one (PostgreSQL).
+    `limit` keeps only the newest rows; balances still count every row.
+    """
+    query = export_query(user_id, filters)
+    if limit is not None:
+        query = query.limit(limit)
+    result = db.session.execute(
+        query.execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    rows = 0
+    for transaction_id, date, transaction_type, category, description, amount, balance in result:
+        yield transaction_id, date, transaction_type.title(), category or '', description or '', amount, balance
+        rows += 1
+        if progress and rows % chunk_size == 0:
+            progress(rows)
+    if progress:
+        progress(rows)
+
+
+def iter_csv(user_id, filters, chunk_size=CHUNK_SIZE, progress=None):
+    """CSV export as a stream of text chunks, header first"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(EXPORT_COLUMNS)
+    yield flush()
+
+    pending = 0
+    for _, date, transaction_type, category, description, amount, balance in iter_export_rows(user_id, filters, chunk_size, progress):
+        writer.writerow([
+            date.strftime('%Y-%m-%d %H:%M'),
+            transaction_type,
+            category,
+            description,
+            f"${amount:.2f}",
+            f"${balance:.2f}"
+        ])
+        pending += 1
+        if pending >= chunk_size:
+            yield flush()
+            pending = 0
+    if pending:
+        yield flush()
+
+
+def write_csv(user_id, filters, output, chunk_size=CHUNK_SIZE, progress=None):
+    """Write the CSV export to a binary file object"""
+    for chunk in iter_csv(user_id, filters, chunk_size, progress):
+        output.write(chunk.encode('utf-8'))
+
+
+def write_excel(user_id, filters, output=None, chunk_size=CHUNK_SIZE, progress=None):
+    """Write the Excel export to `output`, by default a spooled temporary file
+
+    Returns the file rewound and ready to send; the caller owns it and
+    should close it once sent.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Transactions')
+    worksheet.append(EXCEL_COLUMNS)
+    for transaction_id, date, _, category, description, amount, _ in iter_export_rows(user_id, filters, chunk_size, progress):
+        worksheet.append([
+            transaction_id,
+            date.strftime('%Y-%m-%d %H:%M'),
+            category,
+            amount,
+            description
+        ])
+
+    if output is None:
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def export_filename(username, extension):
+    """Download filename for an export made now"""
+    return f"transactions_{username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
@@ -0,0 +1,210 @@
+"""
+Spending forecasts
+
+Forecasts monthly expenses per category from the series stored in
+MonthlyRollup: one query reading months x categories rows, however many
+transactions the history holds. The series of all categories form one
+matrix and every model is computed for all categories at once with NumPy:
+
+- ewma: exponentially weighted moving average (simple exponential smoothing)
+- trend: least-squares linear trend
+- seasonal: seasonal naive, the same month one year earlier
+
+Each model is scored by its one-step-ahead errors over the history (the
+trend is refitted on every prefix through cumulative sums), and the RMSE of
+those errors sets the width of the prediction intervals. model='auto'
+picks, per category, the model with the lowest one-step RMSE.
+
+The current month is still incomplete, so series end with the previous
+month and the first forecast is for the current month.
+"""
+from datetime import datetime
+from statistics import NormalDist
+from sqlalchemy import select
+from app import db
+from app.models import Category, MonthlyRollup
+from app.periods import month_start, add_months
+
+MODELS = ('ewma', 'trend', 'seasonal')
+EWMA_ALPHA = 0.3
+SEASON = 12          # months
+MIN_HISTORY = 3      # complete months needed before forecasting
+DEFAULT_LEVEL = 0.8  # coverage of the prediction intervals
+
+
+def monthly_expense_series(user_id, until=None):
+    """Monthly expense totals per category, as a matrix
+
+    Returns (months, categories, series): months are first-of-month dates
+    from the first month with an expense up to the month before `until`
+    (default: the current month), categories are (id, name) pairs and
+    series[c, m] is category c's total in months[m] (0 when nothing was
+    spent).
+    """
+    import numpy as np
+
+    until = until or month_start(datetime.utcnow())
+    rows = db.session.execute(
+        select(MonthlyRollup.category_id, Category.name, MonthlyRollup.month, MonthlyRollup.total)
+        .join(Category, Category.id == MonthlyRollup.category_id)
+        .where(MonthlyRollup.user_id == user_id,
+               MonthlyRollup.transaction_type == 'expense',
+               MonthlyRollup.count > 0,
+               MonthlyRollup.month < until)
+    ).all()
+    if not rows:
+        return [], [], np.zeros((0, 0))
+
+    first = min(month for _, _, month, _ in rows)
+    month_count = (until.year - first.year) * 12 + until.month - first.month
+    months = [add_months(first, offset) for offset in range(month_count)]
+    categories = sorted({(category_id, name) for category_id, name, _, _ in rows})
+    row_of = {category_id: index for index, (category_id, _) in enumerate(categories)}
+
+    series = np.zeros((len(categories), month_count))
+    for category_id, _, month, total in rows:
+        series[row_of[category_id], (month.year - first.year) * 12 + month.month - first.month] += total
+    return months, categories, series
+
+
+def _rmse(errors):
+    import numpy as np
+    if errors.shape[1] == 0:
+        return np.full(errors.shape[0], np.inf)
+    return np.sqrt(np.mean(errors ** 2, axis=1))
+
+
+def _ewma(series, steps, alpha=EWMA_ALPHA):
+    """(forecast, interval scale, one-step RMSE), forecast/scale shaped (categories, horizon)"""
+    import numpy as np
+
+    level = series[:, 0].copy()
+    errors = np.empty((series.shape[0], series.shape[1] - 1))
+    for t in range(1, series.shape[1]):
+        errors[:, t - 1] = series[:, t] - level
+        level += alpha * errors[:, t - 1]
+
+    forecast = np.repeat(level[:, None], len(steps), axis=1)
+    scale = np.sqrt(1 + (steps - 1) * alpha ** 2)
+    return forecast, np.broadcast_to(scale, forecast.shape), _rmse(errors)
+
+
+def _trend(series, steps):
+    """Linear trend fitted on the whole history; one-step errors come from refits on each prefix"""
+    import numpy as np
+
+    months = series.shape[1]
+    x = np.arange(months, dtype=float)
+    n = x + 1
+    sum_x, sum_xx = np.cumsum(x), np.cumsum(x * x)
+    sum_y, sum_xy = np.cumsum(series, axis=1), np.cumsum(series * x, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x ** 2)
+    intercept = (sum_y - slope * sum_x) / n
+
+    # Fit on x[0..t-1] (prefix index t-1) predicts x[t]; needs two points
+    predicted = intercept[:, 1:-1] + slope[:, 1:-1] * x[2:]
+    errors = series[:, 2:] - predicted
+
+    target = months - 1 + steps
+    forecast = intercept[:, -1:] + slope[:, -1:] * target
+    spread = np.sum((x - x.mean()) ** 2)
+    scale = np.sqrt(1 + 1 / months + (target - x.mean()) ** 2 / spread)
+    return forecast, np.broadcast_to(scale, forecast.shape), _rmse(errors)
+
+
+def _seasonal(series, steps):
+    """Seasonal naive: the value SEASON months before; unavailable (inf RMSE) with under two seasons"""
+    import numpy as np
+
+    categories, months = series.shape
+    if months <= SEASON:
+        nothing = np.full((categories, len(steps)), np.nan)
+        return nothing, nothing, np.full(categories, np.inf)
+
+    errors = series[:, SEASON:] - series[:, :-SEASON]
+    forecast = series[:, months - SEASON + (steps - 1) % SEASON]
+    scale = np.sqrt((steps - 1) // SEASON + 1)
+    return forecast, np.broadcast_to(scale, forecast.shape), _rmse(errors)
+
+
+def forecast_series(series, horizon=1, model='auto', level=DEFAULT_LEVEL):
+    """Forecast the next `horizon` values of every row of `series` (categories x months)
+
+    Returns a dict of arrays: forecast, lower and upper (categories x
+    horizon), rmse (per category), model (index into MODELS per category)
+    and half_width (the interval half-widths before clipping at zero).
+    """
+    import numpy as np
+
+    if model != 'auto' and model not in MODELS:
+        raise ValueError(f'Unknown forecasting model: {model}')
+
+    steps = np.arange(1, horizon + 1)
+    fits = [_ewma(series, steps), _trend(series, steps), _seasonal(series, steps)]
+    rmse = np.stack([fit[2] for fit in fits], axis=1)
+
+    if model == 'auto':
+        chosen = np.argmin(rmse, axis=1)  # ties go to the earlier (simpler) model
+    else:
+        chosen = np.full(series.shape[0], MODELS.index(model))
+
+    rows = np.arange(series.shape[0])
+    forecast = np.stack([fit[0] for fit in fits])[chosen, rows]
+    scale = np.stack([fit[1] for fit in fits])[chosen, rows]
+    chosen_rmse = rmse[rows, chosen]
+    # A model with no one-step errors yet (very short history) gets no interval
+    chosen_rmse = np.where(np.isfinite(chosen_rmse), chosen_rmse, np.nan)
+
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    half_width = z * chosen_rmse[:, None] * scale
+    forecast = np.maximum(forecast, 0.0)  # spending cannot go negative
+    return {
+        'forecast': forecast,
+        'lower': np.maximum(forecast - half_width, 0.0),
+        'upper': forecast + half_width,
+        'half_width': half_width,
+        'rmse': chosen_rmse,
+        'model': chosen
+    }
+
+
+def forecast_expenses(user_id, horizon=1, model='auto', level=DEFAULT_LEVEL):
+    """Per-category and total expense forecasts for the next `horizon` months
+
+    Returns None while the user has fewer than MIN_HISTORY complete months
+    of expenses. The total's interval assumes independent category errors.
+    """
+    import numpy as np
+
+    months, categories, series = monthly_expense_series(user_id)
+    if len(months) < MIN_HISTORY:
+        return None
+
+    result = forecast_series(series, horizon, model, level)
+    total = result['forecast'].sum(axis=0)
+    total_half_width = np.sqrt(np.nansum(result['half_width'] ** 2, axis=0))
+
+    def values(array):
+        return [round(float(value), 2) if np.isfinite(value) else None for value in array]
+
+    return {
+        'months': [add_months(months[-1], step).isoformat() for step in range(1, horizon + 1)],
+        'level': level,
+        'history_months': len(months),
+        'categories': [{
+            'category_id': category_id,
+            'category_name': name,
+            'model': MODELS[result['model'][index]],
+            'forecast': values(result['forecast'][index]),
+            'lower': values(result['lower'][index]),
+            'upper': values(result['upper'][index]),
+            'rmse': values(result['rmse'][index:index + 1])[0]
+        } for index, (category_id, name) in enumerate(categories)],
+        'total': {
+            'forecast': values(total),
+            'lower': values(np.maximum(total - total_half_width, 0.0)),
+            'upper': values(total + total_half_width)
+        }
+    }
@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, PasswordField, FloatField, SelectField, TextAreaField, DateField
 from wtforms.validators import DataRequired, Email, EqualTo, NumberRange, Length
 from datetime import date
@@ -55,3 +56,17 @@ class CategoryForm(FlaskForm):
     color = StringField('Color', validators=[
         Length(min=7, max=7, message="Color must be in #RRGGBB format")
     ], default='#007bff')
+
+class ImportForm(FlaskForm):
+    """Transaction file import form"""
+    file = FileField('File', validators=[
+        FileRequired(message="Please choose a file"),
+        FileAllowed(['csv', 'ofx', 'qfx', 'qif'], message="Upload a CSV, OFX, QFX or QIF file")
+    ])
+    file_format = SelectField('Format', choices=[
+        ('', 'From file extension'),
+        ('csv', 'CSV'),
+        ('ofx', 'OFX / QFX'),
+        ('qif', 'QIF')
+    ], default='')
+    category_id = SelectField('Category for unknown rows', coerce=int, default=0)
@@ -0,0 +1,408 @@
+"""
+Bulk transaction imports
+
+Transaction files are imported in one streaming pass: CSV (including this
+app's own CSV export), OFX/QFX and QIF. A parser yields one record at a
+time, so a file of any size is never held in memory. Records are validated
+CHUNK_SIZE at a time against an in-memory map of category names, and the
+valid rows of a chunk are inserted with one executemany INSERT.
+
+The ledger, monthly rollups and budget goals are updated once per chunk
+from the chunk's aggregated totals (app.ledger.apply_transactions()), in
+the same database transaction as the rows, and every chunk is committed on
+its own. Each commit leaves the user's totals consistent with the rows
+imported so far, and on SQLite the web app is not locked out of writing
+for the length of the import. Invalid rows are skipped and reported (the
+first MAX_REPORTED_ERRORS of them).
+
+Uploads use the export job machinery (app/export_jobs.py): the upload
+route copies the file, up to IMPORT_MAX_SIZE, into the private IMPORT_DIR
+and inserts an ImportJob. With IMPORT_JOBS_INLINE (the default) the route
+imports it right away; otherwise `flask exports worker` does, renewing the
+job's lease like an export's. Progress is recorded on the job with each
+chunk's commit. `flask imports run FILE --user NAME` imports a file
+directly.
+"""
+import csv
+import html
+import io
+import json
+import math
+import os
+import re
+import uuid
+from datetime import datetime, timedelta
+from functools import lru_cache
+from flask import current_app
+from sqlalchemy import select, update, func
+from app import db
+from app.export_jobs import Heartbeat
+from app.ledger import apply_transactions
+from app.models import Category, ImportJob, Transaction
+from app.storage import open_private, private_directory
+
+CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 50
+DESCRIPTION_LENGTH = 200  # Transaction.description
+UPLOAD_BLOCK_SIZE = 64 * 1024
+FORMAT_EXTENSIONS = {'.csv': 'csv', '.ofx': 'ofx', '.qfx': 'ofx', '.qif': 'qif'}
+
+# Accepted CSV header names (lowercased) for each field; Date and Amount are required
+CSV_COLUMNS = {
+    'date': ('date', 'transaction date', 'posted date', 'booking date'),
+    'amount': ('amount', 'value'),
+    'type': ('type', 'transaction type'),
+    'category': ('category',),
+    'description': ('description', 'memo', 'payee', 'name', 'details'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y%m%d', '%Y%m%d%H%M%S',
+                '%m/%d/%Y', '%m/%d/%y', '%d.%m.%Y')
+TRANSACTION_TYPES = {'income': 'income', 'credit': 'income', 'expense': 'expense', 'debit': 'expense'}
+
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+OFX_READ_SIZE = 64 * 1024
+QIF_TRANSACTION_SECTIONS = {'type:bank', 'type:cash', 'type:ccard', 'type:oth a', 'type:oth l'}
+
+
+def parse_csv(stream):
+    """Yield (line number, fields) for the rows of a CSV file with a header row
+
+    Without a Type column the sign of the amount decides: negative amounts
+    are expenses.
+    """
+    reader = csv.reader(stream)
+    header = [name.strip().lower() for name in next(reader, [])]
+    columns = {}
+    for field, names in CSV_COLUMNS.items():
+        for name in names:
+            if name in header:
+                columns[field] = header.index(name)
+                break
+    if 'date' not in columns or 'amount' not in columns:
+        raise ValueError('The CSV file needs a header row with Date and Amount columns')
+
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        yield reader.line_num, {field: values[index] if index < len(values) else None
+                                for field, index in columns.items()}
+
+
+def _ofx_tags(stream):
+    """(closing slash, tag, text up to the next tag) for each tag, read a block at a time"""
+    pending = ''
+    while True:
+        block = stream.read(OFX_READ_SIZE)
+        text = pending + block
+        if block:
+            # Keep the last, possibly incomplete, tag for the next block
+            cut = max(text.rfind('<'), 0)
+            text, pending = text[:cut], text[cut:]
+        yield from OFX_TAG.findall(text)
+        if not block:
+            return
+
+
+def parse_ofx(stream):
+    """Yield (transaction number, fields) for the STMTTRN records of an OFX/QFX file
+
+    Handles both SGML (OFX 1.x, leaf tags unclosed) and XML (OFX 2.x).
+    The amount is signed, so negative amounts are expenses.
+    """
+    record = None
+    number = 0
+    for closing, tag, text in _ofx_tags(stream):
+        tag = tag.upper()
+        if tag == 'STMTTRN':
+            if not closing:
+                record = {}
+                number += 1
+            elif record is not None:
+                name, memo = record.get('NAME'), record.get('MEMO')
+                yield number, {
+                    'date': (record.get('DTPOSTED') or '')[:8],
+                    'amount': record.get('TRNAMT'),
+                    'description': f"{name} - {memo}" if name and memo and memo != name else name or memo
+                }
+                record = None
+        elif record is not None and not closing:
+            record.setdefault(tag, html.unescape(text.strip()))
+
+
+def parse_qif(stream):
+    """Yield (line number, fields) for the transactions of a QIF file
+
+    Only bank, cash and credit card sections are read. Categories of the
+    form Parent:Child match Parent when Child is not a category, and
+    transfers ([Account]) count as uncategorised.
+    """
+    in_transactions = False
+    record = {}
+    start = None
+    for number, line in enumerate(stream, 1):
+        line = line.rstrip('\r\n')
+        if not line:
+            continue
+        code, value = line[0], line[1:].strip()
+        if code == '!':
+            in_transactions = value.lower() in QIF_TRANSACTION_SECTIONS
+            record, start = {}, None
+        elif code == '^':
+            if in_transactions and record:
+                category = record.get('L')
+                yield start, {
+                    'date': (record.get('D') or '').replace("'", '/').replace(' ', ''),
+                    'amount': record.get('T') or record.get('U'),
+                    'category': None if category and category.startswith('[') else category,
+                    'description': record.get('P') or record.get('M')
+                }
+            record, start = {}, None
+        elif in_transactions:
+            start = start or number
+            record.setdefault(code, value)
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'ofx': parse_ofx,
+    'qif': parse_qif,
+}
+
+
+def detect_format(filename):
+    """Import format for a file name, from its extension"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in FORMAT_EXTENSIONS:
+        raise ValueError('Upload a CSV, OFX, QFX or QIF file')
+    return FORMAT_EXTENSIONS[extension]
+
+
+def category_map():
+    """Lowercased category name -> id (the oldest category of a name wins)"""
+    categories = {}
+    for category_id, name in db.session.execute(select(Category.id, Category.name).order_by(Category.id)):
+        categories.setdefault(name.strip().lower(), category_id)
+    return categories
+
+
+@lru_cache(maxsize=4096)  # statements repeat the same few hundred dates
+def _parse_date(text):
+    text = (text or '').strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date '{text}'")
+
+
+def _parse_amount(text):
+    value = (text or '').strip()
+    for symbol in ('$', '€', '£', ' '):
+        value = value.replace(symbol, '')
+    negative = value.startswith('(') and value.endswith(')')
+    if negative:
+        value = value[1:-1]
+    # 12,50 is a decimal comma; 1,250.00 has a thousands separator
+    value = value.replace(',', '.') if re.fullmatch(r'-?\d+,\d{1,2}', value) else value.replace(',', '')
+    try:
+        amount = float(value)
+    except ValueError:
+        amount = math.nan
+    if not math.isfinite(amount):
+        raise ValueError(f"Invalid amount '{text or ''}'")
+    return -amount if negative else amount
+
+
+def _category_id(name, categories, default_category_id):
+    name = (name or '').strip()
+    key = name.lower()
+    category_id = categories.get(key) or categories.get(key.split(':')[0].strip())
+    if category_id:
+        return category_id
+    if default_category_id is None:
+        raise ValueError(f"Unknown category '{name}'" if name else 'No category')
+    return default_category_id
+
+
+def validate_chunk(user_id, records, categories, default_category_id, summary):
+    """Transaction rows for the valid records; invalid ones are counted in `summary`"""
+    rows = []
+    now = datetime.utcnow()
+    for number, fields in records:
+        try:
+            amount = _parse_amount(fields.get('amount'))
+            kind = (fields.get('type') or '').strip().lower()
+            if kind and kind not in TRANSACTION_TYPES:
+                raise ValueError(f"Unknown type '{fields['type']}'")
+            transaction_type = TRANSACTION_TYPES[kind] if kind else ('expense' if amount < 0 else 'income')
+            if abs(amount) < 0.01:
+                raise ValueError('Amount must be greater than 0')
+            rows.append({
+                'user_id': user_id,
+                'category_id': _category_id(fields.get('category'), categories, default_category_id),
+                'amount': abs(amount),
+                'transaction_type': transaction_type,
+                'date': _parse_date(fields.get('date')),
+                'description': (fields.get('description') or '').strip()[:DESCRIPTION_LENGTH] or None,
+                'created_at': now
+            })
+        except ValueError as e:
+            summary['skipped'] += 1
+            if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                summary['errors'].append({'row': number, 'error': str(e)})
+    return rows
+
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_transactions(user_id, path, file_format=None, default_category_id=None,
+                        chunk_size=CHUNK_SIZE, progress=None):
+    """Import a transaction file for a user, committing one chunk at a time
+
+    Rows whose category is missing or unknown get `default_category_id`,
+    by default the 'Other' category. Returns a summary dict with the
+    imported and skipped row counts, the first row errors and
+    bytes_done/bytes_total. `progress`, if given, is called with the
+    summary before each chunk is committed.
+
+    Raises ValueError with a user-facing message for an unknown format or
+    a CSV file without the required columns.
+    """
+    file_format = file_format or detect_format(path)
+    if file_format not in PARSERS:
+        raise ValueError(f'Unknown import format: {file_format}')
+    categories = category_map()
+    if default_category_id is None:
+        default_category_id = categories.get('other')
+
+    summary = {'imported': 0, 'skipped': 0, 'errors': [], 'bytes_done': 0, 'bytes_total': os.path.getsize(path)}
+    with open(path, 'rb') as raw:
+        stream = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace', newline='')
+        for records in _chunks(PARSERS[file_format](stream), chunk_size):
+            rows = validate_chunk(user_id, records, categories, default_category_id, summary)
+            if rows:
+                db.session.execute(Transaction.__table__.insert(), rows)
+                apply_transactions(user_id, rows)
+                summary['imported'] += len(rows)
+            summary['bytes_done'] = raw.tell()
+            if progress:
+                progress(summary)
+            db.session.commit()
+
+    summary['bytes_done'] = summary['bytes_total']
+    return summary
+
+
+def enqueue_import(user_id, upload, file_format=None, default_category_id=None):
+    """Store an uploaded file (a werkzeug FileStorage) in IMPORT_DIR and queue its import
+
+    Raises ValueError with a user-facing message for an unsupported or
+    oversized file.
+    """
+    filename = upload.filename or ''
+    file_format = file_format or detect_format(filename)
+    if file_format not in PARSERS:
+        raise ValueError(f'Unknown import format: {file_format}')
+
+    directory = private_directory(current_app.config['IMPORT_DIR'])
+    path = os.path.join(directory, f"{uuid.uuid4().hex}.{file_format}")
+    max_size = current_app.config['IMPORT_MAX_SIZE']
+    size = 0
+    with open_private(path) as output:
+        try:
+            # Copy in blocks and stop as soon as the file is too large
+            for block in iter(lambda: upload.stream.read(UPLOAD_BLOCK_SIZE), b''):
+                size += len(block)
+                if size > max_size:
+                    raise ValueError(f'Files up to {max_size // (1024 * 1024)} MB can be imported')
+                output.write(block)
+        except BaseException:
+            output.close()
+            os.remove(path)
+            raise
+
+    job = ImportJob(user_id=user_id, file_format=file_format, filename=filename[:200], file_path=path,
+                    default_category_id=default_category_id, bytes_total=size)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def run_import_job(job):
+    """Import a claimed job's file and mark it done or failed; the file is deleted either way"""
+    def report(summary):
+        job.rows_done = summary['imported']
+        job.rows_skipped = summary['skipped']
+        job.bytes_done = summary['bytes_done']
+        job.errors = json.dumps(summary['errors'])
+
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+    try:
+        summary = import_transactions(job.user_id, job.file_path, job.file_format, job.default_category_id,
+                                      progress=report)
+        report(summary)
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        # Chunks committed before the failure stay imported; the job shows how many
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        current_app.logger.exception('Import job %s failed', job.id)
+    finally:
+        heartbeat.stop()
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+
+
+def fail_stale_imports():
+    """Mark running imports whose lease has not been renewed within IMPORT_JOB_LEASE as failed
+
+    Unlike exports they are not retried: their committed chunks are
+    already imported.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['IMPORT_JOB_LEASE'])
+    jobs = ImportJob.query.filter(ImportJob.status == 'running',
+                                  func.coalesce(ImportJob.heartbeat_at, ImportJob.started_at) < cutoff).all()
+    for job in jobs:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+    if jobs:
+        db.session.execute(
+            update(ImportJob)
+            .where(ImportJob.id.in_([job.id for job in jobs]))
+            .values(status='failed', error='The import was interrupted', finished_at=datetime.utcnow())
+        )
+    db.session.commit()
+    return len(jobs)
+
+
+def import_job_status(job):
+    """JSON-friendly status of an import job for polling clients"""
+    return {
+        'id': job.id,
+        'format': job.file_format,
+        'filename': job.filename,
+        'status': job.status,
+        'progress': job.progress,
+        'rows_done': job.rows_done,
+        'rows_skipped': job.rows_skipped,
+        'errors': job.get_errors(),
+        'error': job.error if job.status == 'failed' else None,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
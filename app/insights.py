@@ -0,0 +1,214 @@
+"""
+Smart insights
+
+Spending patterns and recommendations are computed once per user and data
+version and stored in the SpendingPattern and SmartRecommendation tables;
+InsightState records which data version they were computed from.
+
+`flask patterns rebuild` (run nightly) computes them for every stale user
+(a write since the last run, or INSIGHTS_TTL passed): users are split into
+shards processed on a ProcessPoolExecutor, and each shard's results are
+written with one bulk delete/insert per table.
+
+Pages and APIs call get_insights(), which never writes. It reads the stored
+rows while they are current; for a stale user it computes the insights in
+memory (patterns are analyzed a single time and the recommendations are
+derived from the same result) and caches them per process on (user, data
+version) until the next rebuild stores them.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete, func, or_
+from app import db
+from app.cache import MemoryCache
+from app.dbutil import upsert_increment
+from app.models import (Category, DataVersion, InsightState, SmartRecommendation, SpendingPattern,
+                        User, analyze_spending_patterns, generate_smart_recommendations)
+from app.versions import get_data_version
+
+# Recommendations mention balances and trends, so refresh them daily even
+# without writes
+INSIGHTS_TTL = timedelta(hours=24)
+SHARD_SIZE = 100  # users per batch job task (and per commit)
+
+# Insights computed by GETs for users whose stored rows are stale
+_live_insights = MemoryCache(max_entries=1024, ttl=int(INSIGHTS_TTL.total_seconds()))
+
+
+def insights_are_current(user_id, data_version=None):
+    """True if the stored insights match the user's data and are within the TTL"""
+    state = db.session.get(InsightState, user_id)
+    if state is None:
+        return False
+    if data_version is None:
+        data_version = get_data_version(user_id)
+    return state.data_version == data_version and state.computed_at > datetime.utcnow() - INSIGHTS_TTL
+
+
+def compute_insights(user_id):
+    """(patterns, recommendations) computed from the user's data without storing anything
+
+    Recommendations are unsaved SmartRecommendation objects (no id), sorted
+    like the stored ones.
+    """
+    patterns = analyze_spending_patterns(user_id)
+    now = datetime.utcnow()
+    recommendations = [SmartRecommendation(
+        user_id=user_id,
+        recommendation_type=recommendation['type'],
+        title=recommendation['title'],
+        description=recommendation['description'],
+        priority=recommendation['priority'],
+        impact_score=recommendation['impact_score'],
+        is_read=False,
+        is_applied=False,
+        created_at=now,
+        expires_at=now + INSIGHTS_TTL
+    ) for recommendation in generate_smart_recommendations(user_id, patterns)]
+    recommendations.sort(key=lambda recommendation: recommendation.impact_score, reverse=True)
+    return patterns, recommendations
+
+
+def store_insights_batch(results):
+    """Replace stored insights for several users with one statement per table (caller commits)
+
+    `results` holds (user_id, data_version, patterns, recommendations) tuples.
+    InsightState rows are upserted per user.
+    """
+    if not results:
+        return
+    now = datetime.utcnow()
+    user_ids = [user_id for user_id, _, _, _ in results]
+
+    for model in (SpendingPattern, SmartRecommendation):
+        db.session.execute(delete(model).where(model.user_id.in_(user_ids)))
+
+    pattern_rows = [{
+        'user_id': user_id,
+        'category_id': pattern['category_id'],
+        'pattern_type': 'category',
+        'average_amount': pattern['average_amount'],
+        'predicted_next': pattern['predicted_next'],
+        'confidence_score': pattern['confidence_score'],
+        'trend': pattern['trend'],
+        'last_updated': now
+    } for user_id, _, patterns, _ in results for pattern in patterns]
+    if pattern_rows:
+        db.session.execute(insert(SpendingPattern), pattern_rows)
+
+    recommendation_rows = [{
+        'user_id': user_id,
+        'recommendation_type': recommendation['type'],
+        'title': recommendation['title'],
+        'description': recommendation['description'],
+        'priority': recommendation['priority'],
+        'impact_score': recommendation['impact_score'],
+        'is_read': False,
+        'is_applied': False,
+        'created_at': now,
+        'expires_at': now + INSIGHTS_TTL
+    } for user_id, _, _, recommendations in results for recommendation in recommendations]
+    if recommendation_rows:
+        db.session.execute(insert(SmartRecommendation), recommendation_rows)
+
+    # Upserted, not deleted and reinserted: a page view may refresh the same user concurrently
+    for user_id, data_version, _, _ in results:
+        upsert_increment(
+            InsightState.__table__,
+            key={'user_id': user_id},
+            increments={},
+            values={'data_version': data_version, 'computed_at': now}
+        )
+
+
+def stored_patterns(user_id):
+    """Stored spending patterns as dicts, in the shape analyze_spending_patterns() returns"""
+    rows = db.session.execute(
+        select(SpendingPattern, Category.name)
+        .join(Category, Category.id == SpendingPattern.category_id)
+        .where(SpendingPattern.user_id == user_id)
+        .order_by(SpendingPattern.category_id)
+    ).all()
+    return [{
+        'category_id': pattern.category_id,
+        'category_name': category_name,
+        'average_amount': pattern.average_amount,
+        'predicted_next': pattern.predicted_next,
+        'trend': pattern.trend,
+        'confidence_score': pattern.confidence_score
+    } for pattern, category_name in rows]
+
+
+def get_insights(user_id):
+    """(patterns, recommendations) for a user: the stored rows if current, else computed in memory
+
+    Read-only, safe to call from GET requests.
+    """
+    data_version = get_data_version(user_id)
+    if not insights_are_current(user_id, data_version):
+        return _live_insights.get_or_set((user_id, data_version), lambda: compute_insights(user_id))
+
+    recommendations = SmartRecommendation.query.filter_by(user_id=user_id)\
+                                               .order_by(SmartRecommendation.impact_score.desc()).all()
+    return stored_patterns(user_id), recommendations
+
+
+def stale_user_ids():
+    """Ids of users whose stored insights are missing, outdated or older than INSIGHTS_TTL"""
+    cutoff = datetime.utcnow() - INSIGHTS_TTL
+    return db.session.execute(
+        select(User.id)
+        .outerjoin(DataVersion, DataVersion.user_id == User.id)
+        .outerjoin(InsightState, InsightState.user_id == User.id)
+        .where(or_(InsightState.user_id.is_(None),
+                   InsightState.data_version != func.coalesce(DataVersion.version, 0),
+                   InsightState.computed_at <= cutoff))
+        .order_by(User.id)
+    ).scalars().all()
+
+
+def rebuild_insights(user_ids, workers=None, shard_size=SHARD_SIZE):
+    """Recompute and store insights for `user_ids`, sharded across worker processes
+
+    workers=1 runs in this process. Returns the number of users rebuilt.
+    """
+    shards = [list(user_ids[i:i + shard_size]) for i in range(0, len(user_ids), shard_size)]
+    workers = min(workers or os.cpu_count() or 1, len(shards))
+    if workers <= 1:
+        return sum(rebuild_shard(shard) for shard in shards)
+
+    # Forked workers must not reuse this process's pooled connections
+    db.engine.dispose()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return sum(pool.map(_rebuild_shard_in_worker, shards))
+
+
+def rebuild_shard(user_ids):
+    """Compute insights for a batch of users and store them in one transaction"""
+    results = []
+    for user_id in user_ids:
+        data_version = get_data_version(user_id)
+        patterns = analyze_spending_patterns(user_id)
+        results.append((user_id, data_version, patterns, generate_smart_recommendations(user_id, patterns)))
+    store_insights_batch(results)
+    db.session.commit()
+    return len(results)
+
+
+_worker_app = None
+
+
+def _init_worker():
+    # Each worker process gets its own app (same FLASK_ENV) and database engine
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app()
+
+
+def _rebuild_shard_in_worker(user_ids):
+    with _worker_app.app_context():
+        try:
+            return rebuild_shard(user_ids)
+        finally:
+            db.session.remove()
@@ -0,0 +1,135 @@
+"""
+Per-user balance ledger
+
+UserBalance keeps running income/expense totals for every user so reading a
+balance is one primary-key lookup instead of a pass over the whole history.
+
+Every route that creates or deletes a Transaction calls apply_transaction()
+right after session.add()/session.delete() and before committing, so the
+ledger changes in the same database transaction as the row itself. The
+totals are updated with an increment upsert (app/dbutil.py), which stays
+correct when two requests for the same user commit concurrently, including
+their first ones.
+
+apply_transaction() is the single hook for transaction writes: besides the
+balance it keeps the monthly rollups (app/rollups.py) and budget goal
+progress (app/budgets.py) in step and bumps the user's data version
+(app/versions.py). apply_transactions() does the same for a batch of rows
+inserted in bulk (imports), with one aggregated change per total.
+
+rebuild_balances() recomputes the ledger from the transaction table; it is
+used by `flask ledger reconcile`, the demo data scripts and the backfill
+migration.
+"""
+from datetime import datetime
+from sqlalchemy import select, func, case, literal
+from app import db
+from app.budgets import apply_to_budget_goals, apply_rows_to_budget_goals, rebuild_goal_spending
+from app.dbutil import upsert_increment
+from app.models import Transaction, UserBalance
+from app.rollups import apply_to_rollups, apply_rows_to_rollups, rebuild_rollups
+from app.versions import bump_data_version, bump_all_data_versions
+
+
+def apply_transaction(transaction, sign=1):
+    """Add (sign=1) or remove (sign=-1) a transaction from its user's ledger, rollups and goals"""
+    amount = transaction.amount * sign
+    is_income = transaction.transaction_type == 'income'
+
+    _add_to_balance(transaction.user_id, amount if is_income else 0.0, 0.0 if is_income else amount, sign)
+    apply_to_rollups(transaction, sign)
+    apply_to_budget_goals(transaction, sign)
+    bump_data_version(transaction.user_id)
+
+
+def apply_transactions(user_id, rows):
+    """Add bulk-inserted transactions of one user to the ledger, rollups and goals
+
+    `rows` are the column dicts passed to insert(Transaction), already
+    executed. The bulk counterpart of apply_transaction(), used by imports:
+    each total gets one aggregated change instead of one per row.
+    """
+    if not rows:
+        return
+    income = sum(row['amount'] for row in rows if row['transaction_type'] == 'income')
+    expense = sum(row['amount'] for row in rows if row['transaction_type'] != 'income')
+
+    _add_to_balance(user_id, income, expense, len(rows))
+    apply_rows_to_rollups(user_id, rows)
+    apply_rows_to_budget_goals(user_id, rows)
+    bump_data_version(user_id)
+
+
+def _add_to_balance(user_id, income, expense, count):
+    """Add to a user's UserBalance row, creating it on their first transaction"""
+    upsert_increment(
+        UserBalance.__table__,
+        key={'user_id': user_id},
+        increments={'total_income': income, 'total_expense': expense, 'transaction_count': count},
+        values={'updated_at': datetime.utcnow()}
+    )
+
+
+def get_user_totals(user_id):
+    """Income, expense, balance and transaction count for a user"""
+    row = db.session.execute(
+        select(UserBalance.total_income, UserBalance.total_expense, UserBalance.transaction_count)
+        .where(UserBalance.user_id == user_id)
+    ).first()
+
+    if row is None:
+        return {'income': 0.0, 'expense': 0.0, 'balance': 0.0, 'count': 0}
+
+    income, expense, count = row
+    return {
+        'income': income,
+        'expense': expense,
+        'balance': income - expense,
+        'count': count
+    }
+
+
+def _balance_query(user_id=None):
+    """Grouped SELECT producing UserBalance rows from the transaction table"""
+    t = Transaction.__table__
+    query = select(
+        t.c.user_id,
+        func.coalesce(func.sum(case((t.c.transaction_type == 'income', t.c.amount), else_=0.0)), 0.0),
+        func.coalesce(func.sum(case((t.c.transaction_type == 'expense', t.c.amount), else_=0.0)), 0.0),
+        func.count(t.c.id),
+        literal(datetime.utcnow(), db.DateTime)
+    ).group_by(t.c.user_id)
+
+    if user_id is not None:
+        query = query.where(t.c.user_id == user_id)
+    return query
+
+
+def rebuild_balances(connection, user_id=None):
+    """Recompute UserBalance rows from transactions (one user or everyone)
+
+    `connection` is anything with an execute() method: db.session inside a
+    request, or a Connection inside a migration.
+    """
+    table = UserBalance.__table__
+    delete = table.delete()
+    if user_id is not None:
+        delete = delete.where(table.c.user_id == user_id)
+
+    connection.execute(delete)
+    connection.execute(table.insert().from_select(
+        ['user_id', 'total_income', 'total_expense', 'transaction_count', 'updated_at'],
+        _balance_query(user_id)
+    ))
+
+
+def reconcile(user_id=None):
+    """Rebuild the ledger, monthly rollups and goal progress from scratch and commit"""
+    rebuild_balances(db.session, user_id)
+    rebuild_rollups(db.session, user_id)
+    rebuild_goal_spending(db.session, user_id)
+    if user_id is not None:
+        bump_data_version(user_id)
+    else:
+        bump_all_data_versions()
+    db.session.commit()
@@ -0,0 +1,170 @@
+"""
+Versioned schema migrations
+
+db.create_all() only creates tables that are missing, it never changes a table
+that already exists. Changes to existing tables (new indexes, new columns, data
+backfills) are registered in MIGRATIONS and applied once per database, in
+order. Applied versions are recorded in the schema_version table.
+
+Migrations must be idempotent: on a fresh database create_all() has already
+built the final schema and the migration only records its version. They
+spell out the schema and SQL they use (index names, columns, column types,
+backfill queries) instead of reading them from the models or calling app
+code, so a migration keeps doing the same thing when either changes later.
+"""
+from datetime import datetime
+from sqlalchemy import DateTime, Index, MetaData, Table, bindparam, inspect, select, text
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from app import db
+
+
+class SchemaVersion(db.Model):
+    """Applied schema migration"""
+    __tablename__ = 'schema_version'
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200))
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def _create_indexes(connection, table_name, indexes):
+    """Create (name, columns) indexes on an existing table, skipping those already there"""
+    table = Table(table_name, MetaData(), autoload_with=connection)
+    for name, columns in indexes:
+        Index(name, *[table.c[column] for column in columns]).create(connection, checkfirst=True)
+
+
+def _create_transaction_indexes(connection):
+    """Add composite (user_id, ...) indexes to an existing transaction table"""
+    _create_indexes(connection, 'transaction', [
+        ('ix_transaction_user_date', ['user_id', 'date']),
+        ('ix_transaction_user_type_date', ['user_id', 'transaction_type', 'date']),
+        ('ix_transaction_user_category_date', ['user_id', 'category_id', 'date']),
+    ])
+
+
+def _backfill_user_balances(connection):
+    """Build the user_balance ledger for users that already have transactions"""
+    connection.execute(text('DELETE FROM user_balance'))
+    connection.execute(text(
+        'INSERT INTO user_balance (user_id, total_income, total_expense, transaction_count, updated_at) '
+        'SELECT user_id, '
+        "COALESCE(SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0.0 END), 0.0), "
+        "COALESCE(SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0.0 END), 0.0), "
+        'COUNT(id), :now '
+        'FROM "transaction" GROUP BY user_id'
+    ).bindparams(bindparam('now', datetime.utcnow(), type_=DateTime)))
+
+
+def _backfill_monthly_rollups(connection):
+    """Build monthly_rollup rows from existing transactions"""
+    if connection.dialect.name == 'sqlite':
+        month = "date(date, 'start of month')"
+    else:
+        month = "CAST(date_trunc('month', date) AS DATE)"
+    connection.execute(text('DELETE FROM monthly_rollup'))
+    connection.execute(text(
+        'INSERT INTO monthly_rollup (user_id, category_id, month, transaction_type, total, count) '
+        f'SELECT user_id, category_id, {month}, transaction_type, SUM(amount), COUNT(id) '
+        f'FROM "transaction" GROUP BY user_id, category_id, {month}, transaction_type'
+    ))
+
+
+def _backfill_goal_spending(connection):
+    """Recompute budget_goal.current_spent now that it is maintained on write"""
+    connection.execute(text(
+        'UPDATE budget_goal SET current_spent = ('
+        'SELECT COALESCE(SUM(t.amount), 0.0) FROM "transaction" t '
+        'WHERE t.user_id = budget_goal.user_id AND t.category_id = budget_goal.category_id '
+        "AND t.transaction_type = 'expense' AND budget_goal.start_date <= t.date "
+        'AND (budget_goal.end_date IS NULL OR budget_goal.end_date >= t.date))'
+    ))
+
+
+def _create_budget_goal_indexes(connection):
+    """Add the (user_id, category_id, is_active) index to an existing budget_goal table"""
+    _create_indexes(connection, 'budget_goal', [
+        ('ix_budget_goal_user_category_active', ['user_id', 'category_id', 'is_active']),
+    ])
+
+
+def _create_notification_indexes(connection):
+    """Add the per-user indexes to an existing user_notification table"""
+    _create_indexes(connection, 'user_notification', [
+        ('ix_user_notification_user_read', ['user_id', 'is_read']),
+        ('ix_user_notification_user_created', ['user_id', 'created_at', 'id']),
+    ])
+
+
+def _add_column(connection, table_name, column_name, column_type):
+    """ALTER TABLE ... ADD COLUMN unless the table already has the column"""
+    columns = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    if column_name not in columns:
+        connection.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}'))
+
+
+def _add_export_job_heartbeat(connection):
+    """Add the heartbeat_at lease column to an existing export_job table"""
+    _add_column(connection, 'export_job', 'heartbeat_at', 'TIMESTAMP')
+
+
+def _add_import_job_heartbeat(connection):
+    """Add the heartbeat_at lease column to an existing import_job table"""
+    _add_column(connection, 'import_job', 'heartbeat_at', 'TIMESTAMP')
+
+
+def _delete_empty_rollups(connection):
+    """Drop monthly_rollup rows whose transactions have all been deleted"""
+    connection.execute(text('DELETE FROM monthly_rollup WHERE count <= 0'))
+
+
+# (version, description, function) - append only, never renumber
+MIGRATIONS = [
+    (1, 'Composite indexes on transaction for per-user queries', _create_transaction_indexes),
+    (2, 'Backfill user_balance ledger', _backfill_user_balances),
+    (3, 'Backfill monthly_rollup table', _backfill_monthly_rollups),
+    (4, 'Backfill budget_goal.current_spent', _backfill_goal_spending),
+    (5, 'Index budget_goal on (user_id, category_id, is_active)', _create_budget_goal_indexes),
+    (6, 'Per-user indexes on user_notification', _create_notification_indexes),
+    (7, 'Lease column export_job.heartbeat_at', _add_export_job_heartbeat),
+    (8, 'Delete monthly_rollup rows with count 0', _delete_empty_rollups),
+    (9, 'Lease column import_job.heartbeat_at', _add_import_job_heartbeat),
+]
+
+
+def applied_versions(connection):
+    """Set of migration versions already applied to the database"""
+    return set(connection.execute(select(SchemaVersion.version)).scalars())
+
+
+def current_version():
+    """Highest applied migration version (0 for an unmigrated database)"""
+    with db.engine.connect() as connection:
+        return max(applied_versions(connection), default=0)
+
+
+def run_migrations():
+    """Apply pending migrations, returns the list of versions applied"""
+    with db.engine.connect() as connection:
+        done = applied_versions(connection)
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            with db.engine.begin() as connection:
+                migrate(connection)
+                connection.execute(SchemaVersion.__table__.insert().values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.utcnow()
+                ))
+        except (IntegrityError, OperationalError, ProgrammingError):
+            # Another worker booting at the same time got there first
+            with db.engine.connect() as connection:
+                if version not in applied_versions(connection):
+                    raise
+            continue
+        applied.append(version)
+
+    return applied
@@ -25,10 +25,9 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
     
     def get_balance(self):
-        """Get user's current balance"""
-        total_income = sum(t.amount for t in self.transactions if t.transaction_type == 'income')
-        total_expense = sum(t.amount for t in self.transactions if t.transaction_type == 'expense')
-        return total_income - total_expense
+        """Get user's current balance (single UserBalance row lookup)"""
+        from app.ledger import get_user_totals
+        return get_user_totals(self.id)['balance']
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -59,9 +58,60 @@ class Transaction(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     
+    # Composite indexes for the per-user query shapes used by the routes
+    # (existing databases get them through app/migrations.py)
+    __table_args__ = (
+        db.Index('ix_transaction_user_date', 'user_id', 'date'),
+        db.Index('ix_transaction_user_type_date', 'user_id', 'transaction_type', 'date'),
+        db.Index('ix_transaction_user_category_date', 'user_id', 'category_id', 'date'),
+    )
+    
     def __repr__(self):
         return f'<Transaction {self.transaction_type}: {self.amount}>'
 
+class UserBalance(db.Model):
+    """Running income/expense totals per user, maintained by app/ledger.py"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_income = db.Column(db.Float, nullable=False, default=0.0)
+    total_expense = db.Column(db.Float, nullable=False, default=0.0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @property
+    def balance(self):
+        return self.total_income - self.total_expense
+    
+    def __repr__(self):
+        return f'<UserBalance {self.user_id}: {self.balance}>'
+
+class DataVersion(db.Model):
+    """Per-user counter bumped on every write, used as a cache key (app/versions.py)"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class NotificationVersion(db.Model):
+    """Per-user counter bumped when notifications are read or archived, for live streams (app/versions.py)"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class MonthlyRollup(db.Model):
+    """Per-user totals by category, calendar month and type, maintained by app/rollups.py"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)  # First day of the month
+    transaction_type = db.Column(db.String(10), primary_key=True)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_monthly_rollup_user_month', 'user_id', 'month'),
+    )
+    
+    def __repr__(self):
+        return f'<MonthlyRollup {self.user_id} {self.month} {self.transaction_type}: {self.total}>'
+
 # Function to create default categories
 def create_default_categories():
     """Create default categories"""
@@ -89,6 +139,12 @@ def create_default_categories():
 # 🤖 AI-Powered Budget Assistant Models
 class BudgetGoal(db.Model):
     """Budget goals for categories"""
+    # Looked up on every transaction write to find the goals it affects
+    # (existing databases get it through app/migrations.py)
+    __table_args__ = (
+        db.Index('ix_budget_goal_user_category_active', 'user_id', 'category_id', 'is_active'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
@@ -160,9 +216,23 @@ class SpendingPattern(db.Model):
     category = db.relationship('Category', backref='spending_patterns')
 
 
+class InsightState(db.Model):
+    """Data version the stored SpendingPattern/SmartRecommendation rows were computed from (app/insights.py)"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    data_version = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
 # 📱 PWA & Notifications Models
 class UserNotification(db.Model):
     """Smart notifications system"""
+    # Unread counts and newest-first pages (existing databases get these
+    # through app/migrations.py)
+    __table_args__ = (
+        db.Index('ix_user_notification_user_read', 'user_id', 'is_read'),
+        db.Index('ix_user_notification_user_created', 'user_id', 'created_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     notification_type = db.Column(db.String(50), nullable=False)  # 'budget_alert', 'goal_achieved', 'recommendation'
@@ -180,6 +250,21 @@ class UserNotification(db.Model):
     user = db.relationship('User', backref='notifications')
 
 
+class ArchivedNotification(db.Model):
+    """Read notifications moved out of user_notification by `flask notifications archive`"""
+    id = db.Column(db.Integer, primary_key=True)  # id it had in user_notification
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    notification_type = db.Column(db.String(50), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text)
+    priority = db.Column(db.String(20))
+    action_url = db.Column(db.String(200))
+    action_text = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime)
+    read_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class ReceiptScan(db.Model):
     """Receipt scanning results (mock AI)"""
     id = db.Column(db.Integer, primary_key=True)
@@ -200,6 +285,86 @@ class ReceiptScan(db.Model):
     transaction = db.relationship('Transaction', backref='receipt_scan')
 
 
+# 📤 Export Jobs
+class ExportJob(db.Model):
+    """Queued CSV/Excel/PDF export, rendered by the export worker (app/export_jobs.py)"""
+    __table_args__ = (
+        db.Index('ix_export_job_status_id', 'status', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    export_format = db.Column(db.String(10), nullable=False)  # csv, xlsx, pdf
+    filters = db.Column(db.Text)  # JSON of the request filter args
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    rows_total = db.Column(db.Integer)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    file_path = db.Column(db.String(500))
+    download_name = db.Column(db.String(200))
+    error = db.Column(db.Text)
+    worker = db.Column(db.String(100))  # host:pid of the worker that claimed the job
+    heartbeat_at = db.Column(db.DateTime)  # renewed by the worker while it renders the job
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    # Relationships
+    user = db.relationship('User', backref='export_jobs')
+    
+    @property
+    def progress(self):
+        """Percent complete (0-100)"""
+        if self.status == 'done':
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(99, int(self.rows_done * 100 / self.rows_total))
+    
+    def get_filters(self):
+        return json.loads(self.filters) if self.filters else {}
+
+
+class ImportJob(db.Model):
+    """Uploaded CSV/OFX/QIF file of transactions, imported by the worker (app/imports.py)"""
+    __table_args__ = (
+        db.Index('ix_import_job_status_id', 'status', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    file_format = db.Column(db.String(10), nullable=False)  # csv, ofx, qif
+    filename = db.Column(db.String(200))  # name of the uploaded file
+    file_path = db.Column(db.String(500))
+    default_category_id = db.Column(db.Integer, db.ForeignKey('category.id'))  # for rows without a known category
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    bytes_total = db.Column(db.Integer)
+    bytes_done = db.Column(db.Integer, nullable=False, default=0)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)  # transactions imported
+    rows_skipped = db.Column(db.Integer, nullable=False, default=0)  # invalid rows
+    errors = db.Column(db.Text)  # JSON list of the first row errors
+    error = db.Column(db.Text)
+    worker = db.Column(db.String(100))  # host:pid of the worker that claimed the job
+    heartbeat_at = db.Column(db.DateTime)  # renewed by the worker while it imports the file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    # Relationships
+    user = db.relationship('User', backref='import_jobs')
+    
+    @property
+    def progress(self):
+        """Percent of the file read (0-100)"""
+        if self.status == 'done':
+            return 100
+        if not self.bytes_total:
+            return 0
+        return min(99, int(self.bytes_done * 100 / self.bytes_total))
+    
+    def get_errors(self):
+        return json.loads(self.errors) if self.errors else []
+
+
 # 📊 Custom Dashboard Models
 class DashboardWidget(db.Model):
     """Custom dashboard widgets"""
@@ -259,56 +424,75 @@ class UserAchievement(db.Model):
 # Utility Functions for AI Features
 def analyze_spending_patterns(user_id):
     """Analyze user spending patterns with mock ML"""
-    from sqlalchemy import func
+    import numpy as np
+    from sqlalchemy import select
     
-    # Get user transactions
-    transactions = Transaction.query.filter_by(user_id=user_id, transaction_type='expense').all()
+    rows = db.session.execute(
+        select(Transaction.category_id, Transaction.amount)
+        .where(Transaction.user_id == user_id, Transaction.transaction_type == 'expense')
+        .order_by(Transaction.date, Transaction.id)
+    ).all()
     
-    if not transactions:
+    if not rows:
         return []
     
-    # Group by category and analyze
+    category_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    amounts = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    
+    # Group by category (the stable sort keeps each group in date order);
+    # reduceat sums each group from its start offset
+    order = np.argsort(category_ids, kind='stable')
+    category_ids = category_ids[order]
+    amounts = amounts[order]
+    starts = np.flatnonzero(np.r_[True, category_ids[1:] != category_ids[:-1]])
+    counts = np.diff(np.r_[starts, len(amounts)])
+    totals = np.add.reduceat(amounts, starts)
+    
+    # Need minimum data
+    enough = counts >= 3
+    starts, counts, totals = starts[enough], counts[enough], totals[enough]
+    if not len(starts):
+        return []
+    group_ids = category_ids[starts]
+    ends = starts + counts
+    
+    avg_amounts = totals / counts
+    
+    # Simple trend analysis (mock ML): last three vs the rest (or the first
+    # one when there are only three)
+    recent_totals = amounts[ends - 1] + amounts[ends - 2] + amounts[ends - 3]
+    recent_avgs = recent_totals / 3
+    older_avgs = np.where(counts > 3, (totals - recent_totals) / np.maximum(counts - 3, 1), amounts[starts])
+    trends = np.where(recent_avgs > older_avgs * 1.1, 'increasing',
+                      np.where(recent_avgs < older_avgs * 0.9, 'decreasing', 'stable'))
+    
+    # Prediction is the recent average; more data = higher confidence
+    confidences = np.minimum(0.9, counts / 10)
+    
+    names = dict(db.session.execute(
+        select(Category.id, Category.name).where(Category.id.in_(group_ids.tolist()))
+    ).all())
+    
     patterns = []
-    for category in Category.query.all():
-        cat_transactions = [t for t in transactions if t.category_id == category.id]
-        
-        if len(cat_transactions) >= 3:  # Need minimum data
-            amounts = [t.amount for t in cat_transactions]
-            avg_amount = sum(amounts) / len(amounts)
-            
-            # Simple trend analysis (mock ML)
-            recent_amounts = amounts[-3:]
-            older_amounts = amounts[:-3] if len(amounts) > 3 else amounts[:1]
-            
-            recent_avg = sum(recent_amounts) / len(recent_amounts)
-            older_avg = sum(older_amounts) / len(older_amounts)
-            
-            if recent_avg > older_avg * 1.1:
-                trend = 'increasing'
-            elif recent_avg < older_avg * 0.9:
-                trend = 'decreasing'
-            else:
-                trend = 'stable'
-            
-            # Calculate prediction (simple moving average)
-            predicted_next = recent_avg
-            confidence = min(0.9, len(cat_transactions) / 10)  # More data = higher confidence
-            
-            patterns.append({
-                'category_id': category.id,
-                'category_name': category.name,
-                'average_amount': avg_amount,
-                'predicted_next': predicted_next,
-                'trend': trend,
-                'confidence_score': confidence
-            })
+    for index, category_id in enumerate(group_ids.tolist()):
+        if category_id not in names:
+            continue
+        patterns.append({
+            'category_id': category_id,
+            'category_name': names[category_id],
+            'average_amount': float(avg_amounts[index]),
+            'predicted_next': float(recent_avgs[index]),
+            'trend': str(trends[index]),
+            'confidence_score': float(confidences[index])
+        })
     
     return patterns
 
 
-def generate_smart_recommendations(user_id):
-    """Generate AI-powered recommendations"""
-    patterns = analyze_spending_patterns(user_id)
+def generate_smart_recommendations(user_id, patterns=None):
+    """Generate AI-powered recommendations (from `patterns` if already analyzed)"""
+    if patterns is None:
+        patterns = analyze_spending_patterns(user_id)
     recommendations = []
     
     user = User.query.get(user_id)
@@ -0,0 +1,149 @@
+"""
+Notification center queries
+
+Notifications are listed newest first with keyset pagination on
+(created_at, id), marked read with one bulk UPDATE, and counted through the
+(user_id, is_read) index, so none of these load a user's whole history.
+
+archive_read_notifications() moves read notifications past the retention
+period into archived_notification (`flask notifications archive`), keeping
+the live table small for chatty accounts.
+
+Both bulk writes bump the notification version of the users whose
+notifications changed, so unread badges on live streams (app/events.py)
+follow them. They leave the data version alone: no cached figure depends
+on read state.
+"""
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, and_, or_, literal
+from app import db
+from app.models import UserNotification, ArchivedNotification
+from app.versions import bump_notification_version
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def encode_cursor(notification):
+    """Opaque cursor pointing just after `notification` in (created_at, id) DESC order"""
+    raw = f"{notification.created_at.isoformat()}|{notification.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor made by encode_cursor(); ValueError if invalid"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, notification_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(notification_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def notifications_page(user_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of notifications, newest first
+
+    Returns (notifications, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    query = (
+        select(UserNotification)
+        .where(UserNotification.user_id == user_id)
+        .order_by(UserNotification.created_at.desc(), UserNotification.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        after_created, after_id = decode_cursor(cursor)
+        query = query.where(or_(
+            UserNotification.created_at < after_created,
+            and_(UserNotification.created_at == after_created, UserNotification.id < after_id)
+        ))
+
+    rows = db.session.execute(query).scalars().all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def mark_read(user_id, notification_ids=None):
+    """Mark the given notifications (default: all) as read in one UPDATE
+
+    Loaded objects are left as they were, so a page can still show which
+    notifications were new. Bumps the user's notification version if
+    anything changed. Returns the number of rows changed; the caller commits.
+    """
+    table = UserNotification.__table__
+    query = (
+        table.update()
+        .where(table.c.user_id == user_id, table.c.is_read.is_(False))
+        .values(is_read=True, read_at=datetime.utcnow())
+    )
+    if notification_ids is not None:
+        if not notification_ids:
+            return 0
+        query = query.where(table.c.id.in_(notification_ids))
+    updated = db.session.execute(query).rowcount
+    if updated > 0:
+        bump_notification_version(user_id)
+    return updated
+
+
+def unread_count(user_id):
+    """Number of unread notifications (an index-only count)"""
+    return db.session.execute(
+        select(func.count())
+        .select_from(UserNotification)
+        .where(UserNotification.user_id == user_id, UserNotification.is_read.is_(False))
+    ).scalar()
+
+
+def archive_read_notifications(days=90, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move notifications read more than `days` ago to archived_notification
+
+    Works in batches, each copied and deleted in its own transaction
+    together with a notification version bump for the users it touched. Returns the
+    number of notifications archived.
+    """
+    live = UserNotification.__table__
+    archive = ArchivedNotification.__table__
+    columns = ['id', 'user_id', 'notification_type', 'title', 'message', 'priority',
+               'action_url', 'action_text', 'created_at', 'read_at']
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    archived = 0
+    while True:
+        batch = db.session.execute(
+            select(live.c.id, live.c.user_id)
+            .where(live.c.is_read.is_(True), live.c.read_at < cutoff)
+            .order_by(live.c.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return archived
+        ids = [notification_id for notification_id, user_id in batch]
+
+        db.session.execute(archive.insert().from_select(
+            columns + ['archived_at'],
+            select(*[live.c[name] for name in columns], literal(datetime.utcnow(), db.DateTime)).where(live.c.id.in_(ids))
+        ))
+        db.session.execute(live.delete().where(live.c.id.in_(ids)))
+        for user_id in sorted({user_id for notification_id, user_id in batch}):
+            bump_notification_version(user_id)
+        db.session.commit()
+        archived += len(ids)
+
+
+def serialize_notification(notification):
+    """JSON-friendly dict for a notification"""
+    return {
+        'id': notification.id,
+        'type': notification.notification_type,
+        'title': notification.title,
+        'message': notification.message,
+        'priority': notification.priority,
+        'is_read': notification.is_read,
+        'action_url': notification.action_url,
+        'action_text': notification.action_text,
+        'created_at': notification.created_at.isoformat() if notification.created_at else None
+    }
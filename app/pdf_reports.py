@@ -0,0 +1,291 @@
+"""
+PDF transaction reports
+
+A report is a summary page (totals, spending by category, month by month)
+built from a single grouped query, followed by a paged transaction table
+drawn from the streamed export rows (app/exports.py). Rows are never all in
+memory at once, but reportlab keeps every finished page until the document
+is saved, so the table stops after MAX_TABLE_ROWS (the newest ones) and
+points to the CSV/Excel exports for the rest.
+
+The summary reads the monthly rollups when the filters are ones the rollups
+can answer (transaction type and category) and groups the transaction table
+otherwise. Rendered files are cached in EXPORT_DIR/reports under the user's
+data version and the filters, so asking again for unchanged data reuses the
+file instead of rendering it again.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+from flask import current_app
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from sqlalchemy import select, func
+from app import db
+from app.exports import iter_export_rows
+from app.models import Transaction, Category, MonthlyRollup, User
+from app.periods import month_start_expr
+from app.storage import private_directory
+from app.transaction_queries import apply_filters
+from app.versions import get_data_version
+
+ROLLUP_FILTERS = {'transaction_type', 'category_id'}
+PAGE_WIDTH, PAGE_HEIGHT = letter
+MARGIN = 40
+ROW_HEIGHT = 15
+FONT = 'Helvetica'
+FONT_BOLD = 'Helvetica-Bold'
+FONT_SIZE = 8
+MAX_TABLE_ROWS = 20000  # about 430 pages
+
+TRANSACTION_COLUMNS = [
+    # (title, width, align)
+    ('Date', 70, 'left'),
+    ('Type', 45, 'left'),
+    ('Category', 95, 'left'),
+    ('Description', 170, 'left'),
+    ('Amount', 75, 'right'),
+    ('Balance After', 77, 'right'),
+]
+
+
+def report_summary(user_id, filters):
+    """Totals, per-category and per-month figures for the report's first page
+
+    Returns a dict with totals (see filtered_totals), categories (list of
+    name, type, total, count; largest first) and months (list of month,
+    income, expense; oldest first).
+    """
+    if set(filters) <= ROLLUP_FILTERS:
+        month = MonthlyRollup.month
+        query = (
+            select(Category.name, month, MonthlyRollup.transaction_type,
+                   func.sum(MonthlyRollup.total), func.sum(MonthlyRollup.count))
+            .outerjoin(Category, Category.id == MonthlyRollup.category_id)
+            .where(MonthlyRollup.user_id == user_id)
+            .group_by(MonthlyRollup.category_id, Category.name, month, MonthlyRollup.transaction_type)
+        )
+        if 'transaction_type' in filters:
+            query = query.where(MonthlyRollup.transaction_type == filters['transaction_type'])
+        if 'category_id' in filters:
+            query = query.where(MonthlyRollup.category_id == filters['category_id'])
+    else:
+        month = month_start_expr(Transaction.date)
+        query = apply_filters(
+            select(Category.name, month, Transaction.transaction_type,
+                   func.sum(Transaction.amount), func.count(Transaction.id))
+            .outerjoin(Category, Category.id == Transaction.category_id),
+            user_id, filters
+        ).group_by(Transaction.category_id, Category.name, month, Transaction.transaction_type)
+
+    categories = {}
+    months = {}
+    totals = {'income': 0, 'expense': 0, 'count': 0}
+    for name, month_value, transaction_type, total, count in db.session.execute(query):
+        if not count:
+            continue
+        entry = categories.setdefault((name or 'Other', transaction_type), {
+            'name': name or 'Other', 'type': transaction_type, 'total': 0, 'count': 0})
+        entry['total'] += total
+        entry['count'] += count
+        months.setdefault(month_value, {'month': month_value, 'income': 0, 'expense': 0})[transaction_type] += total
+        totals[transaction_type] += total
+        totals['count'] += count
+    totals['balance'] = totals['income'] - totals['expense']
+
+    return {
+        'totals': totals,
+        'categories': sorted(categories.values(), key=lambda c: c['total'], reverse=True),
+        'months': [months[key] for key in sorted(months)],
+    }
+
+
+class PageWriter:
+    """Draws fixed-height table rows onto a canvas, starting new pages as needed
+
+    Each page gets the report title and a page number; the current table's
+    header row is repeated at the top of every page it spans.
+    """
+
+    def __init__(self, output, title):
+        self.canvas = canvas.Canvas(output, pagesize=letter, pageCompression=1)
+        self.title = title
+        self.page = 0
+        self.columns = None
+        self._new_page()
+
+    def _new_page(self):
+        if self.page:
+            self.canvas.showPage()
+        self.page += 1
+        self.y = PAGE_HEIGHT - MARGIN
+        self.canvas.setFont(FONT, FONT_SIZE)
+        self.canvas.setFillColor(colors.grey)
+        self.canvas.drawString(MARGIN, MARGIN / 2, self.title)
+        self.canvas.drawRightString(PAGE_WIDTH - MARGIN, MARGIN / 2, f'Page {self.page}')
+        self.canvas.setFillColor(colors.black)
+        if self.columns:
+            self._header()
+
+    def _ensure_space(self, height):
+        if self.y - height < MARGIN:
+            self._new_page()
+
+    def heading(self, text, size=14):
+        """A section heading, kept on the same page as at least a few rows"""
+        self.columns = None
+        self._ensure_space(size + 4 * ROW_HEIGHT)
+        self.y -= size + 6
+        self.canvas.setFont(FONT_BOLD, size)
+        self.canvas.drawString(MARGIN, self.y, text)
+        self.y -= 6
+
+    def text(self, text):
+        self._ensure_space(ROW_HEIGHT)
+        self.y -= ROW_HEIGHT
+        self.canvas.setFont(FONT, FONT_SIZE + 1)
+        self.canvas.drawString(MARGIN, self.y, text)
+
+    def table(self, columns):
+        """Start a table; rows then go through row()"""
+        self.columns = columns
+        self._ensure_space(2 * ROW_HEIGHT)
+        self._header()
+
+    def _header(self):
+        self.y -= ROW_HEIGHT
+        self.canvas.setFillColor(colors.whitesmoke)
+        self.canvas.rect(MARGIN, self.y - 4, PAGE_WIDTH - 2 * MARGIN, ROW_HEIGHT, stroke=0, fill=1)
+        self.canvas.setFillColor(colors.black)
+        self._cells([title for title, _, _ in self.columns], FONT_BOLD)
+
+    def row(self, values):
+        self._ensure_space(ROW_HEIGHT)
+        self.y -= ROW_HEIGHT
+        self._cells(values, FONT)
+
+    def _cells(self, values, font):
+        self.canvas.setFont(font, FONT_SIZE)
+        x = MARGIN
+        for value, (_, width, align) in zip(values, self.columns):
+            value = _fit(str(value), font, width - 6)
+            if align == 'right':
+                self.canvas.drawRightString(x + width - 3, self.y, value)
+            else:
+                self.canvas.drawString(x + 3, self.y, value)
+            x += width
+
+    def save(self):
+        self.canvas.save()
+
+
+def _fit(text, font, width):
+    """Truncate text with an ellipsis so it fits in `width` points"""
+    if stringWidth(text, font, FONT_SIZE) <= width:
+        return text
+    while text and stringWidth(text + '...', font, FONT_SIZE) > width:
+        text = text[:-1]
+    return text + '...'
+
+
+def _describe_filters(filters):
+    parts = []
+    if 'transaction_type' in filters:
+        parts.append(f"type: {filters['transaction_type']}")
+    if 'category_id' in filters:
+        category = db.session.get(Category, filters['category_id'])
+        parts.append(f"category: {category.name if category else filters['category_id']}")
+    if 'start_date' in filters:
+        parts.append(f"from {filters['start_date']:%Y-%m-%d}")
+    if 'end_date' in filters:
+        parts.append(f"to {filters['end_date']:%Y-%m-%d}")
+    if 'min_amount' in filters:
+        parts.append(f"min ${filters['min_amount']:.2f}")
+    if 'max_amount' in filters:
+        parts.append(f"max ${filters['max_amount']:.2f}")
+    return ', '.join(parts) or 'all transactions'
+
+
+def write_pdf_report(user_id, filters, output, progress=None):
+    """Render the summary and transaction table as PDF to a binary file object"""
+    user = db.session.get(User, user_id)
+    summary = report_summary(user_id, filters)
+    totals = summary['totals']
+    pages = PageWriter(output, f'FinRelate report for {user.username}')
+
+    pages.heading('Transactions Report', size=18)
+    pages.text(f"Generated {datetime.now():%Y-%m-%d %H:%M} - {_describe_filters(filters)}")
+    pages.text(f"Income ${totals['income']:,.2f}    Expenses ${totals['expense']:,.2f}    "
+               f"Balance ${totals['balance']:,.2f}    Transactions {totals['count']:,}")
+
+    pages.heading('By category')
+    pages.table([('Category', 200, 'left'), ('Type', 80, 'left'), ('Transactions', 100, 'right'),
+                 ('Total', 100, 'right'), ('Share', 52, 'right')])
+    for category in summary['categories']:
+        type_total = totals[category['type']] or 1
+        pages.row([category['name'], category['type'].title(), f"{category['count']:,}",
+                   f"${category['total']:,.2f}", f"{category['total'] / type_total * 100:.1f}%"])
+
+    pages.heading('By month')
+    pages.table([('Month', 200, 'left'), ('Income', 110, 'right'), ('Expenses', 110, 'right'),
+                 ('Net', 112, 'right')])
+    for month in summary['months']:
+        pages.row([month['month'].strftime('%B %Y'), f"${month['income']:,.2f}",
+                   f"${month['expense']:,.2f}", f"${month['income'] - month['expense']:,.2f}"])
+
+    pages.heading('Transactions')
+    if totals['count'] > MAX_TABLE_ROWS:
+        pages.text(f"Newest {MAX_TABLE_ROWS:,} of {totals['count']:,} transactions; "
+                   f"use the CSV or Excel export for the full list.")
+    pages.table(TRANSACTION_COLUMNS)
+    for _, date, transaction_type, category, description, amount, balance in iter_export_rows(
+            user_id, filters, progress=progress, limit=MAX_TABLE_ROWS):
+        pages.row([date.strftime('%Y-%m-%d'), transaction_type, category, description,
+                   f"${amount:,.2f}", f"${balance:,.2f}"])
+
+    pages.save()
+
+
+def report_cache_path(user_id, filters):
+    """Cache file for a report of the user's current data with these filters"""
+    key = json.dumps(filters, sort_keys=True, default=str)
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return os.path.join(report_cache_dir(), f"{user_id}-v{get_data_version(user_id)}-{digest}.pdf")
+
+
+def report_cache_dir():
+    return os.path.join(current_app.config['EXPORT_DIR'], 'reports')
+
+
+def cached_pdf_report(user_id, filters):
+    """Path of an already rendered report for unchanged data, or None"""
+    path = report_cache_path(user_id, filters)
+    if not os.path.exists(path):
+        return None
+    # Refresh the mtime so the purge keeps the file for as long as new links to it are valid
+    os.utime(path)
+    return path
+
+
+def build_pdf_report(user_id, filters, progress=None):
+    """Path of the report for the user's current data, rendering it if needed"""
+    path = cached_pdf_report(user_id, filters)
+    if path:
+        return path
+
+    path = report_cache_path(user_id, filters)
+    private_directory(current_app.config['EXPORT_DIR'])
+    private_directory(os.path.dirname(path))
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as output:
+        try:
+            write_pdf_report(user_id, filters, output, progress)
+        except Exception:
+            output.close()
+            os.remove(output.name)
+            raise
+    os.replace(output.name, path)
+    return path
@@ -0,0 +1,75 @@
+"""
+Calendar period helpers
+
+SQL expressions that truncate a date column to the start of its calendar
+week (Monday), month, quarter or year, on both SQLite (development) and
+PostgreSQL (production), plus the matching Python-side helpers so bucket
+keys computed in the database and in Python agree.
+"""
+from datetime import date, timedelta
+from sqlalchemy import func, cast, type_coerce, Integer
+from app import db
+from app.dbutil import dialect_name
+
+PERIODS = ('week', 'month', 'quarter', 'year')
+
+
+def period_start_expr(column, period):
+    """SQL expression for the first day of the `period` containing `column` (a DATE)"""
+    if period not in PERIODS:
+        raise ValueError(f'Unknown period: {period}')
+
+    if dialect_name() != 'sqlite':
+        return cast(func.date_trunc(period, column), db.Date)
+
+    if period == 'week':
+        return func.date(column, '-6 days', 'weekday 1', type_=db.Date)
+    if period == 'month':
+        return func.date(column, 'start of month', type_=db.Date)
+    if period == 'year':
+        return func.date(column, 'start of year', type_=db.Date)
+
+    # SQLite has no quarter modifier: build YYYY-MM-01 from the month number
+    month = cast(func.strftime('%m', column), Integer)
+    return type_coerce(
+        func.printf('%s-%02d-01', func.strftime('%Y', column), (month - 1) // 3 * 3 + 1),
+        db.Date
+    )
+
+
+def month_start_expr(column):
+    """SQL expression for the first day of the month of `column` (a DATE)"""
+    return period_start_expr(column, 'month')
+
+
+def period_start(value, period):
+    """First day of the `period` containing a date or datetime"""
+    if period == 'week':
+        day = date(value.year, value.month, value.day)
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return date(value.year, value.month, 1)
+    if period == 'quarter':
+        return date(value.year, (value.month - 1) // 3 * 3 + 1, 1)
+    if period == 'year':
+        return date(value.year, 1, 1)
+    raise ValueError(f'Unknown period: {period}')
+
+
+def shift_period(start, period, count):
+    """Move a period start date by `count` periods (may be negative)"""
+    if period == 'week':
+        return start + timedelta(weeks=count)
+    months = {'month': 1, 'quarter': 3, 'year': 12}[period]
+    return add_months(start, months * count)
+
+
+def month_start(value):
+    """First day of the month for a date or datetime"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    """Shift a first-of-month date by `count` months (may be negative)"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
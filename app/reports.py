@@ -0,0 +1,80 @@
+"""
+Period reports
+
+Income and expense per calendar week, month, quarter or year, bucketed by
+the database in a single GROUP BY query. Weeks are grouped from the
+transaction table (index on user_id, date); months, quarters and years from
+the monthly rollups, so a report over many years reads at most one row per
+month and category.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from app import db
+from app.models import Transaction, MonthlyRollup
+from app.periods import period_start, period_start_expr, shift_period
+
+DEFAULT_PERIOD_COUNTS = {'week': 12, 'month': 12, 'quarter': 8, 'year': 5}
+MAX_PERIOD_COUNT = 240
+
+
+def period_label(start, period):
+    """Human readable label for a period starting on `start`"""
+    if period == 'week':
+        end = start + timedelta(days=6)
+        return f"Week {start.strftime('%d.%m')} - {end.strftime('%d.%m')}"
+    if period == 'quarter':
+        return f"Q{(start.month - 1) // 3 + 1} {start.year}"
+    if period == 'year':
+        return str(start.year)
+    return start.strftime('%B %Y')
+
+
+def period_totals(user_id, period='month', count=None, now=None):
+    """Income, expense and balance for the last `count` calendar periods
+
+    The current (partial) period is included. `count` is clamped to
+    1..MAX_PERIOD_COUNT. Returns a list of dicts with period, start,
+    income, expense and balance, oldest first.
+    """
+    count = max(1, min(count or DEFAULT_PERIOD_COUNTS[period], MAX_PERIOD_COUNT))
+    current = period_start(now or datetime.now(), period)
+    first = shift_period(current, period, -(count - 1))
+    end = shift_period(current, period, 1)
+
+    if period == 'week':
+        bucket = period_start_expr(Transaction.date, period)
+        query = (
+            select(bucket, Transaction.transaction_type, func.sum(Transaction.amount))
+            .where(Transaction.user_id == user_id,
+                   Transaction.date >= datetime.combine(first, datetime.min.time()),
+                   Transaction.date < datetime.combine(end, datetime.min.time()))
+            .group_by(bucket, Transaction.transaction_type)
+        )
+    else:
+        bucket = period_start_expr(MonthlyRollup.month, period)
+        query = (
+            select(bucket, MonthlyRollup.transaction_type, func.sum(MonthlyRollup.total))
+            .where(MonthlyRollup.user_id == user_id,
+                   MonthlyRollup.month >= first,
+                   MonthlyRollup.month < end)
+            .group_by(bucket, MonthlyRollup.transaction_type)
+        )
+
+    totals = {}
+    for start, transaction_type, total in db.session.execute(query):
+        totals.setdefault(start, {'income': 0, 'expense': 0})[transaction_type] = total
+
+    periods_data = []
+    for i in range(count):
+        start = shift_period(first, period, i)
+        income = totals.get(start, {}).get('income', 0)
+        expense = totals.get(start, {}).get('expense', 0)
+        periods_data.append({
+            'period': period_label(start, period),
+            'start': start,
+            'income': income,
+            'expense': expense,
+            'balance': income - expense
+        })
+
+    return periods_data
@@ -0,0 +1,145 @@
+"""
+Monthly rollups
+
+MonthlyRollup holds the sum and count of a user's transactions per category,
+calendar month and transaction type. app.ledger.apply_transaction() keeps it
+up to date on every write, so statistics over years of history read at most
+months x categories rows instead of every transaction.
+
+A rollup whose last transaction is removed is deleted rather than left at
+count 0, so the table only holds months with data and a category without
+transactions has no rollup rows referencing it.
+
+rebuild_rollups() recomputes the table from transactions and is used by
+`flask ledger reconcile` and the backfill migration.
+"""
+from sqlalchemy import select, func
+from app import db
+from app.dbutil import upsert_increment, upsert_increments
+from app.models import Transaction, Category, MonthlyRollup
+from app.periods import month_start, month_start_expr
+
+KEY_COLUMNS = ['user_id', 'category_id', 'month', 'transaction_type']
+
+
+def apply_to_rollups(transaction, sign=1):
+    """Add (sign=1) or remove (sign=-1) a transaction from its monthly rollup"""
+    if transaction.date is None:
+        # Column default is only filled in on flush
+        db.session.flush()
+
+    table = MonthlyRollup.__table__
+    key = {
+        'user_id': transaction.user_id,
+        'category_id': transaction.category_id,
+        'month': month_start(transaction.date),
+        'transaction_type': transaction.transaction_type
+    }
+    upsert_increment(table, key=key, increments={'total': transaction.amount * sign, 'count': sign})
+    if sign < 0:
+        db.session.execute(
+            table.delete()
+            .where(*[table.c[name] == value for name, value in key.items()], table.c.count <= 0)
+        )
+
+
+def apply_rows_to_rollups(user_id, rows):
+    """Add bulk-inserted transaction rows (column dicts) of one user to their rollups
+
+    Rows are summed per (category, month, type) first, and all the rollups
+    are updated with one executemany upsert.
+    """
+    totals = {}
+    for row in rows:
+        key = (row['category_id'], month_start(row['date']), row['transaction_type'])
+        entry = totals.setdefault(key, [0.0, 0])
+        entry[0] += row['amount']
+        entry[1] += 1
+
+    upsert_increments(MonthlyRollup.__table__, KEY_COLUMNS, ['total', 'count'], [
+        {'user_id': user_id, 'category_id': category_id, 'month': month, 'transaction_type': transaction_type,
+         'total': total, 'count': count}
+        for (category_id, month, transaction_type), (total, count) in totals.items()
+    ])
+
+
+def delete_empty_rollups(connection):
+    """Remove rollup rows left at count 0 (by versions that kept them)"""
+    table = MonthlyRollup.__table__
+    connection.execute(table.delete().where(table.c.count <= 0))
+
+
+def rebuild_rollups(connection, user_id=None):
+    """Recompute MonthlyRollup rows from transactions (one user or everyone)"""
+    t = Transaction.__table__
+    table = MonthlyRollup.__table__
+
+    month = month_start_expr(t.c.date)
+    query = select(
+        t.c.user_id,
+        t.c.category_id,
+        month,
+        t.c.transaction_type,
+        func.sum(t.c.amount),
+        func.count(t.c.id)
+    ).group_by(t.c.user_id, t.c.category_id, month, t.c.transaction_type)
+
+    delete = table.delete()
+    if user_id is not None:
+        query = query.where(t.c.user_id == user_id)
+        delete = delete.where(table.c.user_id == user_id)
+
+    connection.execute(delete)
+    connection.execute(table.insert().from_select(KEY_COLUMNS + ['total', 'count'], query))
+
+
+def _month_range(query, since=None, until=None):
+    if since is not None:
+        query = query.where(MonthlyRollup.month >= since)
+    if until is not None:
+        query = query.where(MonthlyRollup.month <= until)
+    return query
+
+
+def category_totals(user_id, transaction_type='expense', since=None, until=None):
+    """Per-category totals from the rollups, largest first
+
+    `since`/`until` are inclusive first-of-month dates. Returns a list of
+    dicts with category_id, name, color, total and count.
+    """
+    total = func.sum(MonthlyRollup.total)
+    count = func.sum(MonthlyRollup.count)
+    query = (
+        select(Category.id, Category.name, Category.color, total, count)
+        .join(Category, Category.id == MonthlyRollup.category_id)
+        .where(MonthlyRollup.user_id == user_id,
+               MonthlyRollup.transaction_type == transaction_type)
+        .group_by(Category.id, Category.name, Category.color)
+        .having(count > 0)
+        .order_by(total.desc())
+    )
+    query = _month_range(query, since, until)
+
+    return [
+        {'category_id': category_id, 'name': name, 'color': color, 'total': total, 'count': count}
+        for category_id, name, color, total, count in db.session.execute(query)
+    ]
+
+
+def monthly_totals(user_id, since=None, until=None):
+    """Income and expense per month from the rollups
+
+    Returns {month: {'income': total, 'expense': total}} for months that
+    have data; `since`/`until` are inclusive first-of-month dates.
+    """
+    query = (
+        select(MonthlyRollup.month, MonthlyRollup.transaction_type, func.sum(MonthlyRollup.total))
+        .where(MonthlyRollup.user_id == user_id)
+        .group_by(MonthlyRollup.month, MonthlyRollup.transaction_type)
+    )
+    query = _month_range(query, since, until)
+
+    totals = {}
+    for month, transaction_type, total in db.session.execute(query):
+        totals.setdefault(month, {'income': 0, 'expense': 0})[transaction_type] = total
+    return totals
@@ -1,18 +1,39 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, make_response
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, jsonify, make_response,
+                   send_file, current_app)
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash
 from datetime import datetime, timedelta
-import csv
-import io
+import os
 import json
 import random
 import base64
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models import (User, Transaction, Category, create_default_categories,
                        BudgetGoal, SmartRecommendation, SpendingPattern, UserNotification,
-                       ReceiptScan, DashboardWidget, Achievement, UserAchievement,
-                       analyze_spending_patterns, generate_smart_recommendations)
-from app.forms import LoginForm, RegisterForm, TransactionForm, CategoryForm
+                       ReceiptScan, ExportJob, ImportJob, DashboardWidget, Achievement, UserAchievement,
+                       MonthlyRollup)
+from app.forms import LoginForm, RegisterForm, TransactionForm, CategoryForm, ImportForm
+from app.analytics import AnalyticsSnapshot
+from app.assets import get_manifest, precache_urls
+from app.budgets import rebuild_goal_spending
+from app.compression import no_compression
+from app.events import stream_response
+from app.export_jobs import (EXPORT_FORMATS, enqueue_export, run_job, job_status, download_token,
+                             job_from_token)
+from app.forecasting import forecast_expenses
+from app.imports import enqueue_import, run_import_job, import_job_status
+from app.insights import get_insights
+from app.ledger import apply_transaction
+from app.notifications import (notifications_page, mark_read, unread_count,
+                               serialize_notification)
+from app.periods import month_start, add_months
+from app.reports import DEFAULT_PERIOD_COUNTS, period_totals
+from app.rollups import category_totals, monthly_totals
+from app.transaction_queries import (parse_filters, transactions_page, filtered_totals,
+                                     serialize_transaction)
+from app.versions import bump_data_version, bump_all_data_versions, conditional_on_data_version
+from app.widgets import load_widgets
 
  # Create blueprints
 main = Blueprint('main', __name__)
@@ -40,34 +61,8 @@ def index():
 @main.route('/export_pdf')
 @login_required
 def export_pdf():
-    import io
-    from flask import send_file
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    transactions = Transaction.query.filter_by(user_id=current_user.id).all()
-    file_stream = io.BytesIO()
-    c = canvas.Canvas(file_stream, pagesize=letter)
-    width, height = letter
-    c.setFont('Helvetica', 12)
-    y = height - 40
-    c.drawString(40, y, 'Transactions Report')
-    y -= 30
-    c.drawString(40, y, 'ID   Date   Category   Amount   Description')
-    y -= 20
-    for t in transactions:
-        line = f"{t.id}   {t.date}   {t.category.name if t.category else ''}   {t.amount}   {t.description}"
-        c.drawString(40, y, line)
-        y -= 18
-        if y < 40:
-            c.showPage()
-            y = height - 40
-    c.save()
-    file_stream.seek(0)
-    return send_file(file_stream, as_attachment=True, download_name='transactions.pdf', mimetype='application/pdf')
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    """Queue a PDF export"""
+    return queue_export('pdf')
 
 @main.route('/disable-sw')
 def disable_service_worker():
@@ -109,90 +104,26 @@ def disable_service_worker():
 def dashboard():
     """Dashboard - main user page"""
     try:
-        from datetime import datetime, timedelta
-        from sqlalchemy import func
-        
-        # Get last 10 transactions
+        # Get last 10 transactions (categories loaded in the same query)
         recent_transactions = Transaction.query.filter_by(user_id=current_user.id)\
+                                             .options(joinedload(Transaction.category))\
                                              .order_by(Transaction.date.desc())\
                                              .limit(10).all()
         
-        # Get all transactions for calculations
-        all_transactions = Transaction.query.filter_by(user_id=current_user.id).all()
-        
-        # Calculate totals
-        total_income = sum(t.amount for t in all_transactions if t.transaction_type == 'income')
-        total_expenses = sum(t.amount for t in all_transactions if t.transaction_type == 'expense')
-        balance = current_user.get_balance()
-        
         # Get form for adding transaction
         form = TransactionForm()
         categories = Category.query.all()
         form.category_id.choices = [(c.id, c.name) for c in categories]
         
-        # Calculate analytics data for modal
-        now = datetime.now()
-        current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        # Monthly data
-        monthly_transactions = Transaction.query.filter(
-            Transaction.user_id == current_user.id,
-            Transaction.date >= current_month_start
-        ).all()
-        
-        monthly_income = sum(t.amount for t in monthly_transactions if t.transaction_type == 'income')
-        monthly_expenses = sum(t.amount for t in monthly_transactions if t.transaction_type == 'expense')
-        
-        # Transaction trends
-        transaction_count = len(all_transactions)
-        days_with_data = max(1, (now - min([t.date for t in all_transactions] + [now])).days + 1) if all_transactions else 1
-        avg_transaction = round(transaction_count / days_with_data, 1) if transaction_count > 0 else 0
-        
-        # Categories data
-        categories_data = []
-        if all_transactions:
-            from collections import defaultdict
-            category_totals = defaultdict(lambda: {'total': 0, 'count': 0, 'name': 'Unknown'})
-            
-            for transaction in all_transactions:
-                if transaction.transaction_type == 'expense':
-                    cat_name = transaction.category.name if transaction.category else 'Other'
-                    category_totals[cat_name]['total'] += transaction.amount
-                    category_totals[cat_name]['count'] += 1
-                    category_totals[cat_name]['name'] = cat_name
-            
-            # Convert to list and sort by total
-            categories_data = sorted([
-                {'name': data['name'], 'total': data['total'], 'count': data['count']}
-                for data in category_totals.values()
-            ], key=lambda x: x['total'], reverse=True)
-        
-        # Quick insights
-        savings_rate = round(((monthly_income - monthly_expenses) / monthly_income * 100), 1) if monthly_income > 0 else 0
-        daily_average = monthly_expenses / max(1, now.day) if monthly_expenses > 0 else 0
-        balance_trend = 0  # Could be calculated based on historical data
-        
-        # Debug output
-        print(f"DEBUG: monthly_income={monthly_income}, monthly_expenses={monthly_expenses}")
-        print(f"DEBUG: transaction_count={transaction_count}, avg_transaction={avg_transaction}")
-        print(f"DEBUG: categories_data={categories_data[:2] if categories_data else 'None'}")
+        # Totals, month-to-date figures and category breakdown
+        snapshot = AnalyticsSnapshot.get(current_user.id)
         
         # Use fixed dashboard template (no Chart.js issues)
         return render_template('dashboard_fixed.html', 
                              transactions=recent_transactions, 
-                             balance=balance, 
                              form=form,
-                             total_income=total_income,
-                             total_expenses=total_expenses,
                              categories=categories,
-                             monthly_income=monthly_income,
-                             monthly_expenses=monthly_expenses,
-                             transaction_count=transaction_count,
-                             avg_transaction=avg_transaction,
-                             categories_data=categories_data,
-                             savings_rate=savings_rate,
-                             daily_average=daily_average,
-                             balance_trend=balance_trend)
+                             **snapshot.context())
     except Exception as e:
         flash(f'Error loading dashboard: {str(e)}', 'error')
         # Fallback to simple dashboard if there's an error
@@ -209,71 +140,10 @@ def dashboard():
 def analytics():
     """Financial Analytics page"""
     try:
-        from datetime import datetime, timedelta
-        from sqlalchemy import func
-        
-        # Get all transactions for calculations
-        all_transactions = Transaction.query.filter_by(user_id=current_user.id).all()
-        
-        # Calculate totals
-        total_income = sum(t.amount for t in all_transactions if t.transaction_type == 'income')
-        total_expenses = sum(t.amount for t in all_transactions if t.transaction_type == 'expense')
-        balance = current_user.get_balance()
-        
-        # Calculate analytics data
-        now = datetime.now()
-        current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        # Monthly data
-        monthly_transactions = Transaction.query.filter(
-            Transaction.user_id == current_user.id,
-            Transaction.date >= current_month_start
-        ).all()
-        
-        monthly_income = sum(t.amount for t in monthly_transactions if t.transaction_type == 'income')
-        monthly_expenses = sum(t.amount for t in monthly_transactions if t.transaction_type == 'expense')
-        
-        # Transaction trends
-        transaction_count = len(all_transactions)
-        days_with_data = max(1, (now - min([t.date for t in all_transactions] + [now])).days + 1) if all_transactions else 1
-        avg_transaction = round(transaction_count / days_with_data, 1) if transaction_count > 0 else 0
-        
-        # Categories data
-        categories_data = []
-        if all_transactions:
-            from collections import defaultdict
-            category_totals = defaultdict(lambda: {'total': 0, 'count': 0, 'name': 'Unknown'})
-            
-            for transaction in all_transactions:
-                if transaction.transaction_type == 'expense':
-                    cat_name = transaction.category.name if transaction.category else 'Other'
-                    category_totals[cat_name]['total'] += transaction.amount
-                    category_totals[cat_name]['count'] += 1
-                    category_totals[cat_name]['name'] = cat_name
-            
-            # Convert to list and sort by total
-            categories_data = sorted([
-                {'name': data['name'], 'total': data['total'], 'count': data['count']}
-                for data in category_totals.values()
-            ], key=lambda x: x['total'], reverse=True)
-        
-        # Quick insights
-        savings_rate = round(((monthly_income - monthly_expenses) / monthly_income * 100), 1) if monthly_income > 0 else 0
-        daily_average = monthly_expenses / max(1, now.day) if monthly_expenses > 0 else 0
-        balance_trend = 0  # Could be calculated based on historical data
+        # Same figures as the dashboard (shared snapshot)
+        snapshot = AnalyticsSnapshot.get(current_user.id)
         
-        return render_template('analytics.html', 
-                             balance=balance,
-                             total_income=total_income,
-                             total_expenses=total_expenses,
-                             monthly_income=monthly_income,
-                             monthly_expenses=monthly_expenses,
-                             transaction_count=transaction_count,
-                             avg_transaction=avg_transaction,
-                             categories_data=categories_data,
-                             savings_rate=savings_rate,
-                             daily_average=daily_average,
-                             balance_trend=balance_trend)
+        return render_template('analytics.html', **snapshot.context())
     except Exception as e:
         flash(f'Error loading analytics: {str(e)}', 'error')
         return redirect(url_for('main.dashboard'))
@@ -296,6 +166,7 @@ def add_transaction():
             category_id=form.category_id.data
         )
         db.session.add(transaction)
+        apply_transaction(transaction)
         db.session.commit()
         flash('Transaction successfully added!', 'success')
     else:
@@ -317,6 +188,7 @@ def delete_transaction(transaction_id):
         return redirect(url_for('main.dashboard'))
     
     db.session.delete(transaction)
+    apply_transaction(transaction, sign=-1)
     db.session.commit()
     flash('Transaction deleted', 'success')
     return redirect(url_for('main.dashboard'))
@@ -325,43 +197,33 @@ def delete_transaction(transaction_id):
 @login_required
 def stats():
     """Statistics page"""
-    # Get data for charts
-    transactions = Transaction.query.filter_by(user_id=current_user.id).all()
-    
-    # Category statistics
+    # Category statistics (from the monthly rollups)
     category_stats = {}
-    for transaction in transactions:
-        if transaction.transaction_type == 'expense':
-            category_name = transaction.category.name
-            if category_name not in category_stats:
-                category_stats[category_name] = {
-                    'amount': 0, 
-                    'color': transaction.category.color
-                }
-            category_stats[category_name]['amount'] += transaction.amount
+    for row in category_totals(current_user.id, 'expense'):
+        if row['name'] not in category_stats:
+            category_stats[row['name']] = {
+                'amount': 0,
+                'color': row['color']
+            }
+        category_stats[row['name']]['amount'] += row['total']
+    
+    # Monthly statistics (last 6 calendar months, old to new)
+    first_month = add_months(month_start(datetime.now()), -5)
+    totals = monthly_totals(current_user.id, since=first_month)
     
-    # Monthly statistics (last 6 months)
     monthly_stats = []
     for i in range(6):
-        month_start = datetime.now().replace(day=1) - timedelta(days=i*30)
-        month_end = month_start + timedelta(days=30)
-        
-        month_income = sum(t.amount for t in transactions 
-                          if t.transaction_type == 'income' 
-                          and month_start <= t.date <= month_end)
-        month_expense = sum(t.amount for t in transactions 
-                           if t.transaction_type == 'expense' 
-                           and month_start <= t.date <= month_end)
+        month = add_months(first_month, i)
+        month_income = totals.get(month, {}).get('income', 0)
+        month_expense = totals.get(month, {}).get('expense', 0)
         
         monthly_stats.append({
-            'month': month_start.strftime('%m/%Y'),
+            'month': month.strftime('%m/%Y'),
             'income': month_income,
             'expense': month_expense,
             'balance': month_income - month_expense
         })
     
-    monthly_stats.reverse()  # Show from old to new
-    
     return render_template('stats.html', 
                          category_stats=category_stats,
                          monthly_stats=monthly_stats)
@@ -369,26 +231,63 @@ def stats():
 @main.route('/transactions')
 @login_required
 def transactions():
-    """Transactions page with all user transactions"""
-    # Get all transactions for the user
-    transactions = Transaction.query.filter_by(user_id=current_user.id)\
-                                  .order_by(Transaction.date.desc())\
-                                  .all()
+    """Transactions page: one keyset-paginated, filtered page at a time"""
+    try:
+        filters = parse_filters(request.args)
+        transactions, next_cursor = transactions_page(
+            current_user.id, filters,
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int)
+        )
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('main.transactions'))
     
     # Get categories for the filter dropdown
     categories = Category.query.all()
     
-    # Calculate totals
-    total_income = sum(t.amount for t in transactions if t.transaction_type == 'income')
-    total_expenses = sum(t.amount for t in transactions if t.transaction_type == 'expense')
-    balance = total_income - total_expenses
+    # Totals over every matching transaction, not just this page
+    totals = filtered_totals(current_user.id, filters)
+    
+    # Filter args without the cursor, for the next/first page links
+    filter_args = {key: value for key, value in request.args.items() if key != 'cursor' and value}
     
     return render_template('transactions.html',
                          transactions=transactions,
                          categories=categories,
-                         total_income=total_income,
-                         total_expenses=total_expenses,
-                         balance=balance)
+                         next_cursor=next_cursor,
+                         filter_args=filter_args,
+                         is_first_page=not request.args.get('cursor'),
+                         total_income=totals['income'],
+                         total_expenses=totals['expense'],
+                         balance=totals['balance'],
+                         transaction_count=totals['count'],
+                         import_form=import_form(categories))
+
+@main.route('/api/transactions')
+@login_required
+def api_transactions():
+    """Transactions API: ?cursor=&limit= plus the same filters as the page"""
+    try:
+        filters = parse_filters(request.args)
+        cursor = request.args.get('cursor')
+        transactions, next_cursor = transactions_page(
+            current_user.id, filters,
+            cursor=cursor,
+            limit=request.args.get('limit', type=int)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    data = {
+        'transactions': [serialize_transaction(t) for t in transactions],
+        'next_cursor': next_cursor
+    }
+    # Totals only need to be fetched once per listing
+    if not cursor:
+        data['totals'] = filtered_totals(current_user.id, filters)
+    
+    return jsonify(data)
 
 @main.route('/settings')
 @login_required
@@ -402,229 +301,132 @@ def settings():
 def reports():
     """Extended reports page"""
     period = request.args.get('period', 'month')  # week, month, quarter, year
+    if period not in DEFAULT_PERIOD_COUNTS:
+        period = 'month'
+    count = request.args.get('count', type=int)  # e.g. ?period=month&count=36
     
-    # Get transactions for the user
-    transactions = Transaction.query.filter_by(user_id=current_user.id).all()
-    
-    # Calculate periods based on selection
-    if period == 'week':
-        periods_data = get_weekly_stats(transactions)
-    elif period == 'quarter':
-        periods_data = get_quarterly_stats(transactions)
-    elif period == 'year':
-        periods_data = get_yearly_stats(transactions)
-    else:  # month
-        periods_data = get_monthly_stats_extended(transactions)
+    # One grouped query, bucketed by calendar period in the database
+    periods_data = period_totals(current_user.id, period, count)
     
     return render_template('reports.html', 
                          periods_data=periods_data,
                          current_period=period)
 
-def get_weekly_stats(transactions):
-    """Get weekly statistics for last 12 weeks"""
-    weekly_stats = []
-    for i in range(12):
-        week_start = datetime.now() - timedelta(weeks=i+1)
-        week_end = week_start + timedelta(days=7)
-        
-        week_income = sum(t.amount for t in transactions 
-                         if t.transaction_type == 'income' 
-                         and week_start <= t.date <= week_end)
-        week_expense = sum(t.amount for t in transactions 
-                          if t.transaction_type == 'expense' 
-                          and week_start <= t.date <= week_end)
-        
-        weekly_stats.append({
-            'period': f"Week {week_start.strftime('%d.%m')} - {week_end.strftime('%d.%m')}",
-            'income': week_income,
-            'expense': week_expense,
-            'balance': week_income - week_expense
-        })
-    
-    return list(reversed(weekly_stats))
+@main.route('/export')
+@login_required
+def export_transactions():
+    """Queue a CSV export"""
+    return queue_export('csv')
 
-def get_monthly_stats_extended(transactions):
-    """Get monthly statistics for last 12 months"""
-    monthly_stats = []
-    for i in range(12):
-        month_start = (datetime.now().replace(day=1) - timedelta(days=i*30)).replace(day=1)
-        if month_start.month == 12:
-            month_end = month_start.replace(year=month_start.year + 1, month=1) - timedelta(days=1)
-        else:
-            month_end = month_start.replace(month=month_start.month + 1) - timedelta(days=1)
-        
-        month_income = sum(t.amount for t in transactions 
-                          if t.transaction_type == 'income' 
-                          and month_start <= t.date <= month_end)
-        month_expense = sum(t.amount for t in transactions 
-                           if t.transaction_type == 'expense' 
-                           and month_start <= t.date <= month_end)
-        
-        monthly_stats.append({
-            'period': month_start.strftime('%B %Y'),
-            'income': month_income,
-            'expense': month_expense,
-            'balance': month_income - month_expense
-        })
-    
-    return list(reversed(monthly_stats))
-
-def get_quarterly_stats(transactions):
-    """Get quarterly statistics for last 8 quarters"""
-    quarterly_stats = []
-    for i in range(8):
-        # Calculate quarter start
-        current_quarter = ((datetime.now().month - 1) // 3) + 1
-        quarter_year = datetime.now().year
-        quarters_back = i
-        
-        while quarters_back > 0:
-            current_quarter -= 1
-            if current_quarter < 1:
-                current_quarter = 4
-                quarter_year -= 1
-            quarters_back -= 1
-        
-        # Quarter start and end dates
-        quarter_start = datetime(quarter_year, (current_quarter - 1) * 3 + 1, 1)
-        if current_quarter == 4:
-            quarter_end = datetime(quarter_year + 1, 1, 1) - timedelta(days=1)
-        else:
-            quarter_end = datetime(quarter_year, current_quarter * 3 + 1, 1) - timedelta(days=1)
-        
-        quarter_income = sum(t.amount for t in transactions 
-                            if t.transaction_type == 'income' 
-                            and quarter_start <= t.date <= quarter_end)
-        quarter_expense = sum(t.amount for t in transactions 
-                             if t.transaction_type == 'expense' 
-                             and quarter_start <= t.date <= quarter_end)
-        
-        quarterly_stats.append({
-            'period': f"Q{current_quarter} {quarter_year}",
-            'income': quarter_income,
-            'expense': quarter_expense,
-            'balance': quarter_income - quarter_expense
-        })
-    
-    return list(reversed(quarterly_stats))
+@main.route('/export_excel')
+@login_required
+def export_excel():
+    """Queue an Excel export"""
+    return queue_export('xlsx')
 
-def get_yearly_stats(transactions):
-    """Get yearly statistics for last 5 years"""
-    yearly_stats = []
-    current_year = datetime.now().year
-    
-    for i in range(5):
-        year = current_year - i
-        year_start = datetime(year, 1, 1)
-        year_end = datetime(year, 12, 31)
-        
-        year_income = sum(t.amount for t in transactions 
-                         if t.transaction_type == 'income' 
-                         and year_start <= t.date <= year_end)
-        year_expense = sum(t.amount for t in transactions 
-                          if t.transaction_type == 'expense' 
-                          and year_start <= t.date <= year_end)
-        
-        yearly_stats.append({
-            'period': str(year),
-            'income': year_income,
-            'expense': year_expense,
-            'balance': year_income - year_expense
-        })
-    
-    return list(reversed(yearly_stats))
+def queue_export(export_format):
+    """Queue an export job for the current filters and point the client at its status"""
+    try:
+        job = enqueue_export(current_user.id, export_format, request.args)
+    except ValueError as e:
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('main.dashboard'))
 
-@main.route('/export')
+    if job.status == 'pending' and current_app.config['EXPORT_JOBS_INLINE']:
+        run_job(job)
+
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(export_job_json(job)), 202
+    return redirect(url_for('main.export_status', job_id=job.id))
+
+def export_job_json(job):
+    """Job status plus a signed download link once the file is ready"""
+    data = job_status(job)
+    data['status_url'] = url_for('main.api_export_status', job_id=job.id)
+    if job.status == 'done':
+        data['download_url'] = url_for('main.download_export', token=download_token(job))
+    return data
+
+@main.route('/exports/<int:job_id>')
 @login_required
-def export_transactions():
-    """Export transactions to CSV"""
-    # Get filter parameters
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    transaction_type = request.args.get('type')  # income, expense, or all
-    category_id = request.args.get('category')
-    
-    # Base query
-    query = Transaction.query.filter_by(user_id=current_user.id)
-    
-    # Apply filters
-    if start_date:
-        try:
-            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-            query = query.filter(Transaction.date >= start_date_obj)
-        except ValueError:
-            flash('Invalid start date format', 'error')
-            return redirect(url_for('main.dashboard'))
-    
-    if end_date:
-        try:
-            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
-            query = query.filter(Transaction.date <= end_date_obj)
-        except ValueError:
-            flash('Invalid end date format', 'error')
-            return redirect(url_for('main.dashboard'))
-    
-    if transaction_type and transaction_type != 'all':
-        query = query.filter(Transaction.transaction_type == transaction_type)
-    
-    if category_id and category_id != 'all':
-        try:
-            query = query.filter(Transaction.category_id == int(category_id))
-        except ValueError:
-            flash('Invalid category', 'error')
-            return redirect(url_for('main.dashboard'))
-    
-    # Get transactions
-    transactions = query.order_by(Transaction.date.desc()).all()
-    
-    # Create CSV content
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        'Date', 'Type', 'Category', 'Description', 'Amount', 'Balance After'
-    ])
-    
-    # Calculate running balance
-    running_balance = 0
-    for transaction in reversed(transactions):  # Start from oldest
-        if transaction.transaction_type == 'income':
-            running_balance += transaction.amount
-        else:
-            running_balance -= transaction.amount
-    
-    # Write data rows
-    current_balance = running_balance
-    for transaction in transactions:  # Now from newest
-        # Adjust balance backwards
-        if transaction.transaction_type == 'income':
-            current_balance -= transaction.amount
-        else:
-            current_balance += transaction.amount
-        
-        # Calculate balance after this transaction
-        balance_after = current_balance + (transaction.amount if transaction.transaction_type == 'income' else -transaction.amount)
-        
-        writer.writerow([
-            transaction.date.strftime('%Y-%m-%d %H:%M'),
-            transaction.transaction_type.title(),
-            transaction.category.name,
-            transaction.description or '',
-            f"${transaction.amount:.2f}",
-            f"${balance_after:.2f}"
-        ])
-        
-        current_balance = balance_after
-    
-    # Create response
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    
-    # Generate filename
-    filename = f"transactions_{current_user.username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-    
+def export_status(job_id):
+    """Export progress page; starts the download when the file is ready"""
+    job = ExportJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return render_template('export_status.html', job=export_job_json(job))
+
+@main.route('/api/exports/<int:job_id>')
+@login_required
+def api_export_status(job_id):
+    """Export job progress for polling"""
+    job = ExportJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    response = jsonify(export_job_json(job))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@main.route('/exports/download/<token>')
+@login_required
+def download_export(token):
+    """Serve a finished export through an expiring signed link"""
+    job_id = job_from_token(token)
+    job = ExportJob.query.filter_by(id=job_id, user_id=current_user.id).first() if job_id else None
+    if job is None or job.status != 'done' or not job.file_path or not os.path.exists(job.file_path):
+        flash('This download link has expired. Please export again.', 'error')
+        return redirect(url_for('main.settings'))
+
+    return send_file(job.file_path, as_attachment=True, download_name=job.download_name,
+                     mimetype=EXPORT_FORMATS[job.export_format]['mimetype'])
+
+def import_form(categories):
+    """ImportForm with the category choices filled in (0: Other)"""
+    form = ImportForm()
+    form.category_id.choices = [(0, 'Other')] + [(c.id, c.name) for c in categories]
+    return form
+
+@main.route('/transactions/import', methods=['POST'])
+@login_required
+def upload_import():
+    """Queue an uploaded CSV/OFX/QIF file for import and point the client at its status"""
+    form = import_form(Category.query.all())
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    try:
+        if not form.validate_on_submit():
+            raise ValueError(next(iter(form.errors.values()))[0])
+        job = enqueue_import(current_user.id, form.file.data, form.file_format.data or None,
+                             form.category_id.data or None)
+    except ValueError as e:
+        if wants_json:
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('main.transactions'))
+
+    if current_app.config['IMPORT_JOBS_INLINE']:
+        run_import_job(job)
+
+    if wants_json:
+        return jsonify(import_job_json(job)), 202
+    return redirect(url_for('main.import_status', job_id=job.id))
+
+def import_job_json(job):
+    data = import_job_status(job)
+    data['status_url'] = url_for('main.api_import_status', job_id=job.id)
+    return data
+
+@main.route('/imports/<int:job_id>')
+@login_required
+def import_status(job_id):
+    """Import progress page"""
+    job = ImportJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return render_template('import_status.html', job=import_job_json(job))
+
+@main.route('/api/imports/<int:job_id>')
+@login_required
+def api_import_status(job_id):
+    """Import job progress for polling"""
+    job = ImportJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    response = jsonify(import_job_json(job))
+    response.headers['Cache-Control'] = 'no-store'
     return response
 
 @main.route('/categories')
@@ -634,33 +436,6 @@ def categories():
     categories = Category.query.all()
     return render_template('categories.html', categories=categories)
 
-@main.route('/export_excel')
-@login_required
-def export_excel():
-    import io
-    from flask import send_file
-    from openpyxl import Workbook
-
-    transactions = Transaction.query.filter_by(user_id=current_user.id).all()
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Transactions"
-    ws.append(['ID', 'Date', 'Category', 'Amount', 'Description'])
-
-    for t in transactions:
-        ws.append([
-            t.id,
-            t.date.strftime('%Y-%m-%d %H:%M'),
-            t.category.name if t.category else '',
-            t.amount,
-            t.description
-        ])
-
-    file_stream = io.BytesIO()
-    wb.save(file_stream)
-    file_stream.seek(0)
-    return send_file(file_stream, as_attachment=True, download_name='transactions.xlsx', mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-
 @main.route('/categories/add', methods=['GET', 'POST'])
 @login_required
 def add_category():
@@ -673,6 +448,7 @@ def add_category():
             color=form.color.data
         )
         db.session.add(category)
+        bump_all_data_versions()
         db.session.commit()
         flash('Category added successfully!', 'success')
         return redirect(url_for('main.categories'))
@@ -690,6 +466,7 @@ def edit_category(category_id):
         category.name = form.name.data
         category.description = form.description.data
         category.color = form.color.data
+        bump_all_data_versions()
         db.session.commit()
         flash('Category updated successfully!', 'success')
         return redirect(url_for('main.categories'))
@@ -708,7 +485,10 @@ def delete_category(category_id):
         flash(f'Cannot delete category "{category.name}" because it has {transaction_count} transactions. Move or delete those transactions first.', 'error')
         return redirect(url_for('main.categories'))
     
+    # Rollups of a category without transactions are empty, but still reference it
+    MonthlyRollup.query.filter_by(category_id=category_id).delete()
     db.session.delete(category)
+    bump_all_data_versions()
     db.session.commit()
     flash('Category deleted successfully!', 'success')
     return redirect(url_for('main.categories'))
@@ -775,21 +555,15 @@ def logout():
 # API routes for chart data
 @main.route('/api/chart_data')
 @login_required
+@conditional_on_data_version
 def chart_data():
     """API for chart data"""
-    transactions = Transaction.query.filter_by(user_id=current_user.id).all()
-    
     # Data for expense pie chart by categories
-    category_data = {}
-    for transaction in transactions:
-        if transaction.transaction_type == 'expense':
-            category_name = transaction.category.name
-            if category_name not in category_data:
-                category_data[category_name] = {
-                    'amount': 0,
-                    'color': transaction.category.color
-                }
-            category_data[category_name]['amount'] += transaction.amount
+    snapshot = AnalyticsSnapshot.get(current_user.id)
+    category_data = {
+        category['name']: {'amount': category['total'], 'color': category['color']}
+        for category in snapshot.categories_data
+    }
     
     return jsonify({
         'categories': category_data
@@ -801,26 +575,11 @@ def chart_data():
 @login_required
 def budget_goals():
     """Budget goals management"""
-    goals = BudgetGoal.query.filter_by(user_id=current_user.id, is_active=True).all()
+    # current_spent is kept up to date as transactions are written (app/budgets.py)
+    goals = BudgetGoal.query.filter_by(user_id=current_user.id, is_active=True)\
+                            .options(joinedload(BudgetGoal.category)).all()
     categories = Category.query.all()
     
-    # Update current spent for each goal
-    for goal in goals:
-        # Calculate current spending in period
-        start_date = goal.start_date
-        end_date = goal.end_date or datetime.utcnow()
-        
-        current_spent = db.session.query(db.func.sum(Transaction.amount))\
-            .filter(Transaction.user_id == current_user.id,
-                   Transaction.category_id == goal.category_id,
-                   Transaction.transaction_type == 'expense',
-                   Transaction.date >= start_date,
-                   Transaction.date <= end_date)\
-            .scalar() or 0
-        
-        goal.current_spent = current_spent
-        db.session.commit()
-    
     return render_template('budget_goals.html', goals=goals, categories=categories)
 
 
@@ -851,6 +610,9 @@ def add_budget_goal():
     )
     
     db.session.add(goal)
+    db.session.flush()
+    rebuild_goal_spending(db.session, goal_id=goal.id)
+    bump_data_version(current_user.id)
     db.session.commit()
     
     flash(f'Budget goal created successfully!', 'success')
@@ -861,32 +623,8 @@ def add_budget_goal():
 @login_required
 def smart_insights():
     """AI-powered financial insights"""
-    # Generate fresh recommendations
-    recommendations_data = generate_smart_recommendations(current_user.id)
-    
-    # Clear old recommendations
-    SmartRecommendation.query.filter_by(user_id=current_user.id).delete()
-    
-    # Add new recommendations to database
-    for rec_data in recommendations_data:
-        recommendation = SmartRecommendation(
-            user_id=current_user.id,
-            recommendation_type=rec_data['type'],
-            title=rec_data['title'],
-            description=rec_data['description'],
-            priority=rec_data['priority'],
-            impact_score=rec_data['impact_score']
-        )
-        db.session.add(recommendation)
-    
-    db.session.commit()
-    
-    # Get spending patterns
-    patterns = analyze_spending_patterns(current_user.id)
-    
-    # Get recommendations from database
-    recommendations = SmartRecommendation.query.filter_by(user_id=current_user.id)\
-                                               .order_by(SmartRecommendation.impact_score.desc()).all()
+    # Stored by the nightly rebuild; computed in memory (never written) while stale
+    patterns, recommendations = get_insights(current_user.id)
     
     return render_template('smart_insights.html', 
                          recommendations=recommendations, 
@@ -897,19 +635,65 @@ def smart_insights():
 @main.route('/notifications')
 @login_required
 def notifications():
-    """User notifications center"""
-    notifications = UserNotification.query.filter_by(user_id=current_user.id)\
-                                          .order_by(UserNotification.created_at.desc()).all()
-    
-    # Mark as read
-    unread_notifications = [n for n in notifications if not n.is_read]
-    for notification in unread_notifications:
-        notification.is_read = True
-        notification.read_at = datetime.utcnow()
-    
+    """User notifications center (one page, newest first)"""
+    cursor = request.args.get('cursor')
+    try:
+        page, next_cursor = notifications_page(current_user.id, cursor)
+    except ValueError:
+        return redirect(url_for('main.notifications'))
+    
+    # Render before marking the page read so new notifications keep their badge
+    html = render_template('notifications.html', notifications=page,
+                           next_cursor=next_cursor, is_first_page=not cursor)
+    mark_read(current_user.id, [n.id for n in page if not n.is_read])
     db.session.commit()
+    return html
+
+
+@main.route('/notifications/mark-all-read', methods=['POST'])
+@login_required
+def mark_all_notifications_read():
+    """Mark every notification as read"""
+    mark_read(current_user.id)
+    db.session.commit()
+    return redirect(url_for('main.notifications'))
+
+
+@main.route('/api/notifications')
+@login_required
+def api_notifications():
+    """Keyset-paginated notifications as JSON"""
+    try:
+        page, next_cursor = notifications_page(current_user.id, request.args.get('cursor'),
+                                               request.args.get('limit', type=int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return render_template('notifications.html', notifications=notifications)
+    return jsonify({
+        'notifications': [serialize_notification(n) for n in page],
+        'next_cursor': next_cursor
+    })
+
+
+@main.route('/api/notifications/unread-count')
+@login_required
+def api_unread_notifications():
+    """Unread notification count for badges"""
+    return jsonify({'unread': unread_count(current_user.id)})
+
+
+@main.route('/api/notifications/mark-read', methods=['POST'])
+@login_required
+def api_mark_notifications_read():
+    """Mark notifications as read: {"ids": [...]} or everything when ids is omitted"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if ids is not None and not (isinstance(ids, list) and all(isinstance(i, int) for i in ids)):
+        return jsonify({'error': 'ids must be a list of integers'}), 400
+    
+    updated = mark_read(current_user.id, ids)
+    db.session.commit()
+    return jsonify({'updated': updated, 'unread': unread_count(current_user.id)})
 
 
 @main.route('/receipt-scanner')
@@ -994,6 +778,7 @@ def convert_receipt_to_transaction(scan_id):
     )
     
     db.session.add(transaction)
+    apply_transaction(transaction)
     scan.transaction_id = transaction.id
     scan.is_processed = True
     db.session.commit()
@@ -1039,65 +824,19 @@ def custom_dashboard():
 
 @main.route('/widget-data/<widget_type>')
 @login_required
+@conditional_on_data_version
 def widget_data(widget_type):
     """Get data for specific widget type"""
-    if widget_type == 'balance':
-        return jsonify({
-            'balance': current_user.get_balance(),
-            'currency': 'USD'
-        })
-    
-    elif widget_type == 'spending_chart':
-        # Get last 30 days spending by category
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        transactions = Transaction.query.filter(
-            Transaction.user_id == current_user.id,
-            Transaction.transaction_type == 'expense',
-            Transaction.date >= thirty_days_ago
-        ).all()
-        
-        category_data = {}
-        for transaction in transactions:
-            cat_name = transaction.category.name
-            if cat_name not in category_data:
-                category_data[cat_name] = {
-                    'amount': 0,
-                    'color': transaction.category.color
-                }
-            category_data[cat_name]['amount'] += transaction.amount
-        
-        return jsonify(category_data)
-    
-    elif widget_type == 'goals':
-        goals = BudgetGoal.query.filter_by(user_id=current_user.id, is_active=True).limit(5).all()
-        goals_data = []
-        for goal in goals:
-            goals_data.append({
-                'category': goal.category.name,
-                'target': goal.target_amount,
-                'current': goal.current_spent,
-                'progress': goal.progress_percentage(),
-                'over_budget': goal.is_over_budget()
-            })
-        
-        return jsonify(goals_data)
-    
-    elif widget_type == 'recommendations':
-        recommendations = SmartRecommendation.query.filter_by(user_id=current_user.id)\
-                                                   .order_by(SmartRecommendation.impact_score.desc())\
-                                                   .limit(3).all()
-        rec_data = []
-        for rec in recommendations:
-            rec_data.append({
-                'title': rec.title,
-                'description': rec.description,
-                'priority': rec.priority,
-                'impact_score': rec.impact_score
-            })
-        
-        return jsonify(rec_data)
-    
-    return jsonify({'error': 'Unknown widget type'})
+    return jsonify(load_widgets(current_user.id, [widget_type])[widget_type])
+
+
+@main.route('/api/widgets')
+@login_required
+@conditional_on_data_version
+def api_widgets():
+    """Data for several dashboard widgets in one request (?types=balance,goals,...)"""
+    types = [t for t in request.args.get('types', '').split(',') if t]
+    return jsonify(load_widgets(current_user.id, types))
 
 
 # 🎮 Gamification Routes
@@ -1119,10 +858,12 @@ def achievements():
 # 📊 Advanced Analytics API
 @main.route('/api/spending-trends')
 @login_required
+@conditional_on_data_version
 def api_spending_trends():
     """Advanced spending trends API"""
     days = request.args.get('days', 30, type=int)
-    start_date = datetime.utcnow() - timedelta(days=days)
+    # Whole days, so the response only changes with the data or the date
+    start_date = datetime.combine(datetime.utcnow().date() - timedelta(days=days), datetime.min.time())
     
     transactions = Transaction.query.filter(
         Transaction.user_id == current_user.id,
@@ -1146,12 +887,25 @@ def api_spending_trends():
 
 @main.route('/api/predictions')
 @login_required
+@conditional_on_data_version
 def api_predictions():
     """AI predictions API"""
-    patterns = analyze_spending_patterns(current_user.id)
-    
-    # Generate monthly prediction
-    total_predicted = sum(p['predicted_next'] for p in patterns)
+    patterns, _ = get_insights(current_user.id)
+    forecast = forecast_expenses(current_user.id)
+    
+    # Next month's spending: the forecasting engine once there are a few months
+    # of history, the recent category averages before that
+    if forecast:
+        total = forecast['total']
+        monthly_prediction = total['forecast'][0]
+        # 1 minus the interval's half-width relative to the prediction
+        if monthly_prediction and total['upper'][0] is not None:
+            confidence = max(0.0, 1 - (total['upper'][0] - monthly_prediction) / monthly_prediction)
+        else:
+            confidence = 0
+    else:
+        monthly_prediction = sum(p['predicted_next'] for p in patterns)
+        confidence = sum(p['confidence_score'] for p in patterns) / len(patterns) if patterns else 0
     
     # Generate insights
     insights = []
@@ -1162,8 +916,9 @@ def api_predictions():
             insights.append(f"📉 Great! {pattern['category_name']} spending is decreasing")
     
     return jsonify({
-        'monthly_prediction': total_predicted,
-        'confidence': sum(p['confidence_score'] for p in patterns) / len(patterns) if patterns else 0,
+        'monthly_prediction': monthly_prediction,
+        'confidence': confidence,
+        'forecast': forecast,
         'insights': insights,
         'patterns': patterns
     })
@@ -1172,28 +927,40 @@ def api_predictions():
 # 🔄 Real-time Updates API
 @main.route('/api/live-balance')
 @login_required
+@conditional_on_data_version
 def api_live_balance():
     """Live balance updates"""
     return jsonify({
-        'balance': current_user.get_balance(),
+        'balance': AnalyticsSnapshot.get(current_user.id).balance,
         'timestamp': datetime.utcnow().isoformat()
     })
 
 
+@main.route('/api/stream')
+@no_compression
+@login_required
+def api_stream():
+    """Server-Sent Events: balance, budget and notification changes as they happen"""
+    return stream_response(current_user.id, request.headers.get('Last-Event-ID'))
+
+
 # PWA Service Worker
 @main.route('/sw.js')
 def service_worker():
     """Service Worker for PWA"""
-    sw_content = """
-const CACHE_NAME = 'finrelate-cache-v1';
-const urlsToCache = [
-    '/',
-    '/static/style.css',
-    '/static/finrelate.css',
-    '/dashboard',
-    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
-    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css'
-];
+    # Cache name and asset URLs come from the asset manifest, so a deploy with
+    # changed assets installs a new cache and the activate handler drops the old one
+    manifest = get_manifest()
+    cache_name = f"finrelate-cache-{manifest['version']}" if manifest else 'finrelate-cache-dev'
+    urls_to_cache = ['/', '/dashboard'] + (precache_urls() or [url_for('static', filename=name)
+                                                             for name in ('style.css', 'finrelate.css')]) + [
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css'
+    ]
+    sw_content = f"""
+const CACHE_NAME = {json.dumps(cache_name)};
+const urlsToCache = {json.dumps(urls_to_cache, indent=4)};
+""" + """
 
 self.addEventListener('install', function(event) {
     event.waitUntil(
@@ -1242,6 +1009,8 @@ self.addEventListener('push', function(event) {
 """
     response = make_response(sw_content)
     response.headers['Content-Type'] = 'application/javascript'
+    # Browsers must see a new worker (and cache name) right after a deploy
+    response.headers['Cache-Control'] = 'no-cache'
     return response
 
 
@@ -0,0 +1,40 @@
+"""
+Private files
+
+Some directories hold users' financial data (rendered exports, uploaded
+imports) or code the app executes (the template bytecode cache). They must
+only be readable and writable by the user the app runs as, otherwise
+another local account could read statements or plant files the app loads.
+
+private_directory() creates such a directory with mode 0700 and refuses to
+use one that is a symlink, belongs to another user or is open to group or
+others. open_private() creates a file with mode 0600.
+"""
+import os
+import stat
+
+
+def private_directory(path):
+    """Create `path` (mode 0700) if missing and check only this user can use it; returns the path
+
+    Raises PermissionError if the directory is unsafe to use.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if os.name != 'posix':
+        return path
+
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f"{path} is not a directory")
+    if info.st_uid != os.getuid():
+        raise PermissionError(f"{path} belongs to another user")
+    if info.st_mode & 0o077:
+        raise PermissionError(f"{path} is accessible to other users (mode {info.st_mode & 0o777:o}); "
+                              f"run chmod 700 on it")
+    return path
+
+
+def open_private(path, mode='wb'):
+    """Create a new file at `path` readable only by this user and open it for writing"""
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    return os.fdopen(descriptor, mode)
@@ -0,0 +1,174 @@
+"""
+Template compilation and render timing
+
+Jinja compiles each template to Python code the first time it is loaded,
+which every gunicorn worker would otherwise repeat on its first requests.
+The compiled code is kept in a filesystem bytecode cache, shared by the
+workers on a host and across restarts; entries are keyed on the template
+source, so an edited template is simply recompiled. Cache files are loaded
+as code, so the directory must be private: by default Jinja's per-user
+directory in the temp folder (mode 0700, ownership checked), or
+TEMPLATE_CACHE_DIR, which must pass the same check
+(app.storage.private_directory()). If it does not, the app runs without
+the cache.
+
+With TEMPLATE_WARMUP, create_app() loads every template the app renders
+(the render_template() calls in app/, plus the layouts, includes and
+imports they reference) so no request pays for compilation. A template
+that no longer compiles is logged rather than stopping the boot.
+
+Every render_template() is timed. Renders slower than TEMPLATE_SLOW_MS are
+logged as warnings, and with TEMPLATE_SERVER_TIMING the timings are sent
+in a Server-Timing header (visible in the browser's network panel).
+
+Each process also aggregates count, total and maximum time per template
+(template_stats()). Every TEMPLATE_STATS_INTERVAL seconds the slowest
+templates by total time are logged and the counters start over, so the
+log holds one summary per worker and interval.
+"""
+import os
+import re
+import threading
+import time
+from flask import before_render_template, g, has_request_context, template_rendered
+from jinja2 import FileSystemBytecodeCache, TemplateError
+from app.storage import private_directory
+
+APP_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+RENDER_CALL = re.compile(r"""render_template\(\s*['"]([^'"]+)['"]""")
+TEMPLATE_REFERENCE = re.compile(r"""\{%-?\s*(?:extends|include|import|from)\s+['"]([^'"]+)['"]""")
+STATS_SUMMARY_SIZE = 10  # templates listed per logged summary
+
+
+class TemplateStats:
+    """Per-template render count, total and maximum milliseconds for one process"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._stats = {}
+        self._since = time.monotonic()
+
+    def record(self, name, elapsed):
+        """Add one render; returns the finished interval's snapshot when one is due, else None"""
+        with self._lock:
+            count, total, slowest = self._stats.get(name, (0, 0.0, 0.0))
+            self._stats[name] = (count + 1, total + elapsed, max(slowest, elapsed))
+            if not self.interval or time.monotonic() - self._since < self.interval:
+                return None
+            snapshot = dict(self._stats)
+            self._reset()
+            return snapshot
+
+    def snapshot(self):
+        """{name: (count, total ms, max ms)} since the last summary"""
+        with self._lock:
+            return dict(self._stats)
+
+
+def init_templating(app):
+    """Cache compiled templates, precompile them (TEMPLATE_WARMUP) and time renders"""
+    if app.config['TEMPLATE_CACHE']:
+        app.jinja_env.bytecode_cache = _bytecode_cache(app)
+
+    app.extensions['template_stats'] = TemplateStats(app.config['TEMPLATE_STATS_INTERVAL'])
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+    if app.config['TEMPLATE_SERVER_TIMING']:
+        app.after_request(_add_server_timing)
+
+    if app.config['TEMPLATE_WARMUP']:
+        warm_up(app)
+
+
+def _bytecode_cache(app):
+    """FileSystemBytecodeCache in a private directory, or None if there is none to use"""
+    cache_dir = app.config['TEMPLATE_CACHE_DIR']
+    try:
+        if cache_dir:
+            return FileSystemBytecodeCache(private_directory(cache_dir))
+        # Jinja's own per-user directory, created 0700 and refused if unsafe
+        return FileSystemBytecodeCache()
+    except (OSError, RuntimeError) as e:
+        app.logger.error('Template bytecode cache disabled: %s', e)
+        return None
+
+
+def templates_in_use(app):
+    """Names of the templates rendered by app/ and everything they extend, include or import"""
+    names = set()
+    for filename in os.listdir(APP_FOLDER):
+        if filename.endswith('.py'):
+            with open(os.path.join(APP_FOLDER, filename), encoding='utf-8') as f:
+                names.update(RENDER_CALL.findall(f.read()))
+
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        try:
+            source = app.jinja_env.loader.get_source(app.jinja_env, name)[0]
+        except TemplateError:
+            continue  # reported by warm_up()
+        for reference in TEMPLATE_REFERENCE.findall(source):
+            if reference not in names:
+                names.add(reference)
+                pending.append(reference)
+    return sorted(names)
+
+
+def warm_up(app):
+    """Compile the templates in use into the environment (and the bytecode cache); returns the count"""
+    started = time.perf_counter()
+    loaded = 0
+    for name in templates_in_use(app):
+        try:
+            app.jinja_env.get_template(name)
+            loaded += 1
+        except TemplateError as e:
+            app.logger.error('Template %s failed to compile: %s', name, e)
+    app.logger.info('Compiled %d template(s) in %.0f ms', loaded, (time.perf_counter() - started) * 1000)
+    return loaded
+
+
+def template_stats(app):
+    """This process's per-template {name: (count, total ms, max ms)} for the current interval"""
+    return app.extensions['template_stats'].snapshot()
+
+
+def log_template_stats(app, stats):
+    """Log the templates with the most total render time in `stats`"""
+    slowest = sorted(stats.items(), key=lambda item: item[1][1], reverse=True)[:STATS_SUMMARY_SIZE]
+    if slowest:
+        app.logger.info('Template renders (pid %d): %s', os.getpid(), '; '.join(
+            f'{name} {count}x avg {total / count:.1f} ms max {slowest_ms:.1f} ms'
+            for name, (count, total, slowest_ms) in slowest
+        ))
+
+
+def _render_started(app, template, **extra):
+    if has_request_context():
+        g.setdefault('template_starts', []).append(time.perf_counter())
+
+
+def _render_finished(app, template, **extra):
+    starts = g.get('template_starts') if has_request_context() else None
+    if not starts:
+        return
+    elapsed = (time.perf_counter() - starts.pop()) * 1000
+    name = template.name or '<string>'
+    g.setdefault('template_timings', []).append((name, elapsed))
+    if elapsed > app.config['TEMPLATE_SLOW_MS']:
+        app.logger.warning('Slow template render: %s took %.1f ms', name, elapsed)
+    finished = app.extensions['template_stats'].record(name, elapsed)
+    if finished:
+        log_template_stats(app, finished)
+
+
+def _add_server_timing(response):
+    for name, elapsed in g.get('template_timings', ()):
+        response.headers.add('Server-Timing', f'template;desc="{name}";dur={elapsed:.1f}')
+    return response
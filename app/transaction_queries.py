@@ -0,0 +1,152 @@
+"""
+Transaction filtering and keyset pagination
+
+Shared by the /transactions page, /api/transactions and the exports: one
+set of request filters (type, category, date range, amount range), one
+query builder, and cursor pagination on (date, id) so page N costs the same
+as page 1 no matter how long the user's history is.
+"""
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, and_, or_
+from sqlalchemy.orm import joinedload
+from app import db
+from app.ledger import get_user_totals
+from app.models import Transaction
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def parse_filters(args):
+    """Validated transaction filters from request args
+
+    Recognised args: type (income/expense/all), category (id or all),
+    start_date and end_date (YYYY-MM-DD, inclusive), min_amount and
+    max_amount. Raises ValueError with a user-facing message on bad input.
+    """
+    filters = {}
+
+    transaction_type = args.get('type')
+    if transaction_type and transaction_type != 'all':
+        if transaction_type not in ('income', 'expense'):
+            raise ValueError('Invalid transaction type')
+        filters['transaction_type'] = transaction_type
+
+    category_id = args.get('category')
+    if category_id and category_id != 'all':
+        try:
+            filters['category_id'] = int(category_id)
+        except ValueError:
+            raise ValueError('Invalid category')
+
+    for name in ('start_date', 'end_date'):
+        value = args.get(name)
+        if value:
+            try:
+                filters[name] = datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f"Invalid {name.replace('_', ' ')} format")
+
+    for name in ('min_amount', 'max_amount'):
+        value = args.get(name)
+        if value:
+            try:
+                filters[name] = float(value)
+            except ValueError:
+                raise ValueError(f"Invalid {name.replace('_', ' ')}")
+
+    return filters
+
+
+def apply_filters(query, user_id, filters):
+    """Restrict a select() over Transaction to one user and the given filters"""
+    query = query.where(Transaction.user_id == user_id)
+    if 'transaction_type' in filters:
+        query = query.where(Transaction.transaction_type == filters['transaction_type'])
+    if 'category_id' in filters:
+        query = query.where(Transaction.category_id == filters['category_id'])
+    if 'start_date' in filters:
+        query = query.where(Transaction.date >= filters['start_date'])
+    if 'end_date' in filters:
+        # end_date is a whole day: include everything before the next midnight
+        query = query.where(Transaction.date < filters['end_date'] + timedelta(days=1))
+    if 'min_amount' in filters:
+        query = query.where(Transaction.amount >= filters['min_amount'])
+    if 'max_amount' in filters:
+        query = query.where(Transaction.amount <= filters['max_amount'])
+    return query
+
+
+def encode_cursor(transaction):
+    """Opaque cursor pointing just after `transaction` in (date, id) DESC order"""
+    raw = f"{transaction.date.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(date, id) from a cursor made by encode_cursor(); ValueError if invalid"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date_value, transaction_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(date_value), int(transaction_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def transactions_page(user_id, filters, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of transactions, newest first, with categories joined
+
+    Returns (transactions, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    query = apply_filters(select(Transaction), user_id, filters)\
+        .options(joinedload(Transaction.category))\
+        .order_by(Transaction.date.desc(), Transaction.id.desc())\
+        .limit(limit + 1)
+
+    if cursor:
+        after_date, after_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Transaction.date < after_date,
+            and_(Transaction.date == after_date, Transaction.id < after_id)
+        ))
+
+    rows = db.session.execute(query).scalars().all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def filtered_totals(user_id, filters):
+    """Income, expense, balance and count over every row matching the filters
+
+    Unfiltered totals come straight from the balance ledger; filtered ones
+    from a single grouped query.
+    """
+    if not filters:
+        return get_user_totals(user_id)
+
+    query = apply_filters(
+        select(Transaction.transaction_type, func.sum(Transaction.amount), func.count(Transaction.id)),
+        user_id, filters
+    ).group_by(Transaction.transaction_type)
+
+    totals = {'income': 0.0, 'expense': 0.0, 'count': 0}
+    for transaction_type, total, count in db.session.execute(query):
+        totals[transaction_type] = total
+        totals['count'] += count
+    totals['balance'] = totals['income'] - totals['expense']
+    return totals
+
+
+def serialize_transaction(transaction):
+    """JSON-friendly dict for a transaction (category must be loaded)"""
+    return {
+        'id': transaction.id,
+        'date': transaction.date.isoformat(),
+        'type': transaction.transaction_type,
+        'amount': transaction.amount,
+        'description': transaction.description,
+        'category_id': transaction.category_id,
+        'category': transaction.category.name if transaction.category else None
+    }
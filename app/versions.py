@@ -0,0 +1,114 @@
+"""
+Per-user data versions
+
+DataVersion is a counter per user that goes up on every write changing what
+the user sees. Caches key their entries on (user_id, version), so a write
+never has to find and invalidate them: the next read simply misses.
+Categories are shared by all users, so changing one bumps every user.
+Bumps are also noted on the session, so app/events.py can wake the user's
+live update streams once the transaction commits.
+
+Reading or archiving notifications changes no financial figure, so it
+bumps a separate NotificationVersion counter instead: live streams pick up
+the new unread count while the data-version keyed caches (analytics,
+widgets, PDF reports, insights) stay valid.
+
+The same counter makes the polled JSON APIs conditional: views decorated
+with @conditional_on_data_version send a weak ETag derived from the
+version, and a request whose If-None-Match still matches gets 304 Not
+Modified before the view (and its aggregation queries) runs.
+"""
+import hashlib
+from datetime import date, datetime
+from functools import wraps
+from flask import request, make_response
+from flask_login import current_user
+from sqlalchemy import select, literal, exists
+from app import db
+from app.dbutil import upsert_increment
+from app.models import DataVersion, NotificationVersion, User
+
+# Marker in session.info['changed_users'] for a change affecting every user
+ALL_USERS = '*'
+
+
+def bump_data_version(user_id):
+    """Increment the user's data version (part of the caller's DB transaction)"""
+    upsert_increment(
+        DataVersion.__table__,
+        key={'user_id': user_id},
+        increments={'version': 1},
+        values={'updated_at': datetime.utcnow()}
+    )
+    db.session.info.setdefault('changed_users', set()).add(user_id)
+
+
+def bump_all_data_versions():
+    """Increment every user's data version (part of the caller's DB transaction)"""
+    table = DataVersion.__table__
+    now = datetime.utcnow()
+    db.session.execute(table.update().values(version=table.c.version + 1, updated_at=now))
+    # Users who have never written are at version 0; give them a row at 1
+    db.session.execute(table.insert().from_select(
+        ['user_id', 'version', 'updated_at'],
+        select(User.id, literal(1), literal(now, db.DateTime))
+        .where(~exists().where(table.c.user_id == User.id))
+    ))
+    db.session.info.setdefault('changed_users', set()).add(ALL_USERS)
+
+
+def bump_notification_version(user_id):
+    """Increment the user's notification version (part of the caller's DB transaction)"""
+    upsert_increment(
+        NotificationVersion.__table__,
+        key={'user_id': user_id},
+        increments={'version': 1},
+        values={'updated_at': datetime.utcnow()}
+    )
+    db.session.info.setdefault('changed_users', set()).add(user_id)
+
+
+def get_notification_version(user_id):
+    """Current notification version for a user (0 before the first read)"""
+    version = db.session.execute(
+        select(NotificationVersion.version).where(NotificationVersion.user_id == user_id)
+    ).scalar()
+    return version or 0
+
+
+def get_data_version(user_id):
+    """Current data version for a user (0 before the first write)"""
+    version = db.session.execute(
+        select(DataVersion.version).where(DataVersion.user_id == user_id)
+    ).scalar()
+    return version or 0
+
+
+def data_version_etag(user_id):
+    """ETag value for the current request's response at the user's data version
+
+    Covers the URL with its query string and today's date (local and UTC),
+    since several APIs report figures for the current day or month.
+    """
+    key = f"{user_id}:{get_data_version(user_id)}:{date.today()}:{datetime.utcnow().date()}:{request.full_path}"
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def conditional_on_data_version(view):
+    """Answer If-None-Match with 304 while the user's data version is unchanged
+
+    For GET views of the logged-in user's data (apply after @login_required).
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = data_version_etag(current_user.id)
+        if request.if_none_match.contains_weak(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+        response.set_etag(etag, weak=True)
+        # Always revalidate; never share between users
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+        return response
+    return wrapper
@@ -0,0 +1,93 @@
+"""
+Dashboard widget data
+
+The custom dashboard loads every widget with one request to
+/api/widgets?types=balance,goals,... instead of one request per widget.
+load_widgets() builds the requested widgets together: balance and
+spending_chart read the same AnalyticsSnapshot (one rollup query between
+them), goals eager-loads each goal's category, and recommendations come
+from the stored insights (app/insights.py).
+
+Each widget's data is cached on (widget type, user, day, data version), so
+the dashboard's periodic refresh costs one data-version lookup until the
+user's data changes.
+"""
+from datetime import date
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from app import db
+from app.analytics import AnalyticsSnapshot
+from app.cache import MemoryCache
+from app.insights import get_insights
+from app.models import BudgetGoal
+from app.versions import get_data_version
+
+_widgets = MemoryCache(max_entries=4096, ttl=600)
+
+
+def balance_widget(user_id):
+    return {
+        'balance': AnalyticsSnapshot.get(user_id).balance,
+        'currency': 'USD'
+    }
+
+
+def spending_chart_widget(user_id):
+    # Current month spending by category: {name: {'amount', 'color'}}
+    return AnalyticsSnapshot.get(user_id).month_category_spending
+
+
+def goals_widget(user_id):
+    goals = db.session.execute(
+        select(BudgetGoal)
+        .options(joinedload(BudgetGoal.category))
+        .where(BudgetGoal.user_id == user_id, BudgetGoal.is_active.is_(True))
+        .order_by(BudgetGoal.id)
+        .limit(5)
+    ).scalars().all()
+    return [{
+        'category': goal.category.name,
+        'target': goal.target_amount,
+        'current': goal.current_spent,
+        'progress': goal.progress_percentage(),
+        'over_budget': goal.is_over_budget()
+    } for goal in goals]
+
+
+def recommendations_widget(user_id):
+    _, recommendations = get_insights(user_id)
+    return [{
+        'title': recommendation.title,
+        'description': recommendation.description,
+        'priority': recommendation.priority,
+        'impact_score': recommendation.impact_score
+    } for recommendation in recommendations[:3]]
+
+
+WIDGETS = {
+    'balance': balance_widget,
+    'spending_chart': spending_chart_widget,
+    'goals': goals_widget,
+    'recommendations': recommendations_widget,
+}
+
+
+def load_widgets(user_id, widget_types):
+    """{widget type: data} for the requested widgets, from the cache where possible
+
+    Unknown types map to {'error': 'Unknown widget type'}.
+    """
+    data_version = get_data_version(user_id)
+    today = date.today()
+
+    data = {}
+    for widget_type in dict.fromkeys(widget_types):
+        builder = WIDGETS.get(widget_type)
+        if builder is None:
+            data[widget_type] = {'error': 'Unknown widget type'}
+            continue
+        data[widget_type] = _widgets.get_or_set(
+            (widget_type, user_id, today, data_version),
+            lambda: builder(user_id)
+        )
+    return data
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark for response compression
+
+Fills a scratch database with one synthetic user, then requests a set of
+routes through the test client with each content encoding. For every route
+it reports the bytes on the wire, the CPU time of the uncompressed request,
+and the CPU time compress_response() adds for each encoding (measured on
+the route's own body, since the difference between two whole requests is
+lost in the noise of the view itself).
+
+    python benchmarks/bench_compression.py --rows 20000 --requests 20
+"""
+
+import os
+import sys
+import random
+import shutil
+import tempfile
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROUTES = [
+    '/transactions',
+    '/api/transactions?limit=100',
+    '/api/spending-trends?days=365',
+    '/api/chart_data',
+    '/analytics',
+]
+MERCHANTS = ['Grocery store', 'Coffee shop', 'Fuel', 'Pharmacy', 'Restaurant', 'Online order',
+             'Electricity bill', 'Cinema', 'Bookshop', 'Taxi', 'Salary', 'Gym membership']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Response compression benchmark')
+    parser.add_argument('--rows', type=int, default=20000, help='Transactions for the benchmark user')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per route and encoding')
+    parser.add_argument('--database-url', help='Scratch database (default: temporary SQLite file)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scratch_dir = tempfile.mkdtemp(prefix='finrelate-bench-')
+    if args.database_url:
+        os.environ['DEV_DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DEV_DATABASE_URL'] = f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}"
+    os.environ.setdefault('EXPORT_DIR', os.path.join(scratch_dir, 'exports'))
+
+    from app import create_app, db
+    from app.compression import brotli
+
+    app = create_app('development')
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        populate(db, args.rows)
+        routes = ROUTES + [csv_download_url(app)]
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+    print(f"\n{'route':32s} {'identity':>11s} {'req ms':>7s}"
+          + ''.join(f" {encoding:>9s} {'ratio':>6s} {'+ms':>6s}" for encoding in encodings))
+    for route in routes:
+        identity = client.get(route, headers={'Accept-Encoding': 'identity'})
+        assert identity.status_code == 200, (route, identity.status_code)
+        request_cpu = cpu_per_call(lambda: client.get(route, headers={'Accept-Encoding': 'identity'}).get_data(),
+                                   args.requests)
+        body = identity.get_data()
+        label = route if len(route) <= 32 else route[:29] + '...'
+        line = f"{label:32s} {len(body):11,d} {request_cpu * 1000:7.2f}"
+        for encoding in encodings:
+            wire = len(client.get(route, headers={'Accept-Encoding': encoding}).get_data())
+            cost = compression_cpu(app, route, body, identity, encoding, args.requests)
+            line += f" {wire:9,d} {len(body) / wire:5.1f}x {cost * 1000:6.2f}"
+        print(line)
+
+    shutil.rmtree(scratch_dir)
+
+
+def cpu_per_call(function, repeat):
+    started = time.process_time()
+    for _ in range(repeat):
+        function()
+    return (time.process_time() - started) / repeat
+
+
+def compression_cpu(app, route, body, original, encoding, repeat):
+    """CPU seconds compress_response() spends on `body` (streamed like the original)"""
+    from flask import Response
+    from app.compression import compress_response
+
+    def compress():
+        if original.is_streamed or original.direct_passthrough:
+            chunks = iter([body[i:i + 8192] for i in range(0, len(body), 8192)])
+            response = Response(chunks, mimetype=original.mimetype, direct_passthrough=True)
+        else:
+            response = Response(body, mimetype=original.mimetype)
+        with app.test_request_context(route, headers={'Accept-Encoding': encoding}):
+            compressed = compress_response(response)
+            assert compressed.headers.get('Content-Encoding') == encoding, (route, encoding)
+            b''.join(compressed.iter_encoded())
+
+    return cpu_per_call(compress, repeat)
+
+
+def csv_download_url(app):
+    """Render a CSV export of every transaction and return its download link"""
+    from app.export_jobs import enqueue_export, run_job, download_token
+
+    with app.test_request_context():
+        job = enqueue_export(1, 'csv', {})
+        run_job(job)
+        return f"/exports/download/{download_token(job)}"
+
+
+def populate(db, rows):
+    """One user with `rows` transactions, with balances and rollups rebuilt"""
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+    from app.ledger import reconcile
+    from app.models import User, Category, Transaction
+
+    print(f"Generating {rows:,} transactions...")
+    for index in range(10):
+        db.session.add(Category(name=f'Category {index}', color='#007bff'))
+    db.session.add(User(username='bench', email='bench@example.com', password_hash=generate_password_hash('bench')))
+    db.session.commit()
+
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    batch = []
+    for _ in range(rows):
+        batch.append({
+            'user_id': 1,
+            'category_id': rng.randint(1, 10),
+            'amount': round(rng.uniform(1, 500), 2),
+            'transaction_type': 'income' if rng.random() < 0.2 else 'expense',
+            'date': now - timedelta(days=rng.uniform(0, 730)),
+            'description': f"{rng.choice(MERCHANTS)} #{rng.randint(1, 9999)}",
+        })
+        if len(batch) >= 10000:
+            db.session.execute(insert(Transaction), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Transaction), batch)
+    db.session.commit()
+    reconcile()
+
+
+if __name__ == '__main__':
+    main()
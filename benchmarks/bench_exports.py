@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the streaming CSV and Excel exports
+
+Fills a scratch database with one synthetic user per requested size, then
+runs each export format in a fresh child process and reports throughput and
+peak RSS growth (peak resident memory during the export minus the resident
+memory after the app has started). A fresh process per run keeps one
+export's peak from hiding the next one's.
+
+    python benchmarks/bench_exports.py --rows 100000 1000000
+    python benchmarks/bench_exports.py --rows 100000 --formats csv xlsx legacy-xlsx
+
+`legacy-xlsx` reproduces the previous in-memory export (ORM rows, lazy
+category loads, a regular Workbook saved to BytesIO) for comparison.
+"""
+
+import os
+import sys
+import json
+import random
+import resource
+import subprocess
+import tempfile
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FORMATS = ('csv', 'xlsx', 'legacy-xlsx')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Export benchmark')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000],
+                        help='Export sizes (one synthetic user per size)')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=['csv', 'xlsx'],
+                        help='Export formats to run')
+    parser.add_argument('--database-url', help='Scratch database (default: temporary SQLite file)')
+    parser.add_argument('--child', nargs=2, metavar=('FORMAT', 'USER_ID'), help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def main():
+    args = parse_args()
+    if args.child:
+        return run_child(args.child[0], int(args.child[1]))
+
+    scratch_dir = None
+    if not args.database_url:
+        scratch_dir = tempfile.mkdtemp(prefix='finrelate-bench-')
+        args.database_url = f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}"
+    os.environ['DEV_DATABASE_URL'] = args.database_url
+
+    from app import create_app, db
+    app = create_app('development')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        populate(db, args.rows)
+
+    print(f"\n{'rows':>10s} {'format':12s} {'seconds':>9s} {'rows/s':>10s} {'peak RSS +MB':>13s} {'output MB':>10s}")
+    for user_id, rows in enumerate(args.rows, start=1):
+        for export_format in args.formats:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', export_format, str(user_id)],
+                env={**os.environ, 'DEV_DATABASE_URL': args.database_url},
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{rows:>10,d} {export_format:12s} {result['seconds']:9.2f} "
+                  f"{rows / result['seconds']:10,.0f} {result['peak_rss_mb']:13.1f} {result['bytes'] / 2**20:10.1f}")
+
+    if scratch_dir:
+        os.remove(os.path.join(scratch_dir, 'bench.db'))
+        os.rmdir(scratch_dir)
+
+
+def run_child(export_format, user_id):
+    """Run one export and print its measurements as JSON"""
+    from app import create_app
+    from app.exports import iter_csv, write_excel
+
+    app = create_app('development')
+    with app.app_context():
+        baseline = peak_rss_mb()
+        started = time.perf_counter()
+        if export_format == 'csv':
+            size = sum(len(chunk.encode()) for chunk in iter_csv(user_id, {}))
+        elif export_format == 'xlsx':
+            output = write_excel(user_id, {})
+            size = output.seek(0, os.SEEK_END)
+            output.close()
+        else:
+            size = legacy_excel(user_id)
+        seconds = time.perf_counter() - started
+
+    print(json.dumps({'seconds': seconds, 'peak_rss_mb': peak_rss_mb() - baseline, 'bytes': size}))
+
+
+def legacy_excel(user_id):
+    """The previous export: every ORM row in memory, one Workbook in memory"""
+    import io
+    from openpyxl import Workbook
+    from app.models import Transaction
+
+    transactions = Transaction.query.filter_by(user_id=user_id).all()
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Transactions"
+    ws.append(['ID', 'Date', 'Category', 'Amount', 'Description'])
+    for t in transactions:
+        ws.append([
+            t.id,
+            t.date.strftime('%Y-%m-%d %H:%M'),
+            t.category.name if t.category else '',
+            t.amount,
+            t.description
+        ])
+    file_stream = io.BytesIO()
+    wb.save(file_stream)
+    return file_stream.getbuffer().nbytes
+
+
+def populate(db, sizes):
+    """Insert one user per export size with that many transactions"""
+    from sqlalchemy import insert
+    from app.models import User, Category, Transaction
+
+    print(f"Generating {sum(sizes):,} transactions for {len(sizes)} users...")
+    for index in range(10):
+        db.session.add(Category(name=f'Category {index}', color='#007bff'))
+    for index in range(len(sizes)):
+        db.session.add(User(username=f'bench_{index}', email=f'bench_{index}@example.com', password_hash='x'))
+    db.session.commit()
+
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    batch = []
+    for user_id, rows in enumerate(sizes, start=1):
+        for _ in range(rows):
+            batch.append({
+                'user_id': user_id,
+                'category_id': rng.randint(1, 10),
+                'amount': round(rng.uniform(1, 500), 2),
+                'transaction_type': 'income' if rng.random() < 0.2 else 'expense',
+                'date': now - timedelta(days=rng.uniform(0, 1825)),
+                'description': 'benchmark',
+            })
+            if len(batch) >= 10000:
+                db.session.execute(insert(Transaction), batch)
+                batch = []
+    if batch:
+        db.session.execute(insert(Transaction), batch)
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
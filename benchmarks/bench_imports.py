@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Benchmark for bulk transaction imports
+
+Writes a synthetic CSV, OFX and QIF file of --rows transactions, imports
+each into its own user of a scratch database with import_transactions(),
+and reports rows per second. For comparison it also inserts --baseline-rows
+rows the way the add_transaction route does (one ORM object,
+apply_transaction() and commit per row). After every import the ledger,
+monthly rollups and budget goal progress are compared with a full
+`reconcile` rebuild.
+
+    python benchmarks/bench_imports.py --rows 100000
+"""
+
+import os
+import sys
+import random
+import shutil
+import tempfile
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CATEGORIES = ['Food', 'Transportation', 'Housing', 'Healthcare', 'Entertainment',
+              'Education', 'Clothing', 'Salary', 'Freelance', 'Other']
+MERCHANTS = ['Grocery store', 'Coffee shop', 'Fuel', 'Pharmacy', 'Restaurant', 'Online order',
+             'Electricity bill', 'Cinema', 'Bookshop', 'Taxi', 'Salary', 'Gym membership']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Bulk transaction import benchmark')
+    parser.add_argument('--rows', type=int, default=100000, help='Transactions per import file')
+    parser.add_argument('--formats', nargs='+', default=['csv', 'ofx', 'qif'], choices=['csv', 'ofx', 'qif'])
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per insert and commit')
+    parser.add_argument('--baseline-rows', type=int, default=2000,
+                        help='Rows inserted one at a time for comparison (0 to skip)')
+    parser.add_argument('--database-url', help='Scratch database (default: temporary SQLite file)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scratch_dir = tempfile.mkdtemp(prefix='finrelate-bench-')
+    if args.database_url:
+        os.environ['DEV_DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DEV_DATABASE_URL'] = f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}"
+
+    from app import create_app, db
+    from app.imports import import_transactions
+
+    app = create_app('development')
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = populate(db, args.formats + ['baseline'])
+
+        print(f"\n{'format':>8s} {'rows':>10s} {'file MB':>8s} {'seconds':>8s} {'rows/s':>9s}  consistent")
+        for file_format in args.formats:
+            path = os.path.join(scratch_dir, f'transactions.{file_format}')
+            WRITERS[file_format](path, generate_rows(args.rows))
+            started = time.perf_counter()
+            summary = import_transactions(users[file_format], path, chunk_size=args.chunk_size)
+            elapsed = time.perf_counter() - started
+            assert summary['imported'] == args.rows, summary
+            print(f"{file_format:>8s} {args.rows:>10,d} {os.path.getsize(path) / 1e6:8.1f} {elapsed:8.2f} "
+                  f"{args.rows / elapsed:9,.0f}  {consistent(db, users[file_format])}")
+
+        if args.baseline_rows:
+            started = time.perf_counter()
+            insert_one_by_one(db, users['baseline'], generate_rows(args.baseline_rows))
+            elapsed = time.perf_counter() - started
+            print(f"{'per row':>8s} {args.baseline_rows:>10,d} {'':>8s} {elapsed:8.2f} "
+                  f"{args.baseline_rows / elapsed:9,.0f}  {consistent(db, users['baseline'])}")
+
+    shutil.rmtree(scratch_dir)
+
+
+def populate(db, names):
+    """Categories, one user per name (returns name -> id) and a budget goal per user"""
+    from werkzeug.security import generate_password_hash
+    from app.models import User, Category, BudgetGoal
+
+    for name in CATEGORIES:
+        db.session.add(Category(name=name, color='#007bff'))
+    users = {}
+    for name in names:
+        user = User(username=f'bench-{name}', email=f'{name}@example.com', password_hash=generate_password_hash('bench'))
+        db.session.add(user)
+        db.session.flush()
+        users[name] = user.id
+        db.session.add(BudgetGoal(user_id=user.id, category_id=1, target_amount=5000.0, period='yearly',
+                                  start_date=datetime.utcnow() - timedelta(days=365), end_date=datetime.utcnow(),
+                                  current_spent=0.0))
+    db.session.commit()
+    return users
+
+
+def generate_rows(count):
+    """(date, signed amount, category, description) tuples, expenses negative"""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    for _ in range(count):
+        income = rng.random() < 0.2
+        amount = round(rng.uniform(1, 500), 2)
+        yield ((now - timedelta(days=rng.uniform(0, 730))).replace(hour=0, minute=0, second=0, microsecond=0),
+               amount if income else -amount,
+               rng.choice(CATEGORIES),
+               f"{rng.choice(MERCHANTS)} #{rng.randint(1, 9999)}")
+
+
+def write_csv(path, rows):
+    import csv
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Date', 'Amount', 'Category', 'Description'])
+        for date, amount, category, description in rows:
+            writer.writerow([date.strftime('%Y-%m-%d'), f'{amount:.2f}', category, description])
+
+
+def write_ofx(path, rows):
+    with open(path, 'w') as f:
+        f.write('OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n')
+        for number, (date, amount, category, description) in enumerate(rows):
+            f.write(f"<STMTTRN><TRNTYPE>{'CREDIT' if amount > 0 else 'DEBIT'}<DTPOSTED>{date:%Y%m%d}"
+                    f"<TRNAMT>{amount:.2f}<FITID>{number}<NAME>{description}</STMTTRN>\n")
+        f.write('</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n')
+
+
+def write_qif(path, rows):
+    with open(path, 'w') as f:
+        f.write('!Type:Bank\n')
+        for date, amount, category, description in rows:
+            f.write(f"D{date:%m/%d/%Y}\nT{amount:,.2f}\nP{description}\nL{category}\n^\n")
+
+
+WRITERS = {
+    'csv': write_csv,
+    'ofx': write_ofx,
+    'qif': write_qif,
+}
+
+
+def insert_one_by_one(db, user_id, rows):
+    """The add_transaction route's write path, once per row"""
+    from app.imports import category_map
+    from app.ledger import apply_transaction
+    from app.models import Transaction
+
+    categories = category_map()
+    for date, amount, category, description in rows:
+        transaction = Transaction(user_id=user_id, category_id=categories[category.lower()], amount=abs(amount),
+                                  transaction_type='income' if amount > 0 else 'expense', date=date,
+                                  description=description)
+        db.session.add(transaction)
+        apply_transaction(transaction)
+        db.session.commit()
+
+
+def consistent(db, user_id):
+    """True if the user's ledger, rollups and goal progress match a rebuild from the transactions"""
+    from app.ledger import reconcile
+    before = derived_state(db, user_id)
+    reconcile(user_id)
+    return before == derived_state(db, user_id)
+
+
+def derived_state(db, user_id):
+    from sqlalchemy import select
+    from app.ledger import get_user_totals
+    from app.models import BudgetGoal, MonthlyRollup
+
+    totals = {name: round(value, 4) for name, value in get_user_totals(user_id).items()}
+    rollups = sorted(
+        (category_id, month, transaction_type, round(total, 4), count)
+        for category_id, month, transaction_type, total, count in db.session.execute(
+            select(MonthlyRollup.category_id, MonthlyRollup.month, MonthlyRollup.transaction_type,
+                   MonthlyRollup.total, MonthlyRollup.count)
+            .where(MonthlyRollup.user_id == user_id, MonthlyRollup.count > 0))
+    )
+    goals = sorted((goal_id, round(spent or 0.0, 4)) for goal_id, spent in db.session.execute(
+        select(BudgetGoal.id, BudgetGoal.current_spent).where(BudgetGoal.user_id == user_id)))
+    return totals, rollups, goals
+
+
+if __name__ == '__main__':
+    main()
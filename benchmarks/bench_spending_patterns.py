@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the vectorized analyze_spending_patterns()
+
+Fills a scratch database with one synthetic user per requested size, then
+times the NumPy implementation against the previous per-category Python
+loop (reproduced below, reading rows in the same date order) and checks
+that both return the same patterns.
+
+    python benchmarks/bench_spending_patterns.py --rows 10000 100000 1000000
+"""
+
+import os
+import sys
+import math
+import random
+import shutil
+import tempfile
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Spending pattern analysis benchmark')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='Expense transactions per user (one synthetic user per size)')
+    parser.add_argument('--categories', type=int, default=10, help='Number of categories')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per implementation (best is reported)')
+    parser.add_argument('--database-url', help='Scratch database (default: temporary SQLite file)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scratch_dir = None
+    if args.database_url:
+        os.environ['DEV_DATABASE_URL'] = args.database_url
+    else:
+        scratch_dir = tempfile.mkdtemp(prefix='finrelate-bench-')
+        os.environ['DEV_DATABASE_URL'] = f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}"
+
+    from app import create_app, db
+    from app.models import analyze_spending_patterns
+
+    app = create_app('development')
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        populate(db, args.rows, args.categories)
+
+        print(f"\n{'rows':>10s} {'loop (s)':>10s} {'numpy (s)':>10s} {'speedup':>8s}  same result")
+        for user_id, rows in enumerate(args.rows, start=1):
+            legacy_seconds, legacy = best_of(args.repeat, legacy_analyze_spending_patterns, user_id)
+            numpy_seconds, vectorized = best_of(args.repeat, analyze_spending_patterns, user_id)
+            print(f"{rows:>10,d} {legacy_seconds:10.3f} {numpy_seconds:10.3f} "
+                  f"{legacy_seconds / numpy_seconds:7.1f}x  {same_patterns(legacy, vectorized)}")
+
+    if scratch_dir:
+        shutil.rmtree(scratch_dir)
+
+
+def best_of(repeat, function, user_id):
+    """Fastest of `repeat` runs and the last result"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(user_id)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def same_patterns(expected, actual):
+    if len(expected) != len(actual):
+        return False
+    for left, right in zip(expected, actual):
+        for key, value in left.items():
+            if isinstance(value, float):
+                if not math.isclose(value, right[key], rel_tol=1e-9):
+                    return False
+            elif value != right[key]:
+                return False
+    return True
+
+
+def legacy_analyze_spending_patterns(user_id):
+    """The previous implementation: one pass over all expenses per category"""
+    from app.models import Transaction, Category
+
+    transactions = Transaction.query.filter_by(user_id=user_id, transaction_type='expense')\
+                                    .order_by(Transaction.date, Transaction.id).all()
+    if not transactions:
+        return []
+
+    patterns = []
+    for category in Category.query.all():
+        cat_transactions = [t for t in transactions if t.category_id == category.id]
+        if len(cat_transactions) >= 3:
+            amounts = [t.amount for t in cat_transactions]
+            avg_amount = sum(amounts) / len(amounts)
+            recent_amounts = amounts[-3:]
+            older_amounts = amounts[:-3] if len(amounts) > 3 else amounts[:1]
+            recent_avg = sum(recent_amounts) / len(recent_amounts)
+            older_avg = sum(older_amounts) / len(older_amounts)
+            if recent_avg > older_avg * 1.1:
+                trend = 'increasing'
+            elif recent_avg < older_avg * 0.9:
+                trend = 'decreasing'
+            else:
+                trend = 'stable'
+            patterns.append({
+                'category_id': category.id,
+                'category_name': category.name,
+                'average_amount': avg_amount,
+                'predicted_next': recent_avg,
+                'trend': trend,
+                'confidence_score': min(0.9, len(cat_transactions) / 10)
+            })
+    return patterns
+
+
+def populate(db, sizes, categories):
+    """Insert one user per size with that many expense transactions"""
+    from sqlalchemy import insert
+    from app.models import User, Category, Transaction
+
+    print(f"Generating {sum(sizes):,} transactions for {len(sizes)} users...")
+    for index in range(categories):
+        db.session.add(Category(name=f'Category {index}', color='#007bff'))
+    for index in range(len(sizes)):
+        db.session.add(User(username=f'bench_{index}', email=f'bench_{index}@example.com', password_hash='x'))
+    db.session.commit()
+
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    batch = []
+    for user_id, rows in enumerate(sizes, start=1):
+        for _ in range(rows):
+            batch.append({
+                'user_id': user_id,
+                'category_id': rng.randint(1, categories),
+                'amount': round(rng.uniform(1, 500), 2),
+                'transaction_type': 'expense',
+                'date': now - timedelta(days=rng.uniform(0, 1825)),
+                'description': 'benchmark',
+            })
+            if len(batch) >= 10000:
+                db.session.execute(insert(Transaction), batch)
+                batch = []
+    if batch:
+        db.session.execute(insert(Transaction), batch)
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the composite Transaction indexes
+
+Fills a scratch database with synthetic transactions, then prints the query
+plan and average latency of the per-user query shapes used by the routes,
+first without the composite indexes and then with them.
+
+    python benchmarks/bench_transaction_indexes.py --users 200 --per-user 1000
+    python benchmarks/bench_transaction_indexes.py --database-url postgresql://...
+"""
+
+import os
+import sys
+import random
+import tempfile
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Transaction index benchmark')
+    parser.add_argument('--users', type=int, default=200, help='Number of synthetic users')
+    parser.add_argument('--per-user', type=int, default=1000, help='Transactions per user')
+    parser.add_argument('--repeat', type=int, default=50, help='Executions per query')
+    parser.add_argument('--database-url', help='Scratch database (default: temporary SQLite file)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scratch_dir = None
+    if args.database_url:
+        os.environ['DEV_DATABASE_URL'] = args.database_url
+    else:
+        scratch_dir = tempfile.mkdtemp(prefix='finrelate-bench-')
+        os.environ['DEV_DATABASE_URL'] = f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}"
+
+    from sqlalchemy import select, func, text
+    from app import create_app, db
+    from app.models import User, Category, Transaction
+    from app.migrations import _create_transaction_indexes
+
+    app = create_app('development')
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        populate(db, User, Category, Transaction, args.users, args.per_user)
+
+        user_id = args.users // 2
+        now = datetime.utcnow()
+        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        queries = {
+            'recent (user, date desc)': select(Transaction).where(
+                Transaction.user_id == user_id).order_by(Transaction.date.desc()).limit(10),
+            'month to date (user, date)': select(Transaction.transaction_type, func.sum(Transaction.amount)).where(
+                Transaction.user_id == user_id,
+                Transaction.date >= month_start).group_by(Transaction.transaction_type),
+            'expenses last 30 days (user, type, date)': select(func.sum(Transaction.amount)).where(
+                Transaction.user_id == user_id,
+                Transaction.transaction_type == 'expense',
+                Transaction.date >= now - timedelta(days=30)),
+            'budget goal window (user, category, date)': select(func.sum(Transaction.amount)).where(
+                Transaction.user_id == user_id,
+                Transaction.category_id == 3,
+                Transaction.transaction_type == 'expense',
+                Transaction.date >= now - timedelta(days=30),
+                Transaction.date <= now),
+        }
+
+        explain = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+        results = {}
+        for label, create_indexes in (('without indexes', False), ('with indexes', True)):
+            with db.engine.begin() as connection:
+                if create_indexes:
+                    _create_transaction_indexes(connection)
+                else:
+                    for index in Transaction.__table__.indexes:
+                        index.drop(connection, checkfirst=True)
+                if db.engine.dialect.name == 'sqlite':
+                    connection.execute(text('ANALYZE'))
+
+            print(f"\n=== {label} ===")
+            with db.engine.connect() as connection:
+                for name, query in queries.items():
+                    sql = str(query.compile(connection, compile_kwargs={'literal_binds': True}))
+                    plan = connection.execute(text(explain + sql)).fetchall()
+                    started = time.perf_counter()
+                    for _ in range(args.repeat):
+                        connection.execute(query).fetchall()
+                    elapsed_ms = (time.perf_counter() - started) * 1000 / args.repeat
+                    results.setdefault(name, []).append(elapsed_ms)
+                    print(f"\n{name}: {elapsed_ms:.3f} ms")
+                    for row in plan:
+                        print(f"    {row[-1]}")
+
+        print("\n=== summary ===")
+        for name, (before, after) in results.items():
+            print(f"{name:45s} {before:9.3f} ms -> {after:9.3f} ms  ({before / max(after, 1e-6):.1f}x)")
+
+    if scratch_dir:
+        os.remove(os.path.join(scratch_dir, 'bench.db'))
+        os.rmdir(scratch_dir)
+
+
+def populate(db, User, Category, Transaction, users, per_user):
+    """Insert synthetic users, categories and transactions in bulk"""
+    from sqlalchemy import insert
+
+    print(f"Generating {users * per_user:,} transactions for {users} users...")
+    for index in range(10):
+        db.session.add(Category(name=f'Category {index}', color='#007bff'))
+    for index in range(users):
+        db.session.add(User(username=f'bench_{index}', email=f'bench_{index}@example.com', password_hash='x'))
+    db.session.commit()
+
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    batch = []
+    for user_id in range(1, users + 1):
+        for _ in range(per_user):
+            batch.append({
+                'user_id': user_id,
+                'category_id': rng.randint(1, 10),
+                'amount': round(rng.uniform(1, 500), 2),
+                'transaction_type': 'income' if rng.random() < 0.2 else 'expense',
+                'date': now - timedelta(days=rng.uniform(0, 1825)),
+                'description': 'benchmark',
+            })
+            if len(batch) >= 10000:
+                db.session.execute(insert(Transaction), batch)
+                batch = []
+    if batch:
+        db.session.execute(insert(Transaction), batch)
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
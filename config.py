@@ -1,6 +1,9 @@
 import os
 from datetime import timedelta
 
+# Flask's instance folder: app-owned storage for files that are not code
+INSTANCE_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance')
+
 class Config:
     """Basic application configuration"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
@@ -22,10 +25,59 @@ class Config:
     # CSRF configuration
     WTF_CSRF_ENABLED = True
     WTF_CSRF_TIME_LIMIT = None
+    
+    # Export jobs: files are rendered into EXPORT_DIR (private to the app's user).
+    # By default inside the request; with EXPORT_JOBS_INLINE=false they are left
+    # to `flask exports worker`, and EXPORT_DIR must be storage the worker and
+    # the web processes share
+    EXPORT_DIR = os.environ.get('EXPORT_DIR') or os.path.join(INSTANCE_DIR, 'exports')
+    EXPORT_LINK_MAX_AGE = int(os.environ.get('EXPORT_LINK_MAX_AGE', 24 * 3600))  # seconds
+    EXPORT_JOB_LEASE = int(os.environ.get('EXPORT_JOB_LEASE', 300))  # seconds without a heartbeat before a running job is retried
+    EXPORT_JOBS_INLINE = os.environ.get('EXPORT_JOBS_INLINE', 'true').lower() == 'true'
+    
+    # Import jobs: uploads are stored in IMPORT_DIR (private to the app's user)
+    # and imported inside the request, or with IMPORT_JOBS_INLINE=false by the
+    # same worker as exports (IMPORT_DIR must then be shared with it)
+    IMPORT_DIR = os.environ.get('IMPORT_DIR') or os.path.join(INSTANCE_DIR, 'imports')
+    IMPORT_MAX_SIZE = int(os.environ.get('IMPORT_MAX_SIZE', 50 * 1024 * 1024))  # bytes
+    IMPORT_JOB_LEASE = int(os.environ.get('IMPORT_JOB_LEASE', 300))  # seconds without a heartbeat before a running import counts as interrupted
+    IMPORT_JOBS_INLINE = os.environ.get('IMPORT_JOBS_INLINE', 'true').lower() == 'true'
+    
+    # Workers renew the lease of the export or import job they are running this often
+    JOB_HEARTBEAT_INTERVAL = int(os.environ.get('JOB_HEARTBEAT_INTERVAL', 30))  # seconds
+    
+    # Largest request body accepted at all: an import upload plus form overhead
+    MAX_CONTENT_LENGTH = IMPORT_MAX_SIZE + 1024 * 1024
+    
+    # Live updates (/api/stream): 'database' also relays other workers' writes,
+    # 'local' only reaches streams in the same process
+    EVENT_BACKEND = os.environ.get('EVENT_BACKEND', 'database')
+    EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', 2.0))  # seconds
+    SSE_HEARTBEAT = 15  # seconds between keepalive comments
+    SSE_MAX_DURATION = 600  # seconds before a stream is closed (the browser reconnects)
+    
+    # Response compression (app/compression.py)
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = 500  # bytes
+    COMPRESS_LEVEL = 6  # gzip, 1-9
+    COMPRESS_BR_QUALITY = 4  # brotli, 0-11; higher levels are too slow for dynamic responses
+    
+    # Templates (app/templating.py): compiled code shared by the workers on a host,
+    # precompiled at startup; renders slower than TEMPLATE_SLOW_MS are logged, and a
+    # per-template summary every TEMPLATE_STATS_INTERVAL seconds (0 turns it off).
+    # TEMPLATE_CACHE_DIR must be private to the app's user (default: Jinja's per-user directory)
+    TEMPLATE_CACHE = os.environ.get('TEMPLATE_CACHE', 'true').lower() == 'true'
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')
+    TEMPLATE_WARMUP = os.environ.get('TEMPLATE_WARMUP', 'true').lower() == 'true'
+    TEMPLATE_SLOW_MS = float(os.environ.get('TEMPLATE_SLOW_MS', 200))
+    TEMPLATE_SERVER_TIMING = os.environ.get('TEMPLATE_SERVER_TIMING', 'false').lower() == 'true'
+    TEMPLATE_STATS_INTERVAL = int(os.environ.get('TEMPLATE_STATS_INTERVAL', 300))
 
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL') or 'sqlite:///expense_tracker_dev.db'
+    EVENT_BACKEND = os.environ.get('EVENT_BACKEND', 'local')
+    TEMPLATE_SERVER_TIMING = os.environ.get('TEMPLATE_SERVER_TIMING', 'true').lower() == 'true'
 
 class ProductionConfig(Config):
     DEBUG = False
@@ -40,7 +92,10 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    # Flask-SQLAlchemy gives :memory: a single shared connection (StaticPool), which takes no pool options
+    SQLALCHEMY_ENGINE_OPTIONS = {}
     WTF_CSRF_ENABLED = False
+    TEMPLATE_WARMUP = False
 
 config = {
     'development': DevelopmentConfig,
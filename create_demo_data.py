@@ -25,6 +25,7 @@ from app.models import (
     User, Transaction, Category, BudgetGoal, Achievement, 
     UserAchievement, SmartRecommendation, ReceiptScan
 )
+from app.ledger import reconcile
 from werkzeug.security import generate_password_hash
 
 
@@ -296,6 +297,9 @@ def main():
         print("🎯 Creating budget goals...")
         goals = create_budget_goals(user, categories)
         
+        # Balances, monthly rollups and budget progress for the seeded data
+        reconcile(user.id)
+        
         # Create achievements
         print("🏆 Creating achievements...")
         achievements = create_achievements()
@@ -13,7 +13,8 @@ import random
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app, db
-from app.models import User, Category, Transaction, BudgetGoal, UserAchievement, Achievement
+from app.models import User, Category, Transaction, BudgetGoal, UserAchievement, Achievement, UserBalance, MonthlyRollup
+from app.ledger import reconcile
 
 def create_demo_user():
     """Create a demo user account"""
@@ -249,6 +250,8 @@ def generate_demo_data():
                 print("Demo user already exists. Removing old data...")
                 # Clean up old demo data
                 Transaction.query.filter_by(user_id=existing_user.id).delete()
+                UserBalance.query.filter_by(user_id=existing_user.id).delete()
+                MonthlyRollup.query.filter_by(user_id=existing_user.id).delete()
                 BudgetGoal.query.filter_by(user_id=existing_user.id).delete()
                 UserAchievement.query.filter_by(user_id=existing_user.id).delete()
                 db.session.delete(existing_user)
@@ -265,6 +268,7 @@ def generate_demo_data():
             
             print("Generating realistic transactions...")
             generate_realistic_transactions(demo_user, categories, 80)
+            reconcile(demo_user.id)
             
             print("Creating budget goals...")
             create_demo_budget_goals(demo_user, categories)
@@ -0,0 +1,22 @@
+"""
+Gunicorn settings, loaded automatically by `gunicorn run:app`
+
+Each open /api/stream connection (live updates) occupies the worker serving
+it for as long as the page is open, which would exhaust sync workers after
+a handful of tabs. gthread serves every connection on its own thread;
+gevent (pip install gevent, GUNICORN_WORKER_CLASS=gevent) serves thousands
+of idle streams per worker on greenlets.
+
+Worker count follows gunicorn's WEB_CONCURRENCY variable, and the bind
+address its PORT variable.
+"""
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+# gthread: concurrent requests, including open streams, per worker
+threads = int(os.environ.get('GUNICORN_THREADS', 50))
+
+# gevent: concurrent connections per worker
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
@@ -6,6 +6,7 @@ This script sets up the database and creates demo data in production
 
 import os
 from app import create_app, db
+from app.ledger import reconcile
 from app.models import User, Category, Transaction, BudgetGoal, Achievement, SmartRecommendation, UserAchievement
 from werkzeug.security import generate_password_hash
 from datetime import datetime, timedelta
@@ -216,6 +217,9 @@ def init_production_db():
         
         db.session.commit()
         
+        # Balances, monthly rollups and budget progress for the seeded data
+        reconcile(demo_user.id)
+        
         print("✅ Production database initialized successfully!")
         print(f"📈 Created:")
         print(f"   - Demo user: demo_user (password: demo123)")
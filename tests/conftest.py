@@ -0,0 +1,88 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db as _db
+from app.ledger import get_user_totals
+from app.models import BudgetGoal, Category, MonthlyRollup, User, create_default_categories
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App on a fresh in-memory database, with an app context pushed"""
+    app = create_app('testing')
+    app.config.update(EXPORT_DIR=str(tmp_path / 'exports'), IMPORT_DIR=str(tmp_path / 'imports'))
+    with app.app_context():
+        create_default_categories()
+        yield app
+        _db.session.remove()
+
+
+@pytest.fixture
+def db(app):
+    return _db
+
+
+@pytest.fixture
+def categories(app):
+    """Category name -> id for the default categories"""
+    return {category.name: category.id for category in Category.query.all()}
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(username='alice'):
+        user = User(username=username, email=f'{username}@example.com')
+        user.set_password('secret')
+        _db.session.add(user)
+        _db.session.commit()
+        return user.id
+    return make_user
+
+
+@pytest.fixture
+def user_id(make_user):
+    return make_user()
+
+
+@pytest.fixture
+def client(app, user_id):
+    """Test client logged in as `user_id`"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def derived_state(user_id):
+    """Everything the write path maintains for a user: ledger totals, rollups and goal progress"""
+    totals = {name: round(value, 6) for name, value in get_user_totals(user_id).items()}
+    rollups = sorted(
+        (category_id, month, transaction_type, round(total, 6), count)
+        for category_id, month, transaction_type, total, count in _db.session.execute(
+            select(MonthlyRollup.category_id, MonthlyRollup.month, MonthlyRollup.transaction_type,
+                   MonthlyRollup.total, MonthlyRollup.count)
+            .where(MonthlyRollup.user_id == user_id))
+    )
+    goals = sorted((goal_id, round(spent or 0.0, 6)) for goal_id, spent in _db.session.execute(
+        select(BudgetGoal.id, BudgetGoal.current_spent).where(BudgetGoal.user_id == user_id)))
+    return totals, rollups, goals
+
+
+def add_goal(user_id, category_id, start_date, end_date=None, target_amount=1000.0):
+    goal = BudgetGoal(user_id=user_id, category_id=category_id, target_amount=target_amount, period='monthly',
+                      start_date=start_date, end_date=end_date, current_spent=0.0, is_active=True)
+    _db.session.add(goal)
+    _db.session.commit()
+    return goal.id
+
+
+def utc_day(days=0):
+    """Midnight UTC today, shifted by `days`"""
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=days)
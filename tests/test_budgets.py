@@ -0,0 +1,78 @@
+import pytest
+
+from app.budgets import in_goal_window, rebuild_goal_spending
+from app.ledger import apply_transactions
+from app.models import BudgetGoal, Transaction, UserNotification
+from conftest import add_goal, derived_state, utc_day
+from test_ledger import delete, insert
+
+
+def spent(db, goal_id):
+    db.session.expire_all()
+    return db.session.get(BudgetGoal, goal_id).current_spent
+
+
+def test_goal_window():
+    start, end = utc_day(-10), utc_day(-1)
+    assert in_goal_window(start, end, utc_day(-5))
+    assert in_goal_window(start, end, start) and in_goal_window(start, end, end)
+    assert not in_goal_window(start, end, utc_day(-11))
+    assert not in_goal_window(start, end, utc_day(0))
+    assert in_goal_window(start, None, utc_day(30))
+    assert not in_goal_window(None, None, utc_day(0))
+
+
+def test_goal_counts_only_expenses_in_its_window(db, user_id, categories):
+    goal_id = add_goal(user_id, categories['Food'], utc_day(-10), utc_day(-1))
+    insert(db, user_id, categories['Food'], 10.0, 'expense', utc_day(-5))
+    insert(db, user_id, categories['Food'], 20.0, 'expense', utc_day(-20))
+    insert(db, user_id, categories['Food'], 40.0, 'income', utc_day(-5))
+    insert(db, user_id, categories['Housing'], 80.0, 'expense', utc_day(-5))
+
+    assert spent(db, goal_id) == 10.0
+
+
+def test_open_ended_goal_counts_future_expenses_in_rebuild_too(db, user_id, categories):
+    goal_id = add_goal(user_id, categories['Food'], utc_day(-5))
+    insert(db, user_id, categories['Food'], 10.0, 'expense', utc_day(-1))
+    insert(db, user_id, categories['Food'], 25.0, 'expense', utc_day(30))
+    assert spent(db, goal_id) == 35.0
+
+    rebuild_goal_spending(db.session, user_id)
+    assert spent(db, goal_id) == 35.0
+
+
+def test_bulk_rows_match_rebuild(db, user_id, categories):
+    goal_id = add_goal(user_id, categories['Food'], utc_day(-30), utc_day(-1))
+    rows = [{'user_id': user_id, 'category_id': categories['Food'], 'amount': amount, 'transaction_type': 'expense',
+             'date': utc_day(offset), 'description': None}
+            for amount, offset in ((5.0, -40), (7.5, -20), (12.5, -1), (100.0, 3))]
+    db.session.execute(Transaction.__table__.insert(), rows)
+    apply_transactions(user_id, rows)
+    db.session.commit()
+
+    assert spent(db, goal_id) == 20.0
+    incremental = derived_state(user_id)
+    rebuild_goal_spending(db.session, user_id)
+    assert derived_state(user_id) == incremental
+
+
+@pytest.mark.parametrize('update_returning', [True, False])
+def test_alerts_raised_once_per_threshold(db, user_id, categories, monkeypatch, update_returning):
+    # Without RETURNING the goals are read back after the UPDATE
+    monkeypatch.setattr(db.engine.dialect, 'update_returning', update_returning)
+    add_goal(user_id, categories['Food'], utc_day(-30), target_amount=100.0)
+    insert(db, user_id, categories['Food'], 50.0, 'expense', utc_day(-1))
+    assert UserNotification.query.filter_by(user_id=user_id).count() == 0
+
+    insert(db, user_id, categories['Food'], 35.0, 'expense', utc_day(-1))  # 85%
+    insert(db, user_id, categories['Food'], 5.0, 'expense', utc_day(-1))  # 90%, no new alert
+    last = insert(db, user_id, categories['Food'], 20.0, 'expense', utc_day(-1))  # 110%
+
+    alerts = UserNotification.query.filter_by(user_id=user_id).order_by(UserNotification.id).all()
+    assert [alert.priority for alert in alerts] == ['high', 'urgent']
+    assert alerts[1].title == 'Budget exceeded: Food' and '$110.00 of your $100.00' in alerts[1].message
+
+    # Removing an expense never raises an alert
+    delete(db, last)
+    assert UserNotification.query.filter_by(user_id=user_id).count() == 2
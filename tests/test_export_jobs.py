@@ -0,0 +1,42 @@
+import os
+from datetime import datetime, timedelta
+
+from app.export_jobs import claim_next_job, requeue_stale_jobs, run_job
+from app.models import ExportJob
+from conftest import utc_day
+from test_ledger import insert
+
+
+def queue(db, user_id, export_format='csv', **fields):
+    job = ExportJob(user_id=user_id, export_format=export_format, **fields)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_job_renders_private_file(app, db, user_id, categories):
+    insert(db, user_id, categories['Food'], 12.5, 'expense', utc_day(-1))
+    queue(db, user_id)
+
+    job = claim_next_job('test:1')
+    assert job.status == 'running' and job.heartbeat_at is not None
+    run_job(job)
+
+    assert job.status == 'done', job.error
+    assert os.stat(job.file_path).st_mode & 0o777 == 0o600
+    assert os.stat(app.config['EXPORT_DIR']).st_mode & 0o777 == 0o700
+
+
+def test_only_jobs_with_an_expired_lease_are_requeued(app, db, user_id):
+    now = datetime.utcnow()
+    long_ago = now - timedelta(hours=5)
+    lease = timedelta(seconds=app.config['EXPORT_JOB_LEASE'])
+    alive = queue(db, user_id, status='running', worker='a', started_at=long_ago, heartbeat_at=now)
+    dead = queue(db, user_id, status='running', worker='b', started_at=long_ago, heartbeat_at=now - 2 * lease)
+    never_beat = queue(db, user_id, status='running', worker='c', started_at=long_ago)
+
+    assert requeue_stale_jobs() == 2
+    db.session.expire_all()
+    assert db.session.get(ExportJob, alive).status == 'running'
+    assert db.session.get(ExportJob, dead).status == 'pending'
+    assert db.session.get(ExportJob, never_beat).status == 'pending'
@@ -0,0 +1,187 @@
+import io
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from app.export_jobs import claim_next_job
+from app.imports import (_parse_amount, _parse_date, enqueue_import, fail_stale_imports, import_transactions,
+                         parse_csv, parse_ofx, parse_qif, run_import_job, validate_chunk)
+from app.ledger import reconcile
+from app.models import ImportJob, Transaction
+from conftest import derived_state
+
+
+@pytest.mark.parametrize('text, amount', [
+    ('12.50', 12.5),
+    ('-12.50', -12.5),
+    ('(12.50)', -12.5),
+    ('$1,250.00', 1250.0),
+    ('-1,250.00', -1250.0),
+    ('12,50', 12.5),
+    ('€ 3', 3.0),
+    (' 7 ', 7.0),
+])
+def test_parse_amount(text, amount):
+    assert _parse_amount(text) == amount
+
+
+@pytest.mark.parametrize('text', [None, '', 'abc', '12.5.0', 'nan', 'inf', '-Infinity', '$', '()', '1e400'])
+def test_parse_amount_rejects_malformed(text):
+    with pytest.raises(ValueError, match='Invalid amount'):
+        _parse_amount(text)
+
+
+@pytest.mark.parametrize('text, date', [
+    ('2024-03-05', datetime(2024, 3, 5)),
+    ('2024-03-05 14:30', datetime(2024, 3, 5, 14, 30)),
+    ('20240305', datetime(2024, 3, 5)),
+    ('20240305143000', datetime(2024, 3, 5, 14, 30)),
+    ('03/05/2024', datetime(2024, 3, 5)),
+    ('03/05/24', datetime(2024, 3, 5)),
+    ('05.03.2024', datetime(2024, 3, 5)),
+    (' 2024-03-05 ', datetime(2024, 3, 5)),
+])
+def test_parse_date(text, date):
+    assert _parse_date(text) == date
+
+
+@pytest.mark.parametrize('text', [None, '', 'yesterday', '2024-13-01', '2023-02-29', '31/12/2024', '2024/03/05'])
+def test_parse_date_rejects_malformed(text):
+    with pytest.raises(ValueError, match='Invalid date'):
+        _parse_date(text)
+
+
+def test_csv_needs_date_and_amount_columns():
+    with pytest.raises(ValueError, match='Date and Amount'):
+        list(parse_csv(io.StringIO('When,Value\n2024-01-01,5\n')))
+
+
+def test_csv_rows_and_line_numbers():
+    stream = io.StringIO('Date,Amount,Category,Memo\n2024-01-02,-5.00,Food,Lunch\n\n2024-01-03,10\n')
+    assert list(parse_csv(stream)) == [
+        (2, {'date': '2024-01-02', 'amount': '-5.00', 'category': 'Food', 'description': 'Lunch'}),
+        (4, {'date': '2024-01-03', 'amount': '10', 'category': None, 'description': None}),
+    ]
+
+
+def test_validate_chunk_skips_malformed_rows(user_id, categories):
+    records = [
+        (2, {'date': '2024-01-02', 'amount': '-5.00', 'category': 'Food'}),
+        (3, {'date': '2024-02-30', 'amount': '-5.00'}),
+        (4, {'date': '2024-01-02', 'amount': 'twelve'}),
+        (5, {'date': '2024-01-02', 'amount': '0.001'}),
+        (6, {'date': '2024-01-02', 'amount': '5', 'type': 'transfer'}),
+        (7, {'date': '2024-01-02', 'amount': '5', 'type': 'Credit', 'category': 'Unknown'}),
+    ]
+    summary = {'skipped': 0, 'errors': []}
+    rows = validate_chunk(user_id, records, {'food': categories['Food']}, None, summary)
+
+    assert [(row['category_id'], row['amount'], row['transaction_type']) for row in rows] == \
+        [(categories['Food'], 5.0, 'expense')]
+    assert summary['skipped'] == 5
+    assert [error['row'] for error in summary['errors']] == [3, 4, 5, 6, 7]
+    assert "Unknown category 'Unknown'" in summary['errors'][-1]['error']
+
+
+def test_ofx_sgml_and_xml():
+    sgml = ('OFXHEADER:100\n<OFX><BANKTRANLIST>\n'
+            '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240105120000[0:GMT]<TRNAMT>-12.34<NAME>Shop &amp; Co<MEMO>Card\n'
+            '</STMTTRN>\n<STMTTRN><DTPOSTED>20240106<TRNAMT>100<NAME>Pay</STMTTRN></BANKTRANLIST></OFX>')
+    xml = ('<OFX><STMTTRN><DTPOSTED>20240105</DTPOSTED><TRNAMT>-12.34</TRNAMT>'
+           '<NAME>Shop &amp; Co</NAME><MEMO>Card</MEMO></STMTTRN></OFX>')
+
+    assert list(parse_ofx(io.StringIO(sgml))) == [
+        (1, {'date': '20240105', 'amount': '-12.34', 'description': 'Shop & Co - Card'}),
+        (2, {'date': '20240106', 'amount': '100', 'description': 'Pay'}),
+    ]
+    assert list(parse_ofx(io.StringIO(xml)))[0][1]['description'] == 'Shop & Co - Card'
+
+
+def test_qif_reads_only_bank_sections():
+    stream = io.StringIO("!Type:Bank\nD1/ 5'24\nT-1,234.50\nPRent\nLHousing:Rent\n^\n"
+                         "D1/6/2024\nT20\nL[Savings]\n^\n"
+                         "!Type:Invst\nD1/7/2024\nT99\n^\n")
+    assert list(parse_qif(stream)) == [
+        (2, {'date': '1/5/24', 'amount': '-1,234.50', 'category': 'Housing:Rent', 'description': 'Rent'}),
+        (7, {'date': '1/6/2024', 'amount': '20', 'category': None, 'description': None}),
+    ]
+
+
+def test_import_updates_derived_state_like_reconcile(db, user_id, categories, tmp_path):
+    path = tmp_path / 'statement.csv'
+    lines = ['Date,Amount,Category,Description']
+    for number in range(40):
+        lines.append(f'2024-{number % 12 + 1:02d}-{number % 28 + 1:02d},{-(number + 1) * 1.25:.2f},'
+                     f'{("Food", "Housing", "Nope", "")[number % 4]},row {number}')
+    lines += ['not-a-date,-5,Food,bad', '2024-01-01,abc,Food,bad', '2024-01-01,0,Food,bad']
+    path.write_text('\n'.join(lines) + '\n')
+
+    summary = import_transactions(user_id, str(path), chunk_size=7)
+
+    assert summary['imported'] == 40 and summary['skipped'] == 3
+    assert [error['row'] for error in summary['errors']] == [42, 43, 44]
+    assert Transaction.query.filter_by(user_id=user_id, category_id=categories['Other']).count() == 20
+    incremental = derived_state(user_id)
+    reconcile(user_id)
+    assert derived_state(user_id) == incremental
+
+
+def test_enqueue_rejects_oversized_upload(app, user_id):
+    app.config['IMPORT_MAX_SIZE'] = 1024
+    upload = FileStorage(io.BytesIO(b'Date,Amount\n' + b'2024-01-01,1\n' * 200), filename='big.csv')
+
+    with pytest.raises(ValueError, match='can be imported'):
+        enqueue_import(user_id, upload)
+    assert os.listdir(app.config['IMPORT_DIR']) == []
+    assert ImportJob.query.count() == 0
+
+
+def test_enqueue_stores_upload_privately(app, user_id):
+    upload = FileStorage(io.BytesIO(b'Date,Amount\n2024-01-01,1\n'), filename='small.csv')
+
+    job = enqueue_import(user_id, upload)
+    assert job.file_format == 'csv' and job.bytes_total == 25
+    assert os.stat(job.file_path).st_mode & 0o777 == 0o600
+    assert os.stat(app.config['IMPORT_DIR']).st_mode & 0o777 == 0o700
+
+
+def test_only_imports_with_an_expired_lease_are_failed(app, db, user_id, tmp_path):
+    now = datetime.utcnow()
+    long_ago = now - timedelta(hours=5)
+    lease = timedelta(seconds=app.config['IMPORT_JOB_LEASE'])
+    jobs = {}
+    for name, heartbeat_at in (('alive', now), ('dead', now - 2 * lease), ('never_beat', None)):
+        path = tmp_path / f'{name}.csv'
+        path.write_text('Date,Amount\n')
+        job = ImportJob(user_id=user_id, file_format='csv', file_path=str(path), status='running',
+                        worker=name, started_at=long_ago, heartbeat_at=heartbeat_at)
+        db.session.add(job)
+        db.session.commit()
+        jobs[name] = job.id
+
+    assert fail_stale_imports() == 2
+    db.session.expire_all()
+    assert {name: db.session.get(ImportJob, job_id).status for name, job_id in jobs.items()} == \
+        {'alive': 'running', 'dead': 'failed', 'never_beat': 'failed'}
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith('.csv')) == ['alive.csv']
+
+
+def test_import_job_renews_its_lease(app, db, user_id, monkeypatch):
+    app.config['JOB_HEARTBEAT_INTERVAL'] = 0.05
+    upload = FileStorage(io.BytesIO(b'Date,Amount\n2024-01-01,1\n'), filename='small.csv')
+    enqueue_import(user_id, upload)
+    job = claim_next_job('test:1', ImportJob)
+    claimed_at = job.heartbeat_at
+
+    def slow_import(*args, **kwargs):
+        time.sleep(0.3)
+        return {'imported': 0, 'skipped': 0, 'errors': [], 'bytes_done': 0}
+    monkeypatch.setattr('app.imports.import_transactions', slow_import)
+    run_import_job(job)
+
+    assert job.status == 'done'
+    db.session.expire_all()
+    assert db.session.get(ImportJob, job.id).heartbeat_at > claimed_at
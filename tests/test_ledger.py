@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+from app.ledger import apply_transaction, get_user_totals, reconcile
+from app.models import Transaction
+from conftest import add_goal, derived_state, utc_day
+
+
+def insert(db, user_id, category_id, amount, transaction_type, date):
+    transaction = Transaction(user_id=user_id, category_id=category_id, amount=amount,
+                              transaction_type=transaction_type, date=date, description='test')
+    db.session.add(transaction)
+    apply_transaction(transaction)
+    db.session.commit()
+    return transaction.id
+
+
+def edit(db, transaction_id, **changes):
+    """Change a transaction the way a write path must: remove it, update it, add it back"""
+    transaction = db.session.get(Transaction, transaction_id)
+    apply_transaction(transaction, sign=-1)
+    for name, value in changes.items():
+        setattr(transaction, name, value)
+    apply_transaction(transaction)
+    db.session.commit()
+
+
+def delete(db, transaction_id):
+    transaction = db.session.get(Transaction, transaction_id)
+    db.session.delete(transaction)
+    apply_transaction(transaction, sign=-1)
+    db.session.commit()
+
+
+def random_fields(rng, categories):
+    return {
+        'category_id': rng.choice(categories),
+        'amount': round(rng.uniform(0.01, 900), 2),
+        'transaction_type': rng.choice(('income', 'expense', 'expense')),
+        # Past and future dates, across month boundaries and goal windows
+        'date': utc_day(rng.randint(-400, 60)).replace(hour=rng.randint(0, 23)),
+    }
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_writes_match_reconcile(db, make_user, categories, seed):
+    rng = random.Random(seed)
+    user_ids = [make_user('alice'), make_user('bob')]
+    category_ids = [categories['Food'], categories['Housing'], categories['Salary']]
+    for user_id in user_ids:
+        add_goal(user_id, categories['Food'], utc_day(-90), utc_day(-30), target_amount=500)
+        add_goal(user_id, categories['Food'], utc_day(-20))  # open-ended
+        add_goal(user_id, categories['Housing'], utc_day(-365), target_amount=50)
+
+    live = {user_id: [] for user_id in user_ids}
+    for step in range(150):
+        user_id = rng.choice(user_ids)
+        ids = live[user_id]
+        action = rng.random()
+        if not ids or action < 0.5:
+            ids.append(insert(db, user_id, **random_fields(rng, category_ids)))
+        elif action < 0.75:
+            fields = random_fields(rng, category_ids)
+            edit(db, rng.choice(ids), **rng.choice([fields, {'amount': fields['amount']}, {'date': fields['date']}]))
+        else:
+            delete(db, ids.pop(rng.randrange(len(ids))))
+
+        if step % 50 == 49:
+            for checked in user_ids:
+                incremental = derived_state(checked)
+                reconcile(checked)
+                assert derived_state(checked) == incremental
+
+
+def test_deleting_everything_leaves_no_state(db, user_id, categories):
+    ids = [insert(db, user_id, categories['Food'], 10.0, 'expense', utc_day(-offset)) for offset in (1, 40, 80)]
+    for transaction_id in ids:
+        delete(db, transaction_id)
+
+    totals, rollups, goals = derived_state(user_id)
+    assert totals == {'income': 0.0, 'expense': 0.0, 'balance': 0.0, 'count': 0}
+    assert rollups == []
+
+
+def test_totals_for_user_without_transactions(user_id):
+    assert get_user_totals(user_id) == {'income': 0.0, 'expense': 0.0, 'balance': 0.0, 'count': 0}
+
+
+def test_totals_follow_writes(db, user_id, categories):
+    insert(db, user_id, categories['Salary'], 1000.0, 'income', utc_day(-3))
+    expense_id = insert(db, user_id, categories['Food'], 250.0, 'expense', utc_day(-2))
+    edit(db, expense_id, amount=300.0)
+
+    assert get_user_totals(user_id) == {'income': 1000.0, 'expense': 300.0, 'balance': 700.0, 'count': 2}
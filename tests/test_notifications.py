@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import ArchivedNotification, UserNotification
+from app.notifications import archive_read_notifications, mark_read, notifications_page, unread_count
+from app.versions import get_data_version, get_notification_version
+
+
+def add_notifications(db, user_id, count, created_at=None):
+    created_at = created_at or datetime.utcnow()
+    notifications = [UserNotification(user_id=user_id, notification_type='info', title=f'#{number}', message='',
+                                      priority='normal', is_read=False,
+                                      created_at=created_at - timedelta(minutes=number // 3))
+                     for number in range(count)]
+    db.session.add_all(notifications)
+    db.session.commit()
+    return [notification.id for notification in notifications]
+
+
+@pytest.mark.parametrize('limit', [1, 3, 7, 12, 13])
+def test_pages_cover_every_notification_once(db, user_id, limit):
+    ids = add_notifications(db, user_id, 12)
+    expected = [notification.id for notification in UserNotification.query.filter_by(user_id=user_id)
+                .order_by(UserNotification.created_at.desc(), UserNotification.id.desc())]
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = notifications_page(user_id, cursor=cursor, limit=limit)
+        seen.extend(notification.id for notification in page)
+        if cursor is None:
+            break
+    assert seen == expected and sorted(seen) == sorted(ids)
+
+
+def test_mark_read_only_touches_given_unread_notifications(db, user_id, make_user):
+    ids = add_notifications(db, user_id, 5)
+    other = make_user('bob')
+    add_notifications(db, other, 2)
+
+    assert mark_read(user_id, ids[:3]) == 3
+    db.session.commit()
+    assert unread_count(user_id) == 2
+    assert mark_read(user_id, ids[:3]) == 0  # already read
+    assert mark_read(user_id, []) == 0
+    assert mark_read(other, ids[3:]) == 0  # not theirs
+    db.session.commit()
+    assert unread_count(user_id) == 2 and unread_count(other) == 2
+
+
+def test_mark_all_read(db, user_id):
+    add_notifications(db, user_id, 4)
+    assert mark_read(user_id) == 4
+    db.session.commit()
+    assert unread_count(user_id) == 0
+    assert all(notification.read_at for notification in UserNotification.query.filter_by(user_id=user_id))
+
+
+def test_mark_read_bumps_notification_version_only_on_change(db, user_id):
+    ids = add_notifications(db, user_id, 2)
+    data_version, version = get_data_version(user_id), get_notification_version(user_id)
+
+    mark_read(user_id, ids)
+    db.session.commit()
+    assert get_notification_version(user_id) == version + 1
+
+    mark_read(user_id, ids)
+    db.session.commit()
+    assert get_notification_version(user_id) == version + 1
+    # Read state is not part of any cached figure
+    assert get_data_version(user_id) == data_version
+
+
+def test_archive_moves_old_read_notifications(db, user_id, make_user):
+    ids = add_notifications(db, user_id, 5)
+    other = make_user('bob')
+    add_notifications(db, other, 1)
+    mark_read(user_id, ids[:4])
+    db.session.commit()
+    UserNotification.query.filter(UserNotification.id.in_(ids[:3]))\
+        .update({'read_at': datetime.utcnow() - timedelta(days=120)})
+    db.session.commit()
+    data_version = get_data_version(user_id)
+    versions = get_notification_version(user_id), get_notification_version(other)
+
+    assert archive_read_notifications(days=90, batch_size=2) == 3
+    assert sorted(row.id for row in ArchivedNotification.query) == sorted(ids[:3])
+    assert UserNotification.query.filter_by(user_id=user_id).count() == 2
+    assert get_notification_version(user_id) > versions[0] and get_notification_version(other) == versions[1]
+    assert get_data_version(user_id) == data_version
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import pytest
+
+from app.reports import MAX_PERIOD_COUNT, period_totals
+from test_ledger import insert
+
+
+@pytest.mark.parametrize('count, expected', [(-5, 1), (1, 1), (3, 3), (10 ** 6, MAX_PERIOD_COUNT)])
+def test_period_count_is_clamped(user_id, count, expected):
+    assert len(period_totals(user_id, 'month', count)) == expected
+
+
+def test_reports_page_accepts_a_negative_count(client):
+    assert client.get('/reports?period=month&count=-5').status_code == 200
+
+
+def test_periods_bucket_by_calendar(db, user_id, categories):
+    now = datetime(2024, 3, 15)
+    insert(db, user_id, categories['Salary'], 100.0, 'income', datetime(2024, 1, 31, 23))
+    insert(db, user_id, categories['Food'], 40.0, 'expense', datetime(2024, 2, 1))
+    insert(db, user_id, categories['Food'], 5.0, 'expense', datetime(2024, 3, 14))
+
+    periods = period_totals(user_id, 'month', 3, now=now)
+    assert [(p['start'].month, p['income'], p['expense']) for p in periods] == [(1, 100.0, 0), (2, 0, 40.0), (3, 0, 5.0)]
+    assert sum(p['income'] for p in period_totals(user_id, 'quarter', 1, now=now)) == 100.0
@@ -0,0 +1,52 @@
+from app.models import Category, MonthlyRollup
+from app.periods import month_start
+from app.rollups import category_totals, delete_empty_rollups, monthly_totals
+from conftest import utc_day
+from test_ledger import delete, insert
+
+
+def test_rollups_sum_per_category_month_and_type(db, user_id, categories):
+    day = utc_day(-1)
+    insert(db, user_id, categories['Food'], 10.0, 'expense', day)
+    insert(db, user_id, categories['Food'], 15.5, 'expense', day)
+    insert(db, user_id, categories['Housing'], 700.0, 'expense', day)
+    insert(db, user_id, categories['Salary'], 2000.0, 'income', day)
+
+    totals = {row['name']: (row['total'], row['count']) for row in category_totals(user_id)}
+    assert totals == {'Housing': (700.0, 1), 'Food': (25.5, 2)}
+    assert monthly_totals(user_id)[month_start(day)] == {'income': 2000.0, 'expense': 725.5}
+
+
+def test_removing_last_transaction_deletes_rollup(db, user_id, categories):
+    first = insert(db, user_id, categories['Food'], 10.0, 'expense', utc_day(-1))
+    second = insert(db, user_id, categories['Food'], 20.0, 'expense', utc_day(-1))
+
+    delete(db, first)
+    assert [(row.total, row.count) for row in MonthlyRollup.query.filter_by(user_id=user_id)] == [(20.0, 1)]
+    delete(db, second)
+    assert MonthlyRollup.query.filter_by(user_id=user_id).count() == 0
+
+
+def test_delete_empty_rollups(db, user_id, categories):
+    db.session.add(MonthlyRollup(user_id=user_id, category_id=categories['Food'], month=month_start(utc_day(-400)),
+                                 transaction_type='expense', total=0.0, count=0))
+    insert(db, user_id, categories['Food'], 5.0, 'expense', utc_day(-1))
+
+    delete_empty_rollups(db.session)
+    assert [row.count for row in MonthlyRollup.query.filter_by(user_id=user_id)] == [1]
+
+
+def test_delete_category_after_its_transactions(db, client, user_id):
+    category = Category(name='Travel', color='#000000')
+    db.session.add(category)
+    db.session.commit()
+    transaction_id = insert(db, user_id, category.id, 300.0, 'expense', utc_day(-1))
+
+    client.get(f'/categories/delete/{category.id}')
+    assert db.session.get(Category, category.id) is not None  # still has a transaction
+
+    delete(db, transaction_id)
+    client.get(f'/categories/delete/{category.id}')
+    db.session.expire_all()
+    assert db.session.get(Category, category.id) is None
+    assert MonthlyRollup.query.filter_by(category_id=category.id).count() == 0
@@ -0,0 +1,20 @@
+import logging
+
+from app.templating import template_stats
+
+
+def test_renders_are_aggregated_per_template(app, client):
+    for _ in range(2):
+        assert client.get('/reports').status_code == 200
+
+    count, total, slowest = template_stats(app)['reports.html']
+    assert count == 2 and 0 < slowest <= total
+
+
+def test_summary_is_logged_and_counters_restart(app, client, caplog):
+    app.extensions['template_stats'].interval = 1e-9
+    with caplog.at_level(logging.INFO, logger=app.logger.name):
+        client.get('/reports')
+
+    assert any('reports.html 1x avg' in record.getMessage() for record in caplog.records)
+    assert template_stats(app) == {}
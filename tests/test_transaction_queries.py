@@ -0,0 +1,58 @@
+import pytest
+
+from app.models import Transaction
+from app.transaction_queries import decode_cursor, encode_cursor, filtered_totals, parse_filters, transactions_page
+from conftest import utc_day
+
+
+@pytest.fixture
+def transaction_ids(db, user_id, make_user, categories):
+    """25 transactions of the user, several sharing a date, newest first; plus another user's"""
+    other = make_user('bob')
+    rows = []
+    for number in range(25):
+        date = utc_day(-(number // 4))  # four per day: ties broken by id
+        rows.append(Transaction(user_id=user_id, category_id=categories['Food'], amount=number + 1.0,
+                                transaction_type='expense', date=date, description=f'#{number}'))
+        db.session.add(Transaction(user_id=other, category_id=categories['Food'], amount=1.0,
+                                   transaction_type='expense', date=date))
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in sorted(rows, key=lambda row: (row.date, row.id), reverse=True)]
+
+
+def walk(user_id, filters, limit):
+    pages, cursor = [], None
+    while True:
+        page, cursor = transactions_page(user_id, filters, cursor=cursor, limit=limit)
+        pages.append([transaction.id for transaction in page])
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize('limit', [1, 3, 4, 5, 10, 24, 25, 26, 100])
+def test_pages_cover_every_row_once(user_id, transaction_ids, limit):
+    pages = walk(user_id, parse_filters({}), limit)
+
+    assert [transaction_id for page in pages for transaction_id in page] == transaction_ids
+    assert all(len(page) == limit for page in pages[:-1])
+    # A last page that is exactly full has no next cursor rather than an empty page after it
+    assert 0 < len(pages[-1]) <= limit
+
+
+def test_pages_with_filters(user_id, transaction_ids):
+    filters = parse_filters({'min_amount': '10'})
+    pages = walk(user_id, filters, 4)
+
+    assert sum(len(page) for page in pages) == filtered_totals(user_id, filters)['count'] == 16
+
+
+def test_cursor_round_trip(db, transaction_ids):
+    transaction = db.session.get(Transaction, transaction_ids[7])
+    assert decode_cursor(encode_cursor(transaction)) == (transaction.date, transaction.id)
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', '', '!!!', 'MjAyNC0wMS0wMQ'])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)